@@ -1,52 +1,1121 @@
 # --- imports ---
+import time
+_INICIO_IMPORTACION = time.perf_counter()
+
+import base64
+import bisect
+import functools
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import logging
 import os
+import queue
 import re
+import subprocess
+import sys
+import tempfile
+import threading
+import unicodedata
+import uuid
+import zlib
 import bcrypt
-from datetime import datetime
+import click
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoVencido
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 from io import BytesIO
+from types import SimpleNamespace
+from urllib.parse import urlparse
 
 import mysql.connector
-from flask import Flask, request, render_template, redirect, url_for, session, send_file, jsonify
-
-# ReportLab (para PDFs)
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
+from flask import (Flask, request, render_template, redirect, url_for, session, send_file, jsonify,
+                   g, has_request_context, copy_current_request_context, Response, stream_with_context,
+                   before_render_template, template_rendered)
+from werkzeug.security import safe_join
+
+# ReportLab (para PDFs) se importa hasta que se necesita; ver reportlab(). Lo
+# mismo los módulos que solo usa una parte de la app, para no pagarlos en el
+# arranque de cada worker: sqlite3 (motor SQLite, ver _cargar_sqlite3()),
+# multiprocessing (trabajos de reportes), csv (importar/exportar),
+# logging.handlers (log de consultas lentas) y statistics (benchmark-arranque).
+# `flask benchmark-arranque` lista los que sí quedan cargados al importar.
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = "clave_secreta_segura" 
 
-def obtener_conexion():
-    import socket, os
-    import mysql.connector
-    from urllib.parse import urlparse
+# ---------------------- MOTOR DE REPORTES (CARGA DIFERIDA) ----------------------
+# ReportLab solo lo usan los reportes PDF, pero importarlo es la parte más cara
+# del arranque de un worker. REPORTLAB_LOAD decide cuándo se paga:
+#   lazy   (default) en el primer reporte del proceso
+#   warm   en un hilo al arrancar cada worker, fuera de la primera petición
+#   eager  al importar el módulo (con gunicorn --preload los workers lo heredan)
+# `flask benchmark-arranque` compara los tres modos.
+MODOS_REPORTLAB = ("lazy", "warm", "eager")
+MODO_REPORTLAB = os.getenv("REPORTLAB_LOAD", "lazy").strip().lower()
+
+_reportlab = None
+_reportlab_lock = threading.Lock()
+
+def reportlab():
+    """Módulos de ReportLab que usan los reportes; se importan una sola vez por proceso."""
+    global _reportlab
+    if _reportlab is None:
+        with _reportlab_lock:
+            if _reportlab is None:
+                from reportlab.lib import colors
+                from reportlab.lib.pagesizes import letter, landscape
+                from reportlab.lib.styles import getSampleStyleSheet
+                from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+                from reportlab.lib.units import cm
+                _reportlab = SimpleNamespace(
+                    colors=colors, letter=letter, landscape=landscape,
+                    getSampleStyleSheet=getSampleStyleSheet, SimpleDocTemplate=SimpleDocTemplate,
+                    Table=Table, TableStyle=TableStyle, Paragraph=Paragraph, Spacer=Spacer, cm=cm,
+                )
+    return _reportlab
+
+def _calentar_reportlab():
+    threading.Thread(target=reportlab, name="calentar-reportlab", daemon=True).start()
+
+def _despues_de_fork():
+    # Un lock tomado por otro hilo al momento del fork se quedaría cerrado
+    # para siempre en el hijo.
+    global _reportlab_lock
+    _reportlab_lock = threading.Lock()
+    if MODO_REPORTLAB == "warm" and _reportlab is None:
+        _calentar_reportlab()
+
+# ---------------------- POOL DE CONEXIONES ----------------------
+# Configuración por variables de entorno:
+#   DB_POOL_SIZE          conexiones que se mantienen abiertas (default 5)
+#   DB_POOL_MAX_OVERFLOW  conexiones extra permitidas en picos (default 10)
+#   DB_POOL_RECYCLE       segundos de vida máxima de una conexión (default 1800)
+#   DB_POOL_TIMEOUT       segundos máximos de espera por una conexión (default 30)
+#   DB_POOL_PING_IDLE     segundos inactiva tras los que se hace ping al prestarla (default 30)
+#   DB_BACKEND            mysql (default) o sqlite; ver MOTOR SQLITE (WAL)
+
+class PoolAgotado(Exception):
+    """No se consiguió una conexión libre dentro del tiempo de espera."""
+
+
+class ConexionPrestada:
+    """Conexión prestada por el pool; close() la devuelve en vez de cerrar el socket."""
+
+    def __init__(self, pool, conn, creada):
+        self._pool = pool
+        self._conn = conn
+        self._creada = creada
+        self.de_peticion = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        # Dentro de una petición la conexión se libera en el teardown.
+        if not self.de_peticion:
+            self.liberar()
+
+    def liberar(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.liberar(conn, self._creada)
+
+
+class PoolConexiones:
+    """Pool de conexiones MySQL con tamaño, desborde, reciclaje y estadísticas."""
+
+    def __init__(self, crear, tamano=5, desborde=10, reciclar=1800, espera_max=30.0, ping_inactiva=30.0):
+        self._crear = crear
+        self.tamano = tamano
+        self.desborde = desborde
+        self.reciclar = reciclar
+        self.espera_max = espera_max
+        self.ping_inactiva = ping_inactiva
+
+        self._cond = threading.Condition()
+        self._inactivas = deque()  # (conn, creada, liberada)
+        self._abiertas = 0
+        self._en_uso = 0
+
+        self._prestamos = 0
+        self._esperas = 0
+        self._espera_total = 0.0
+        self._espera_max_obs = 0.0
+        self._agotado = 0
+        self._creadas = 0
+        self._recicladas = 0
+
+    def obtener(self) -> ConexionPrestada:
+        inicio = time.perf_counter()
+        limite = inicio + self.espera_max
+        conn = None
+        creada = liberada = 0.0
+        espero = False
+
+        with self._cond:
+            while True:
+                if self._inactivas:
+                    conn, creada, liberada = self._inactivas.pop()
+                    break
+                if self._abiertas < self.tamano + self.desborde:
+                    self._abiertas += 1
+                    break
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    self._agotado += 1
+                    raise PoolAgotado(
+                        f"Sin conexiones libres tras {self.espera_max}s "
+                        f"(tamaño={self.tamano}, desborde={self.desborde})"
+                    )
+                espero = True
+                self._cond.wait(restante)
+            self._en_uso += 1
+
+        # Validar / crear fuera del candado para no bloquear a otros hilos.
+        try:
+            ahora = time.monotonic()
+            if conn is not None and ahora - creada > self.reciclar:
+                self._cerrar(conn)
+                conn = None
+                with self._cond:
+                    self._recicladas += 1
+            elif conn is not None and ahora - liberada > self.ping_inactiva:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._cerrar(conn)
+                    conn = None
+            if conn is None:
+                conn = self._crear()
+                creada = time.monotonic()
+                with self._cond:
+                    self._creadas += 1
+        except Exception:
+            with self._cond:
+                self._abiertas -= 1
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.perf_counter() - inicio
+        with self._cond:
+            self._prestamos += 1
+            self._espera_total += espera
+            if espera > self._espera_max_obs:
+                self._espera_max_obs = espera
+            if espero:
+                self._esperas += 1
+        return ConexionPrestada(self, conn, creada)
+
+    def liberar(self, conn, creada):
+        # Descarta cualquier transacción abierta para no filtrar estado entre peticiones.
+        try:
+            conn.rollback()
+            sana = True
+        except Exception:
+            sana = False
+
+        with self._cond:
+            self._en_uso -= 1
+            if sana and len(self._inactivas) < self.tamano:
+                self._inactivas.append((conn, creada, time.monotonic()))
+                conn = None
+            else:
+                self._abiertas -= 1
+            self._cond.notify()
+        if conn is not None:
+            self._cerrar(conn)
+
+    @staticmethod
+    def _cerrar(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def estadisticas(self) -> dict:
+        with self._cond:
+            return {
+                "tamano": self.tamano,
+                "desborde": self.desborde,
+                "reciclar_s": self.reciclar,
+                "abiertas": self._abiertas,
+                "en_uso": self._en_uso,
+                "inactivas": len(self._inactivas),
+                "prestamos": self._prestamos,
+                "esperas": self._esperas,
+                "espera_total_ms": round(self._espera_total * 1000, 3),
+                "espera_media_ms": round(self._espera_total * 1000 / self._prestamos, 3) if self._prestamos else 0.0,
+                "espera_max_ms": round(self._espera_max_obs * 1000, 3),
+                "agotado": self._agotado,
+                "creadas": self._creadas,
+                "recicladas": self._recicladas,
+            }
 
+
+def _configs_mysql():
+    """Configuraciones de conexión en orden de preferencia (MYSQL_URL y luego DB_*)."""
+    configs = []
     mysql_url = os.getenv("MYSQL_URL")
     if mysql_url:
+        parsed = urlparse(mysql_url)
+        configs.append(("MYSQL_URL", {
+            'host': parsed.hostname,
+            'user': parsed.username,
+            'password': parsed.password,
+            'database': parsed.path[1:],
+            'port': parsed.port or 3306,
+            'ssl_disabled': True
+        }))
+
+    configs.append(("DB_*", {
+        'host': os.getenv("DB_HOST", "127.0.0.1").strip(),
+        'port': int(os.getenv("DB_PORT", "3306").strip()),
+        'user': os.getenv("DB_USER", "root").strip(),
+        'password': os.getenv("DB_PASS", "").strip(),
+        'database': os.getenv("DB_NAME", "").strip(),
+        'ssl_disabled': True
+    }))
+    return configs
+
+
+def _crear_conexion_mysql(configs):
+    ultimo_error = None
+    for origen, config in configs:
         try:
-            parsed = urlparse(mysql_url)
-            config = {
-                'host': parsed.hostname,
-                'user': parsed.username,
-                'password': parsed.password,
-                'database': parsed.path[1:],
-                'port': parsed.port or 3306,
-                'ssl_disabled': True
-            }
             conn = mysql.connector.connect(**config)
-            print("✅ Conexión exitosa via MYSQL_URL")
+            print(f"✅ Conexión exitosa via {origen}")
             return conn
         except Exception as e:
-            print(f"❌ Error con MYSQL_URL: {e}")
+            print(f"❌ Error con {origen}: {e}")
+            ultimo_error = e
+    raise ultimo_error
+
+
+# ---------------------- MOTOR SQLITE (WAL) ----------------------
+# Con DB_BACKEND=sqlite la aplicación usa un archivo SQLite local en vez de un
+# servidor MySQL: pensado para sucursales con pocos miles de filas, donde el
+# viaje por la red a MySQL cuesta más que la consulta. El pool sigue igual;
+# solo cambia lo que crea cada conexión.
+#   SQLITE_PATH          archivo de la base (default industrial_parts.db junto a
+#                        appp.py; ":memory:" = en memoria, compartida en el proceso)
+#   SQLITE_BUSY_TIMEOUT  segundos que se espera el candado de escritura (default 5)
+#   SQLITE_CACHE_MB      caché de páginas por conexión (default 64)
+#   SQLITE_MMAP_MB       archivo mapeado en memoria (default 256)
+#
+# ConexionSQLite imita lo que el código usa de mysql.connector: cursores con
+# dictionary=True, column_names y lastrowid, commit/rollback/ping, y errores
+# convertidos a mysql.connector.Error (con el errno de MySQL) para que los
+# except existentes sigan funcionando. Cada sentencia pasa por traducir_sql,
+# que cambia %s por ? y las pocas cosas propias de MySQL que se usan:
+# DATABASE(), NOW(), @@variables, information_schema.columns/statistics,
+# ON DUPLICATE KEY UPDATE ... VALUES(col), INSERT IGNORE, EXPLAIN, ANALYZE y el DDL
+# (AUTO_INCREMENT, ON UPDATE CURRENT_TIMESTAMP). Como en MySQL con autocommit
+# apagado, la primera escritura (o SELECT ... FOR UPDATE) abre una transacción,
+# aquí BEGIN IMMEDIATE: toma el candado de escritura de una vez, así que dos
+# escritores se forman en vez de fallar a medio camino, y FOR UPDATE bloquea
+# de verdad. Las lecturas fuera de transacción no bloquean a nadie (WAL).
+MOTOR_BD = os.getenv("DB_BACKEND", "mysql").strip().lower()
+RUTA_SQLITE = os.getenv("SQLITE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "industrial_parts.db")
+ESPERA_SQLITE = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+CACHE_SQLITE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+MMAP_SQLITE_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+# Tablas base en dialecto SQLite (en MySQL las crea quien instala la base; ver
+# generar_datos.py). fecha_estado se actualiza con un trigger al cambiar el
+# estado, como el ON UPDATE CURRENT_TIMESTAMP de MySQL.
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(120) NOT NULL,
+    correo VARCHAR(120) NOT NULL UNIQUE,
+    rol VARCHAR(20) NOT NULL,
+    contrasena VARCHAR(255) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(120) NOT NULL,
+    correo VARCHAR(120),
+    telefono VARCHAR(30)
+);
+CREATE TABLE IF NOT EXISTS proveedores (
+    id_proveedor INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(120) NOT NULL,
+    correo VARCHAR(120),
+    telefono VARCHAR(30),
+    direccion VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS catalogo (
+    ID_Item INTEGER PRIMARY KEY AUTOINCREMENT,
+    SKU VARCHAR(50) NOT NULL UNIQUE,
+    Tipo_de_pieza VARCHAR(80),
+    Descripcion VARCHAR(255),
+    Medida VARCHAR(50),
+    Unidades INT,
+    Precio DECIMAL(10, 2)
+);
+CREATE TABLE IF NOT EXISTS inventario (
+    ID_Item INTEGER PRIMARY KEY,
+    stock INT NOT NULL DEFAULT 0,
+    stock_min INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pedidos_clientes (
+    id_pedidoc INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente VARCHAR(120),
+    codigo_pedido VARCHAR(50),
+    descripcion VARCHAR(255),
+    medida VARCHAR(50),
+    cantidad INT,
+    estado VARCHAR(20) DEFAULT 'pendiente',
+    fecha_estado TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS pedidos_proveedores (
+    id_pedidop INTEGER PRIMARY KEY AUTOINCREMENT,
+    proveedor VARCHAR(120),
+    codigo_pedido VARCHAR(50),
+    descripcion VARCHAR(255),
+    medida VARCHAR(50),
+    cantidad INT,
+    estado VARCHAR(20) DEFAULT 'pendiente',
+    fecha_estado TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS pedido_detalle (
+    id_detalle INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_pedido INT NOT NULL,
+    id_pieza INT NOT NULL,
+    cantidad INT NOT NULL,
+    medida VARCHAR(50)
+);
+-- Las demás tablas auxiliares se crean al primer uso; esta no, porque
+-- marcar_cambio() la usa con la transacción del llamador abierta y crearla
+-- desde otra conexión esperaría a que esa transacción termine.
+CREATE TABLE IF NOT EXISTS versiones_datos (
+    tabla VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_pedidos_clientes_fecha_estado ON pedidos_clientes (fecha_estado);
+CREATE INDEX IF NOT EXISTS idx_pedidos_proveedores_fecha_estado ON pedidos_proveedores (fecha_estado);
+CREATE INDEX IF NOT EXISTS idx_pedido_detalle_pedido ON pedido_detalle (id_pedido);
+CREATE TRIGGER IF NOT EXISTS tr_pedidos_clientes_fecha_estado AFTER UPDATE OF estado ON pedidos_clientes
+WHEN NEW.estado IS NOT OLD.estado AND NEW.fecha_estado IS OLD.fecha_estado
+BEGIN
+    UPDATE pedidos_clientes SET fecha_estado = datetime('now', 'localtime') WHERE id_pedidoc = NEW.id_pedidoc;
+END;
+CREATE TRIGGER IF NOT EXISTS tr_pedidos_proveedores_fecha_estado AFTER UPDATE OF estado ON pedidos_proveedores
+WHEN NEW.estado IS NOT OLD.estado AND NEW.fecha_estado IS OLD.fecha_estado
+BEGIN
+    UPDATE pedidos_proveedores SET fecha_estado = datetime('now', 'localtime') WHERE id_pedidop = NEW.id_pedidop;
+END;
+"""
+
+_COLUMNAS_SQLITE = """(
+    SELECT 'main' AS table_schema, m.name AS table_name, c.name AS column_name, c.cid + 1 AS ordinal_position
+    FROM sqlite_master m JOIN pragma_table_info(m.name) c
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite!_%' ESCAPE '!'
+)"""
+_INDICES_SQLITE = """(
+    SELECT 'main' AS table_schema, m.name AS table_name, i.name AS index_name,
+           c.name AS column_name, c.seqno + 1 AS seq_in_index
+    FROM sqlite_master m JOIN pragma_index_list(m.name) i JOIN pragma_index_info(i.name) c
+    WHERE m.type = 'table'
+)"""
+_TRADUCCIONES_SQLITE = [
+    (re.compile(r"\bDATABASE\(\)", re.I), "'main'"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now', 'localtime')"),
+    (re.compile(r"\bCURDATE\(\)", re.I), "date('now', 'localtime')"),
+    (re.compile(r"@@\w+"), "NULL"),
+    (re.compile(r"\binformation_schema\.columns\b", re.I), _COLUMNAS_SQLITE),
+    (re.compile(r"\binformation_schema\.statistics\b", re.I), _INDICES_SQLITE),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"^\s*EXPLAIN\s+(?!QUERY\b)", re.I), "EXPLAIN QUERY PLAN "),
+    (re.compile(r"^\s*ANALYZE\s+TABLE\b.*", re.I | re.S), "ANALYZE"),
+    (re.compile(r"\b(?:BIG)?INT(?:EGER)?(?:\s+NOT\s+NULL)?\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.I),
+     "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.I), ""),
+    (re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.I), "DEFAULT (datetime('now', 'localtime'))"),
+]
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\b", re.I)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_COLUMNA = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_ESCRITURA = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+
+@functools.lru_cache(maxsize=1024)
+def traducir_sql(sql):
+    """(sql para SQLite, abre transacción de escritura) a partir de una sentencia escrita para MySQL."""
+    sql = sql.replace("%s", "?")
+    for patron, reemplazo in _TRADUCCIONES_SQLITE:
+        sql = patron.sub(reemplazo, sql)
+    sql, bloqueos = _FOR_UPDATE.subn("", sql)
+    partes = _ON_DUPLICATE.split(sql, maxsplit=1)
+    if len(partes) == 2:
+        sql = partes[0] + "ON CONFLICT DO UPDATE SET" + _VALUES_COLUMNA.sub(r"excluded.\1", partes[1])
+    return sql, bool(bloqueos) or bool(_ESCRITURA.match(sql))
+
+# errno de MySQL para los errores de SQLite que el código puede querer distinguir.
+def _error_mysql(e):
+    mensaje = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        errno = 1062 if "UNIQUE" in mensaje or "PRIMARY KEY" in mensaje else 1048 if "NOT NULL" in mensaje else None
+        return mysql.connector.IntegrityError(msg=mensaje, errno=errno)
+    if isinstance(e, sqlite3.OperationalError):
+        if "locked" in mensaje or "busy" in mensaje:
+            return mysql.connector.OperationalError(msg=mensaje, errno=1205)  # ER_LOCK_WAIT_TIMEOUT
+        if "no such table" in mensaje:
+            return mysql.connector.ProgrammingError(msg=mensaje, errno=1146)
+        if "no such column" in mensaje:
+            return mysql.connector.ProgrammingError(msg=mensaje, errno=1054)
+        if "syntax error" in mensaje:
+            return mysql.connector.ProgrammingError(msg=mensaje, errno=1064)
+    return mysql.connector.DatabaseError(msg=mensaje)
+
+
+class CursorSQLite:
+    """Cursor de sqlite3 con la interfaz de un cursor de mysql.connector."""
+
+    def __init__(self, conexion, diccionario=False):
+        self._conexion = conexion
+        self._cur = conexion._conn.cursor()
+        self._diccionario = diccionario
+
+    def _correr(self, metodo, sql, params):
+        traducida, escribe = traducir_sql(sql)
+        try:
+            if escribe:
+                self._conexion._comenzar()
+            return metodo(traducida, params)
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+
+    def execute(self, sql, params=()):
+        self._correr(self._cur.execute, sql, tuple(params or ()))
+
+    def executemany(self, sql, secuencia):
+        self._correr(self._cur.executemany, sql, [tuple(p) for p in secuencia])
+
+    def _fila(self, fila):
+        if fila is None or not self._diccionario:
+            return fila
+        return dict(zip(self.column_names, fila))
+
+    def fetchone(self):
+        return self._fila(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._fila(f) for f in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._fila(f) for f in self._cur.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+
+class ConexionSQLite:
+    """Conexión sqlite3 (autocommit del módulo apagado) con la interfaz de mysql.connector."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, buffered=None, **_):
+        return CursorSQLite(self, dictionary)
+
+    def _comenzar(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def start_transaction(self, **_):
+        self._comenzar()
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+def _a_fecha_hora(valor):
+    return datetime.fromisoformat(valor.decode("ascii"))
+
+def _a_fecha(valor):
+    return datetime.fromisoformat(valor.decode("ascii")).date()
+
+sqlite3 = None  # se importa con la primera conexión SQLite; ver _cargar_sqlite3()
+
+def _cargar_sqlite3():
+    global sqlite3
+    if sqlite3 is None:
+        import sqlite3 as modulo
+        # Los adaptadores de fechas que trae sqlite3 están obsoletos desde 3.12; se
+        # registran los propios con el mismo formato que usa datetime('now', ...).
+        modulo.register_adapter(datetime, lambda v: v.isoformat(sep=" ", timespec="seconds"))
+        modulo.register_adapter(date, lambda v: v.isoformat())
+        modulo.register_adapter(Decimal, float)
+        for tipo in ("TIMESTAMP", "DATETIME"):
+            modulo.register_converter(tipo, _a_fecha_hora)
+        modulo.register_converter("DATE", _a_fecha)
+        sqlite3 = modulo
+    return sqlite3
+
+_sqlite_listo = False
+_sqlite_lock = threading.Lock()
+_sqlite_ancla = None  # con ":memory:" mantiene viva la base mientras viva el proceso
+
+def _abrir_sqlite(ruta):
+    en_memoria = ruta == ":memory:"
+    conn = sqlite3.connect(
+        "file:industrial_parts?mode=memory&cache=shared" if en_memoria else ruta,
+        uri=en_memoria, timeout=ESPERA_SQLITE, isolation_level=None,
+        check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=256,
+    )
+    conn.execute(f"PRAGMA busy_timeout = {int(ESPERA_SQLITE * 1000)}")
+    conn.execute("PRAGMA synchronous = NORMAL")  # con WAL no pierde integridad, solo lo último ante un apagón
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SQLITE_MB * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SQLITE_MB * 2**20}")
+    return conn
+
+def _crear_conexion_sqlite(ruta):
+    """Conexión nueva; la primera del proceso activa WAL y crea las tablas base."""
+    global _sqlite_listo, _sqlite_ancla
+    _cargar_sqlite3()
+    if not _sqlite_listo:
+        with _sqlite_lock:
+            if not _sqlite_listo:
+                conn = _abrir_sqlite(ruta)
+                if ruta != ":memory:":
+                    conn.execute("PRAGMA journal_mode = WAL")  # queda guardado en el archivo
+                conn.executescript(ESQUEMA_SQLITE)
+                conn.execute("PRAGMA optimize")
+                if ruta == ":memory:":
+                    _sqlite_ancla = conn
+                else:
+                    conn.close()
+                print(f"✅ SQLite listo en {ruta}")
+                _sqlite_listo = True
+    return ConexionSQLite(_abrir_sqlite(ruta))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def obtener_pool() -> PoolConexiones:
+    """Crea el pool del proceso la primera vez que se necesita."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if MOTOR_BD == "sqlite":
+                    crear = functools.partial(_crear_conexion_sqlite, RUTA_SQLITE)
+                else:
+                    configs = _configs_mysql()
+                    crear = functools.partial(_crear_conexion_mysql, configs)
+                _pool = PoolConexiones(
+                    crear,
+                    tamano=int(os.getenv("DB_POOL_SIZE", "5")),
+                    desborde=int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+                    reciclar=float(os.getenv("DB_POOL_RECYCLE", "1800")),
+                    espera_max=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                    ping_inactiva=float(os.getenv("DB_POOL_PING_IDLE", "30")),
+                )
+    return _pool
+
+def obtener_conexion():
+    """Conexión de la petición actual; se presta del pool una sola vez por petición."""
+    if not has_request_context():
+        return obtener_pool().obtener()
+
+    conn = g.get("_conexion_db")
+    if conn is None:
+        inicio = time.perf_counter()
+        conn = obtener_pool().obtener()
+        metricas.observar("db_conexion_espera_segundos", time.perf_counter() - inicio, endpoint=_endpoint_actual())
+        conn.de_peticion = True
+        g._conexion_db = conn
+    return conn
+
+@app.teardown_appcontext
+def liberar_conexion(exc):
+    conn = g.pop("_conexion_db", None)
+    if conn is not None:
+        conn.liberar()
+
+# ---------------------- MÉTRICAS ----------------------
+# Instrumentación en proceso, expuesta en formato de texto de Prometheus en
+# /metrics. Los histogramas usan cubetas fijas, así que la memoria solo crece
+# con el número de combinaciones de etiquetas (endpoints, plantillas y
+# reportes), no con el tráfico. Cada worker de gunicorn lleva sus propios
+# contadores. Si se define METRICS_TOKEN, /metrics exige "Authorization:
+# Bearer <token>".
+CUBETAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CUBETAS_CONTEO = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+class Histograma:
+    """Histograma acumulativo con cubetas fijas."""
+
+    def __init__(self, cubetas):
+        self.cubetas = cubetas
+        self.cuentas = [0] * (len(cubetas) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Metricas:
+    """Registro de contadores e histogramas con etiquetas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._definiciones = {}  # nombre -> (tipo, ayuda, cubetas)
+        self._series = {}        # nombre -> {etiquetas: valor o Histograma}
+
+    def definir(self, nombre, tipo, ayuda, cubetas=None):
+        self._definiciones[nombre] = (tipo, ayuda, cubetas)
+        self._series.setdefault(nombre, {})
+
+    def observar(self, nombre, valor, **etiquetas):
+        llave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            series = self._series[nombre]
+            hist = series.get(llave)
+            if hist is None:
+                hist = series[llave] = Histograma(self._definiciones[nombre][2])
+            hist.observar(valor)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        llave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            series = self._series[nombre]
+            series[llave] = series.get(llave, 0) + valor
+
+    @staticmethod
+    def _etiquetas(pares, extra=()):
+        pares = list(pares) + list(extra)
+        if not pares:
+            return ""
+        texto = ",".join(
+            f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+            for k, v in pares
+        )
+        return "{" + texto + "}"
+
+    def exportar(self, gauges=()) -> str:
+        lineas = []
+        with self._lock:
+            for nombre, (tipo, ayuda, cubetas) in self._definiciones.items():
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for llave, valor in sorted(self._series[nombre].items()):
+                    if tipo == "histogram":
+                        acumulado = 0
+                        for limite, cuenta in zip(cubetas + (float("inf"),), valor.cuentas):
+                            acumulado += cuenta
+                            le = "+Inf" if limite == float("inf") else repr(float(limite))
+                            lineas.append(f"{nombre}_bucket{self._etiquetas(llave, [('le', le)])} {acumulado}")
+                        lineas.append(f"{nombre}_sum{self._etiquetas(llave)} {valor.suma}")
+                        lineas.append(f"{nombre}_count{self._etiquetas(llave)} {valor.total}")
+                    else:
+                        lineas.append(f"{nombre}{self._etiquetas(llave)} {valor}")
+        for nombre, ayuda, valores in gauges:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            for etiquetas, valor in valores:
+                lineas.append(f"{nombre}{self._etiquetas(sorted(etiquetas.items()))} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+metricas = Metricas()
+metricas.definir("http_peticion_segundos", "histogram", "Latencia de cada petición por endpoint.", CUBETAS_SEGUNDOS)
+metricas.definir("http_peticiones_total", "counter", "Peticiones atendidas por endpoint, método y código.")
+metricas.definir("http_no_modificado_total", "counter", "Respuestas 304 servidas por ETag sin consultar la BD.")
+metricas.definir("peticion_sql_sentencias", "histogram", "Sentencias SQL ejecutadas por petición.", CUBETAS_CONTEO)
+metricas.definir("peticion_db_segundos", "histogram", "Tiempo total en la BD (execute + fetch) por petición.", CUBETAS_SEGUNDOS)
+metricas.definir("db_conexion_espera_segundos", "histogram", "Tiempo para obtener una conexión del pool.", CUBETAS_SEGUNDOS)
+metricas.definir("plantilla_render_segundos", "histogram", "Tiempo de render de cada plantilla.", CUBETAS_SEGUNDOS)
+metricas.definir("pdf_render_segundos", "histogram", "Tiempo de generación de cada reporte PDF.", CUBETAS_SEGUNDOS)
+metricas.definir("sql_consultas_lentas_total", "counter", "Sentencias que pasaron el umbral SLOW_QUERY_MS.")
+metricas.definir("bcrypt_segundos", "histogram", "Tiempo de CPU de cada operación bcrypt.", CUBETAS_SEGUNDOS)
+metricas.definir("bcrypt_espera_segundos", "histogram", "Tiempo en cola antes de que un hilo de bcrypt tome la tarea.", CUBETAS_SEGUNDOS)
+metricas.definir("bcrypt_rechazadas_total", "counter", "Operaciones bcrypt rechazadas por cola llena o espera vencida.")
+metricas.definir("bcrypt_rehash_total", "counter", "Hashes actualizados al costo configurado después de un login.")
+
+def _endpoint_actual():
+    if not has_request_context():
+        return "sin_peticion"
+    return request.endpoint or "desconocido"
+
+def _registrar_db(duracion, sentencia=False):
+    if has_request_context() and "_db_segundos" in g:
+        g._db_segundos += duracion
+        if sentencia:
+            g._sql_sentencias += 1
+
+
+class CursorMedido:
+    """Cursor que cuenta las sentencias y el tiempo pasado en la BD."""
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+    def _medir(self, metodo, *args, sentencia=False, muchos=False, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _registrar_db(duracion, sentencia)
+            if sentencia and args and 0 < UMBRAL_LENTA <= duracion:
+                registrar_consulta_lenta(args[0], args[1] if len(args) > 1 else None, duracion, muchos)
+
+    def execute(self, *args, **kwargs):
+        return self._medir(self._cur.execute, *args, sentencia=True, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._medir(self._cur.executemany, *args, sentencia=True, muchos=True, **kwargs)
+
+    def fetchone(self):
+        return self._medir(self._cur.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._medir(self._cur.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._medir(self._cur.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class medir_pdf:
+    """Context manager que registra el tiempo de generación de un reporte."""
+
+    def __init__(self, reporte):
+        self.reporte = reporte
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metricas.observar("pdf_render_segundos", time.perf_counter() - self._inicio, reporte=self.reporte)
+        return False
+
+
+def medir_pdf_en_streaming(reporte, trozos):
+    """Pasa los trozos de un PDF en streaming midiendo solo el tiempo de generarlos.
+
+    Lo que el generador pasa detenido en cada yield (el cliente leyendo la
+    página por una red lenta) no cuenta para pdf_render_segundos.
+    """
+    trabajo = 0.0
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                trozo = next(trozos)
+            except StopIteration:
+                return
+            finally:
+                trabajo += time.perf_counter() - inicio
+            yield trozo
+    finally:
+        trozos.close()
+        metricas.observar("pdf_render_segundos", trabajo, reporte=reporte)
+
+
+@app.before_request
+def iniciar_medicion():
+    g._inicio_peticion = time.perf_counter()
+    g._db_segundos = 0.0
+    g._sql_sentencias = 0
+
+@app.after_request
+def registrar_medicion(respuesta):
+    inicio = g.get("_inicio_peticion")
+    if inicio is not None:
+        endpoint = _endpoint_actual()
+        metricas.observar("http_peticion_segundos", time.perf_counter() - inicio, endpoint=endpoint)
+        metricas.incrementar("http_peticiones_total", endpoint=endpoint, metodo=request.method,
+                             codigo=respuesta.status_code)
+        metricas.observar("peticion_sql_sentencias", g._sql_sentencias, endpoint=endpoint)
+        metricas.observar("peticion_db_segundos", g._db_segundos, endpoint=endpoint)
+    return respuesta
+
+@before_render_template.connect_via(app)
+def _inicio_plantilla(sender, template, context, **extra):
+    if has_request_context():
+        g._inicio_plantilla = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _fin_plantilla(sender, template, context, **extra):
+    inicio = g.pop("_inicio_plantilla", None) if has_request_context() else None
+    if inicio is not None:
+        metricas.observar("plantilla_render_segundos", time.perf_counter() - inicio, plantilla=template.name)
+
+@app.route("/metrics")
+def metrics():
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return "no autorizado", 401
+
+    gauges = []
+    if _pool is not None:
+        est = _pool.estadisticas()
+        gauges.append(("db_pool_conexiones", "Conexiones del pool por estado.", [
+            ({"estado": "en_uso"}, est["en_uso"]),
+            ({"estado": "inactivas"}, est["inactivas"]),
+            ({"estado": "abiertas"}, est["abiertas"]),
+        ]))
+        gauges.append(("db_pool_agotado_total", "Veces que no hubo conexión libre a tiempo.", [({}, est["agotado"])]))
+    gauges.append(("cache_reportes_bytes", "Bytes ocupados por la caché de reportes.",
+                   [({}, cache_reportes.estadisticas()["bytes"])]))
+    gauges.append(("proceso_importacion_segundos", "Tiempo que tardó en importarse la app en este worker.",
+                   [({"reportlab": MODO_REPORTLAB}, TIEMPO_IMPORTACION)]))
+    gauges.append(("proceso_rss_bytes", "Memoria residente del worker.", [({}, _rss_bytes() or 0)]))
+    gauges.append(("reportlab_cargado", "1 si ReportLab ya se importó en este worker.",
+                   [({}, int(_reportlab is not None))]))
+    return Response(metricas.exportar(gauges), mimetype="text/plain; version=0.0.4")
+
+# ---------------------- CONSULTAS LENTAS ----------------------
+# Toda sentencia que tarde más de SLOW_QUERY_MS (default 200; 0 desactiva) se
+# escribe como una línea JSON en un log rotativo (SLOW_QUERY_LOG): SQL
+# normalizado, huella, forma de los parámetros (tipos, nunca valores), endpoint
+# y duración. Se mide el execute: el servidor ordena o agrupa antes de mandar
+# la primera fila, así que un ORDER BY sin índice ya se paga ahí.
+# El EXPLAIN se saca en un hilo aparte con su propia conexión del pool, a lo
+# más una vez por huella cada SLOW_QUERY_EXPLAIN_TTL segundos, para no frenar
+# la respuesta ni cargar más a la BD cuando la misma consulta es lenta en cada
+# petición. /consultas_lentas (solo admin) agrupa la cola del log por huella.
+UMBRAL_LENTA = float(os.getenv("SLOW_QUERY_MS", "200")) / 1000.0
+LOG_LENTAS = os.getenv("SLOW_QUERY_LOG") or os.path.join(tempfile.gettempdir(), "industrial_parts_consultas_lentas.log")
+TTL_EXPLAIN = float(os.getenv("SLOW_QUERY_EXPLAIN_TTL", "600"))
+_SENTENCIAS_EXPLICABLES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+_RE_CADENA = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+def normalizar_sql(sql) -> str:
+    """Quita literales y espacios para que la misma consulta tenga siempre el mismo texto."""
+    sql = _texto(sql).replace("%s", "?")
+    sql = _RE_CADENA.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_ESPACIOS.sub(" ", sql).strip().rstrip(";").rstrip()
+    return _RE_LISTA.sub("(?, ...)", sql)
+
+def _forma_parametros(params, muchos=False):
+    if params is None:
+        return None
+    if muchos:
+        if not isinstance(params, (list, tuple)):
+            return {"filas": None}
+        return {"filas": len(params), "fila": _forma_parametros(params[0]) if params else None}
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    return [type(v).__name__ for v in params]
+
+
+class BitacoraLentas:
+    """Escribe las consultas lentas desde un hilo propio, con EXPLAIN por huella."""
+
+    def __init__(self, ruta, ttl_explain, max_pendientes=1000):
+        self.ruta = ruta
+        self.ttl_explain = ttl_explain
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._logger = None
+        self._ultimo_explain = {}  # huella -> time.monotonic()
+        self.descartadas = 0
+
+    def registrar(self, entrada, sql, params, muchos):
+        self._arrancar()
+        try:
+            self._cola.put_nowait((entrada, sql, params, muchos))
+        except queue.Full:
+            self.descartadas += 1
+
+    def _arrancar(self):
+        # Lazy y por proceso: un hilo creado antes del fork no existe en el worker.
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name="consultas-lentas", daemon=True)
+                self._hilo.start()
+
+    def _obtener_logger(self):
+        if self._logger is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            logger = logging.getLogger("industrial_parts.consultas_lentas")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if not logger.handlers:
+                import logging.handlers
+                manejador = logging.handlers.RotatingFileHandler(
+                    self.ruta, encoding="utf-8",
+                    maxBytes=int(float(os.getenv("SLOW_QUERY_LOG_MB", "5")) * 1024 * 1024),
+                    backupCount=int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "3")),
+                )
+                manejador.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(manejador)
+            self._logger = logger
+        return self._logger
+
+    def _toca_explain(self, huella, sql, muchos):
+        if muchos or not sql.lstrip().upper().startswith(_SENTENCIAS_EXPLICABLES):
+            return False
+        ahora = time.monotonic()
+        ultimo = self._ultimo_explain.get(huella)
+        if ultimo is not None and ahora - ultimo < self.ttl_explain:
+            return False
+        self._ultimo_explain[huella] = ahora
+        return True
+
+    def _explain(self, sql, params):
+        # Cursor crudo: el EXPLAIN no cuenta como sentencia de la petición ni
+        # puede volver a entrar a la bitácora.
+        conn = obtener_pool().obtener()
+        try:
+            cur = conn._conn.cursor(dictionary=True)
+            try:
+                cur.execute("EXPLAIN " + sql, params or ())
+                return [{k: _texto(v) for k, v in fila.items()} for fila in cur.fetchall()]
+            finally:
+                cur.close()
+        finally:
+            conn.liberar()
 
-    host_env = os.getenv("DB_HOST", "127.0.0.1").strip()
-    port_env = os.getenv("DB_PORT", "3306").strip()
-    user = os.getenv("DB_USER", "root").strip()
-    password = os.getenv("DB_PASS", "").strip()
-    database = os.getenv("DB_NAME", "").strip()
+    def _trabajar(self):
+        while True:
+            entrada, sql, params, muchos = self._cola.get()
+            try:
+                if self._toca_explain(entrada["huella"], sql, muchos):
+                    try:
+                        entrada["explain"] = self._explain(sql, params)
+                    except Exception as e:
+                        entrada["explain_error"] = str(e)
+                self._obtener_logger().info(json.dumps(entrada, ensure_ascii=False, default=str))
+            except Exception as e:
+                print(f"[CONSULTAS LENTAS] no se pudo registrar: {e}")
+
+    def leer(self, max_bytes=1024 * 1024):
+        """Últimas entradas del log (solo el archivo activo, no los respaldos)."""
+        try:
+            with open(self.ruta, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                tamano = f.tell()
+                f.seek(max(0, tamano - max_bytes))
+                datos = f.read()
+        except FileNotFoundError:
+            return []
+        lineas = datos.decode("utf-8", errors="replace").splitlines()
+        if tamano > max_bytes and lineas:
+            lineas = lineas[1:]  # la primera puede venir cortada
+        entradas = []
+        for linea in lineas:
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                continue
+        return entradas
+
+
+bitacora_lentas = BitacoraLentas(LOG_LENTAS, TTL_EXPLAIN)
+
+def registrar_consulta_lenta(sql, params, duracion, muchos=False):
+    sql = _texto(sql)
+    normalizada = normalizar_sql(sql)
+    endpoint = _endpoint_actual()
+    entrada = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "endpoint": endpoint,
+        "duracion_ms": round(duracion * 1000, 2),
+        "huella": hashlib.sha1(normalizada.encode("utf-8")).hexdigest()[:12],
+        "sql": normalizada,
+        "parametros": _forma_parametros(params, muchos),
+    }
+    metricas.incrementar("sql_consultas_lentas_total", endpoint=endpoint)
+    bitacora_lentas.registrar(entrada, sql, params, muchos)
+
+@app.route("/consultas_lentas")
+def consultas_lentas():
+    if session.get("rol") != "admin":
+        return jsonify({"error": "solo admin"}), 403
+
+    grupos = {}
+    for entrada in bitacora_lentas.leer():
+        grupo = grupos.get(entrada["huella"])
+        if grupo is None:
+            grupo = grupos[entrada["huella"]] = {
+                "huella": entrada["huella"], "sql": entrada["sql"], "veces": 0,
+                "total_ms": 0.0, "max_ms": 0.0, "endpoints": set(),
+                "parametros": entrada.get("parametros"), "explain": None,
+            }
+        grupo["veces"] += 1
+        grupo["total_ms"] += entrada["duracion_ms"]
+        grupo["max_ms"] = max(grupo["max_ms"], entrada["duracion_ms"])
+        grupo["endpoints"].add(entrada["endpoint"])
+        grupo["ultima"] = entrada["fecha"]
+        if "explain" in entrada:
+            grupo["explain"] = entrada["explain"]
+
+    consultas = sorted(grupos.values(), key=lambda g_: g_["total_ms"], reverse=True)
+    for grupo in consultas:
+        grupo["endpoints"] = sorted(grupo["endpoints"])
+        grupo["promedio_ms"] = round(grupo["total_ms"] / grupo["veces"], 2)
+        grupo["total_ms"] = round(grupo["total_ms"], 2)
+    return jsonify({
+        "umbral_ms": UMBRAL_LENTA * 1000,
+        "log": LOG_LENTAS,
+        "descartadas": bitacora_lentas.descartadas,
+        "consultas": consultas[:request.args.get("limite", 50, type=int)],
+    })
 
 @app.route("/health")
 def health():
@@ -105,19 +1174,900 @@ def obtener_saludo():
     else:
         return "Buenas noches"
         
+# ---------------------- CONTRASEÑAS (BCRYPT) ----------------------
+# bcrypt suelta el GIL, pero cada hash ocupa un núcleo cientos de ms. Para que
+# una ráfaga de logins no se lleve todos los hilos del servidor, el trabajo va
+# a un pool propio de BCRYPT_WORKERS hilos con a lo más BCRYPT_MAX_PENDING
+# tareas entre cola y ejecución; si está lleno se responde 503 de inmediato en
+# vez de formar más fila. BCRYPT_ROUNDS es el costo de los hashes nuevos; un
+# login exitoso con un hash de otro costo lo vuelve a generar en segundo plano.
+# BCRYPT_WAIT es lo máximo que una petición espera el resultado.
+class ContrasenasOcupadas(Exception):
+    """El pool de bcrypt no tiene cupo; el cliente debe reintentar."""
+
+
+def _costo_hash(hash_contrasena):
+    partes = hash_contrasena.split("$")
+    return int(partes[2]) if len(partes) > 3 and partes[2].isdigit() else None
+
+
+class EjecutorBcrypt:
+    """Pool de hilos acotado para bcrypt, con cupo de tareas y métricas."""
+
+    def __init__(self, rondas=12, hilos=2, max_pendientes=16, espera_max=10.0):
+        self.rondas = min(31, max(4, rondas))
+        self.hilos = hilos
+        self.max_pendientes = max(hilos, max_pendientes)
+        self.espera_max = espera_max
+        self._cupo = threading.BoundedSemaphore(self.max_pendientes)
+        self._ejecutor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _obtener(self):
+        # Por proceso: los hilos de un pool creado antes de un fork no existen en el hijo.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._cupo = threading.BoundedSemaphore(self.max_pendientes)
+                    self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="bcrypt")
+                    self._pid = os.getpid()
+        return self._ejecutor
+
+    def _enviar(self, operacion, funcion, *args):
+        ejecutor = self._obtener()
+        cupo = self._cupo
+        if not cupo.acquire(blocking=False):
+            metricas.incrementar("bcrypt_rechazadas_total", operacion=operacion)
+            raise ContrasenasOcupadas(operacion)
+        encolada = time.perf_counter()
+
+        def tarea():
+            inicio = time.perf_counter()
+            metricas.observar("bcrypt_espera_segundos", inicio - encolada, operacion=operacion)
+            try:
+                return funcion(*args)
+            finally:
+                metricas.observar("bcrypt_segundos", time.perf_counter() - inicio, operacion=operacion)
+                cupo.release()
+
+        try:
+            return ejecutor.submit(tarea)
+        except BaseException:
+            cupo.release()
+            raise
+
+    def _esperar(self, operacion, futuro):
+        try:
+            return futuro.result(timeout=self.espera_max)
+        except FuturoVencido:
+            metricas.incrementar("bcrypt_rechazadas_total", operacion=operacion)
+            raise ContrasenasOcupadas(operacion)
+
+    def hashear(self, contrasena: str) -> str:
+        futuro = self._enviar("hashear", bcrypt.hashpw, contrasena.encode("utf-8"), bcrypt.gensalt(self.rondas))
+        return self._esperar("hashear", futuro).decode("utf-8")
+
+    def verificar(self, contrasena: str, hash_contrasena: str) -> bool:
+        futuro = self._enviar("verificar", bcrypt.checkpw, contrasena.encode("utf-8"), hash_contrasena.encode("utf-8"))
+        return self._esperar("verificar", futuro)
+
+    def necesita_rehash(self, hash_contrasena: str) -> bool:
+        return _costo_hash(hash_contrasena) != self.rondas
+
+    def rehash(self, correo, contrasena, hash_anterior):
+        """Regenera el hash con el costo actual sin que el login lo espere.
+
+        Si no hay cupo se omite; se vuelve a intentar en el siguiente login. El
+        UPDATE compara el hash anterior para no pisar un cambio de contraseña
+        hecho mientras tanto.
+        """
+        def tarea():
+            nuevo = bcrypt.hashpw(contrasena.encode("utf-8"), bcrypt.gensalt(self.rondas)).decode("utf-8")
+            conn = obtener_pool().obtener()
+            try:
+                cur = conn.cursor()
+                cur.execute("UPDATE usuarios SET contrasena = %s WHERE correo = %s AND contrasena = %s",
+                            (nuevo, correo, hash_anterior))
+                conn.commit()
+                cur.close()
+            finally:
+                conn.liberar()
+            metricas.incrementar("bcrypt_rehash_total")
+
+        def al_terminar(futuro):
+            if futuro.exception() is not None:
+                print(f"[BCRYPT] no se pudo actualizar el hash de {correo}: {futuro.exception()}")
+
+        try:
+            self._enviar("rehash", tarea).add_done_callback(al_terminar)
+        except ContrasenasOcupadas:
+            pass
+
+    def estadisticas(self) -> dict:
+        return {"rondas": self.rondas, "hilos": self.hilos, "max_pendientes": self.max_pendientes}
+
+
+contrasenas = EjecutorBcrypt(
+    rondas=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    hilos=int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_pendientes=int(os.getenv("BCRYPT_MAX_PENDING", "16")),
+    espera_max=float(os.getenv("BCRYPT_WAIT", "10")),
+)
+
+def _respuesta_ocupado():
+    respuesta = app.make_response((render_template(
+        "error.html", mensaje="⏳ El servidor está atendiendo muchos inicios de sesión. Intenta de nuevo en unos segundos."), 503))
+    respuesta.headers["Retry-After"] = "2"
+    return respuesta
+
+# ---------------------- REGISTRO DE ESQUEMA ----------------------
+# Tablas y columnas de la BD leídas de information_schema una sola vez y
+# guardadas en el proceso; se recargan al vencer SCHEMA_TTL (segundos,
+# default 300) o a petición con registro_esquema.refrescar().
+
+def _texto(valor):
+    return valor.decode("utf-8") if isinstance(valor, (bytes, bytearray)) else valor
+
+class RegistroEsquema:
+    """Caché en proceso de las tablas y columnas de la base de datos."""
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tablas = None  # {tabla_en_minusculas: [columnas]}
+        self._cargado = 0.0
+
+    def refrescar(self) -> dict:
+        conn = obtener_conexion()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT table_name, column_name FROM information_schema.columns
+                WHERE table_schema = DATABASE()
+                ORDER BY table_name, ordinal_position
+            """)
+            filas = cur.fetchall()
+        finally:
+            cur.close(); conn.close()
+
+        tablas = {}
+        for tabla, columna in filas:
+            tablas.setdefault(_texto(tabla).lower(), []).append(_texto(columna))
+        self._tablas = tablas
+        self._cargado = time.monotonic()
+        return tablas
+
+    def invalidar(self):
+        self._tablas = None
+
+    def _vigente(self) -> dict:
+        tablas = self._tablas
+        if tablas is not None and time.monotonic() - self._cargado <= self.ttl:
+            return tablas
+        with self._lock:
+            # Otro hilo pudo haberlo recargado mientras esperábamos.
+            if self._tablas is not None and time.monotonic() - self._cargado <= self.ttl:
+                return self._tablas
+            return self.refrescar()
+
+    def tabla_existe(self, nombre_tabla: str) -> bool:
+        return nombre_tabla.lower() in self._vigente()
+
+    def columnas(self, nombre_tabla: str) -> list:
+        return list(self._vigente().get(nombre_tabla.lower(), []))
+
+    def resumen(self) -> dict:
+        return {tabla: list(cols) for tabla, cols in self._vigente().items()}
+
+
+registro_esquema = RegistroEsquema(ttl=float(os.getenv("SCHEMA_TTL", "300")))
+
 def tabla_existe(nombre_tabla: str) -> bool:
-    """Comprueba si una tabla existe en la base de datos."""
+    """Comprueba si una tabla existe en la base de datos (vía el registro de esquema)."""
+    return registro_esquema.tabla_existe(nombre_tabla)
+
+# ---------------------- VERSIONES DE DATOS ----------------------
+# Contador por tabla guardado en la propia BD (tabla versiones_datos) para que
+# todos los workers vean el mismo valor. Las rutas que escriben confirman con
+# confirmar_cambios(conn, tablas...) en vez de conn.commit(): la versión sube
+# en la misma transacción que los datos, así que nunca hay datos nuevos con la
+# versión vieja (ni al revés). Quien cachea algo derivado de esas tablas usa
+# versiones_datos() como parte de la llave.
+_versiones_lista = False
+
+def _asegurar_tabla_versiones():
+    # En su propia conexión, como _asegurar_tabla_resumen: el CREATE TABLE
+    # confirmaría la transacción abierta de quien llama.
+    global _versiones_lista
+    if _versiones_lista:
+        return
+    conn = obtener_pool().obtener()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS versiones_datos (
+                tabla VARCHAR(64) NOT NULL PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cur.close()
+    finally:
+        conn.liberar()
+    _versiones_lista = True
+
+_al_cambiar = {}  # tabla -> [funciones a llamar cuando cambia]
+
+def al_cambiar(tabla, funcion):
+    """Registra una función que se llama (en este proceso) cuando cambia `tabla`."""
+    _al_cambiar.setdefault(tabla, []).append(funcion)
+
+def marcar_cambio(conn, *tablas):
+    """Sube la versión de `tablas` dentro de la transacción abierta de `conn`; el commit es del llamador."""
+    tablas = sorted(set(tablas))  # siempre en el mismo orden: dos escritores no se cruzan los bloqueos
+    if not tablas:
+        return
+    _asegurar_tabla_versiones()
+    cur = conn.cursor()
+    try:
+        cur.executemany("""
+            INSERT INTO versiones_datos (tabla, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """, [(t,) for t in tablas])
+    finally:
+        cur.close()
+
+def confirmar_cambios(conn, *tablas):
+    """Marca el cambio de `tablas`, confirma la transacción de `conn` y luego avisa a los al_cambiar().
+
+    Si falla la marca o el commit la excepción sube y nadie se entera de un
+    cambio que no quedó guardado.
+    """
+    marcar_cambio(conn, *tablas)
+    conn.commit()
+    for tabla in sorted(set(tablas)):
+        for funcion in _al_cambiar.get(tabla, []):
+            funcion()
+
+def versiones_datos(*tablas):
+    """Tupla con la versión actual de cada tabla, o None si no se pudo leer."""
+    _asegurar_tabla_versiones()
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
-        cur.execute("""
-            SELECT COUNT(*) FROM information_schema.tables
-            WHERE table_schema = DATABASE() AND table_name = %s
-        """, (nombre_tabla,))
-        existe = cur.fetchone()[0] > 0
+        marcas = ", ".join(["%s"] * len(tablas))
+        cur.execute(f"SELECT tabla, version FROM versiones_datos WHERE tabla IN ({marcas})", tablas)
+        actuales = {_texto(t): v for t, v in cur.fetchall()}
+    except mysql.connector.Error as e:
+        print(f"❌ No se pudieron leer versiones de {tablas}: {e}")
+        return None
     finally:
         cur.close(); conn.close()
-    return existe
+    return tuple(actuales.get(t, 0) for t in tablas)
+
+# ---------------------- RESPUESTAS CONDICIONALES (ETAG) ----------------------
+# Las vistas marcadas con @condicional(tablas...) responden con un ETag fuerte
+# calculado a partir de la versión de esas tablas (versiones_datos), la URL
+# con su query string, el usuario y rol de la sesión, la fecha y el saludo
+# (que salen en las páginas) y VERSION_APP. Si el navegador manda ese mismo
+# ETag en If-None-Match se contesta 304 sin tocar la consulta ni la plantilla:
+# el único costo es leer las versiones, una consulta por llave primaria.
+# VERSION_APP (env APP_VERSION, o una huella del código y las plantillas)
+# invalida todo al desplegar. La variante comprimida no es idéntica byte a
+# byte, así que lleva su propio ETag: el mismo con SUFIJO_ETAG_GZIP (lo agrega
+# comprimir_respuesta). Con `roles`, quien no tiene uno de esos roles pasa
+# directo a la vista (que lo rechaza): ni consulta versiones ni puede recibir
+# un 304 en lugar del rechazo adivinando el ETag.
+SUFIJO_ETAG_GZIP = "-gz"
+
+def _huella_codigo() -> str:
+    h = hashlib.sha1()
+    base = os.path.dirname(os.path.abspath(__file__))
+    plantillas = os.path.join(base, "templates")
+    rutas = [os.path.abspath(__file__)] + sorted(
+        os.path.join(plantillas, nombre) for nombre in os.listdir(plantillas) if nombre.endswith(".html"))
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+VERSION_APP = os.getenv("APP_VERSION") or _huella_codigo()
+
+def _etag_para(tablas, versiones) -> str:
+    partes = [
+        VERSION_APP, request.path, request.query_string.decode("latin-1"),
+        str(session.get("rol")), str(session.get("user_name")), str(session.get("correo")),
+        datetime.now().strftime("%Y-%m-%d"), obtener_saludo(),
+        ",".join(f"{t}={v}" for t, v in zip(tablas, versiones)),
+    ]
+    return hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+def condicional(*tablas, roles=None):
+    """Decorador: ETag y 304 para una vista GET cuyo contenido solo depende de `tablas`."""
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or (roles is not None and session.get("rol") not in roles):
+                return vista(*args, **kwargs)
+            versiones = versiones_datos(*tablas)
+            if versiones is None:
+                return vista(*args, **kwargs)
+
+            etag = _etag_para(tablas, versiones)
+            variantes = [etag]
+            if NIVEL_COMPRESION > 0 and request.accept_encodings["gzip"]:
+                variantes.append(etag + SUFIJO_ETAG_GZIP)
+            vigente = next((e for e in variantes if request.if_none_match.contains(e)), None)
+            if vigente:
+                metricas.incrementar("http_no_modificado_total", endpoint=_endpoint_actual())
+                respuesta = Response(status=304)
+                respuesta.set_etag(vigente)
+            else:
+                respuesta = app.make_response(vista(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+                respuesta.set_etag(etag)
+            # private: depende de la sesión; no-cache: revalidar siempre.
+            respuesta.headers["Cache-Control"] = "private, no-cache"
+            respuesta.vary.add("Cookie")
+            if NIVEL_COMPRESION > 0:
+                respuesta.vary.add("Accept-Encoding")
+            return respuesta
+        return envoltura
+    return decorador
+
+# ---------------------- COMPRESIÓN DE RESPUESTAS ----------------------
+# Las respuestas de texto (HTML, JSON, CSV, NDJSON) se mandan con gzip cuando
+# el cliente lo acepta. Las que ya están en memoria solo se comprimen si pasan
+# de MINIMO_COMPRESION bytes (debajo de eso gzip no ahorra nada que valga el
+# CPU); las que van en streaming se comprimen trozo a trozo y se vacía el
+# compresor cada VACIADO_COMPRESION bytes para que el navegador siga recibiendo
+# datos en vez de esperar a que se llene el búfer de zlib. PDFs y archivos
+# enviados con send_file (direct_passthrough) no se tocan.
+NIVEL_COMPRESION = int(os.getenv("COMPRESS_LEVEL", "6"))  # 0 = desactivada
+MINIMO_COMPRESION = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+VACIADO_COMPRESION = 64 * 1024
+TIPOS_COMPRIMIBLES = {
+    "text/html", "text/plain", "text/css", "text/csv",
+    "application/json", "application/x-ndjson", "application/javascript",
+}
+
+metricas.definir("http_comprimidas_total", "counter", "Respuestas enviadas con gzip")
+metricas.definir("http_bytes_ahorrados_total", "counter",
+                 "Bytes ahorrados por gzip (solo respuestas no streaming)")
+
+def _comprimir_trozos(trozos, nivel):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = formato gzip
+    sin_vaciar = 0
+    try:
+        for trozo in trozos:
+            if isinstance(trozo, str):
+                trozo = trozo.encode("utf-8")
+            datos = compresor.compress(trozo)
+            sin_vaciar += len(trozo)
+            if sin_vaciar >= VACIADO_COMPRESION:
+                datos += compresor.flush(zlib.Z_SYNC_FLUSH)
+                sin_vaciar = 0
+            if datos:
+                yield datos
+        yield compresor.flush()
+    finally:
+        # Cierra el generador original (stream_with_context libera ahí el contexto).
+        if hasattr(trozos, "close"):
+            trozos.close()
+
+@app.after_request
+def comprimir_respuesta(respuesta):
+    if (NIVEL_COMPRESION <= 0 or request.method == "HEAD"
+            or respuesta.direct_passthrough
+            or respuesta.status_code < 200 or respuesta.status_code in (204, 206, 304)
+            or "Content-Encoding" in respuesta.headers
+            or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+        return respuesta
+    respuesta.vary.add("Accept-Encoding")
+    if not request.accept_encodings["gzip"]:
+        return respuesta
+
+    if respuesta.is_streamed:
+        respuesta.response = _comprimir_trozos(respuesta.response, NIVEL_COMPRESION)
+        respuesta.headers.pop("Content-Length", None)
+    else:
+        datos = respuesta.get_data()
+        if len(datos) < MINIMO_COMPRESION:
+            return respuesta
+        compresor = zlib.compressobj(NIVEL_COMPRESION, zlib.DEFLATED, 31)  # 31: formato gzip
+        comprimidos = compresor.compress(datos) + compresor.flush()
+        respuesta.set_data(comprimidos)
+        metricas.incrementar("http_bytes_ahorrados_total", len(datos) - len(comprimidos))
+    respuesta.headers["Content-Encoding"] = "gzip"
+    etag, debil = respuesta.get_etag()
+    if etag:
+        respuesta.set_etag(etag + SUFIJO_ETAG_GZIP, weak=debil)
+    metricas.incrementar("http_comprimidas_total")
+    return respuesta
+
+# ---------------------- ARCHIVOS ESTÁTICOS (HUELLA Y CACHÉ) ----------------------
+# url_for('static', filename=...) agrega ?v=<huella del contenido>, así que la
+# URL cambia en cuanto cambia el archivo y el navegador puede guardarlo un año
+# sin revalidar. La huella se recalcula solo si cambian mtime o tamaño. Una
+# petición con una v vieja (o sin v) se sirve con no-cache para no fijar en
+# caché una versión que ya no corresponde a esa URL.
+_huellas_estaticas = {}
+
+def huella_estatica(nombre):
+    ruta = safe_join(app.static_folder, nombre)
+    if ruta is None:
+        return None
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    firma = (st.st_mtime_ns, st.st_size)
+    guardada = _huellas_estaticas.get(nombre)
+    if guardada and guardada[0] == firma:
+        return guardada[1]
+    with open(ruta, "rb") as f:
+        huella = hashlib.sha1(f.read()).hexdigest()[:10]
+    _huellas_estaticas[nombre] = (firma, huella)
+    return huella
+
+@app.url_defaults
+def versionar_estaticos(endpoint, valores):
+    if endpoint == "static" and "filename" in valores and "v" not in valores:
+        huella = huella_estatica(valores["filename"])
+        if huella:
+            valores["v"] = huella
+
+@app.after_request
+def cache_estaticos(respuesta):
+    if request.endpoint != "static" or respuesta.status_code not in (200, 304):
+        return respuesta
+    version = request.args.get("v")
+    if version and version == huella_estatica((request.view_args or {}).get("filename", "")):
+        respuesta.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+# ---------------------- PAGINACIÓN (KEYSET) ----------------------
+# Los listados se paginan por clave: en lugar de OFFSET se pide "lo que va
+# después/antes de la última fila vista", así cada página cuesta lo mismo sin
+# importar el tamaño de la tabla. El cursor viaja en ?despues= / ?antes=.
+TAMANO_PAGINA = int(os.getenv("PAGE_SIZE", "50"))
+
+def _cursor_codificar(valores) -> str:
+    crudo = json.dumps(valores, default=str, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+def _cursor_decodificar(texto):
+    if not texto:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+        valores = json.loads(crudo)
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+def _url_pagina(**cursor):
+    args = {k: v for k, v in request.args.items() if k not in ("despues", "antes")}
+    args.update(cursor)
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+def sql_keyset(select_sql, claves, descendente=False, where="", params=(), tamano=None):
+    """Arma la consulta de la página pedida en ?despues= / ?antes= sin ejecutarla.
+
+    Devuelve (sql, params, estado); estado se pasa tal cual a _cerrar_pagina.
+    """
+    tamano = tamano or TAMANO_PAGINA
+    despues = _cursor_decodificar(request.args.get("despues"))
+    antes = _cursor_decodificar(request.args.get("antes"))
+    hacia_atras = antes is not None and despues is None
+    cursor = antes if hacia_atras else despues
+    if cursor is not None and len(cursor) != len(claves):
+        cursor = None
+
+    condiciones = [where] if where else []
+    params = list(params)
+    if cursor is not None:
+        op = ">" if descendente == hacia_atras else "<"
+        partes = []
+        for i, (col, _) in enumerate(claves):
+            iguales = [f"{c} = %s" for c, _ in claves[:i]]
+            partes.append("(" + " AND ".join(iguales + [f"{col} {op} %s"]) + ")")
+            params.extend(cursor[:i + 1])
+        condiciones.append("(" + " OR ".join(partes) + ")")
+
+    sentido = "DESC" if descendente != hacia_atras else "ASC"
+    sql = select_sql
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY " + ", ".join(f"{col} {sentido}" for col, _ in claves)
+    sql += " LIMIT %s"
+    params.append(tamano + 1)
+    return sql, tuple(params), ([llave for _, llave in claves], cursor, hacia_atras, tamano)
+
+def _cerrar_pagina(filas, estado):
+    llaves, cursor, hacia_atras, tamano = estado
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if hacia_atras:
+        filas.reverse()
+    return filas, _armar_pagina(filas, llaves, cursor, hacia_atras, hay_mas, tamano)
+
+def paginar_keyset(cur, select_sql, claves, descendente=False, where="", params=(), tamano=None):
+    """Ejecuta select_sql paginado por las columnas `claves`.
+
+    claves: lista de (columna SQL, llave en la fila), p. ej. [("c.SKU", "SKU")].
+    La última clave debe ser única para que el orden sea total.
+    Devuelve (filas, pagina) donde pagina trae las URLs anterior/siguiente.
+    """
+    sql, params, estado = sql_keyset(select_sql, claves, descendente, where, params, tamano)
+    cur.execute(sql, params)
+    return _cerrar_pagina(cur.fetchall(), estado)
+
+def _armar_pagina(filas, llaves, cursor, hacia_atras, hay_mas, tamano):
+    def clave_de(fila):
+        return [fila[llave] for llave in llaves]
+
+    pagina = {"anterior": None, "siguiente": None, "tamano": tamano}
+    if filas:
+        if (hacia_atras and hay_mas) or (not hacia_atras and cursor is not None):
+            pagina["anterior"] = _url_pagina(antes=_cursor_codificar(clave_de(filas[0])))
+        if (not hacia_atras and hay_mas) or hacia_atras:
+            pagina["siguiente"] = _url_pagina(despues=_cursor_codificar(clave_de(filas[-1])))
+    elif cursor is not None:
+        # Página vacía (p. ej. se borraron filas): ofrecer volver al inicio.
+        pagina["anterior"] = _url_pagina()
+    return pagina
+
+def paginar_en_memoria(filas, llaves, posiciones, tamano=None):
+    """Como paginar_keyset pero sobre una lista ya ordenada por `llaves`.
+
+    posiciones: {tupla de llave: índice en filas}. Los cursores son los mismos
+    que los de paginar_keyset, así que los enlaces sirven para ambas versiones.
+    """
+    tamano = tamano or TAMANO_PAGINA
+    despues = _cursor_decodificar(request.args.get("despues"))
+    antes = _cursor_decodificar(request.args.get("antes"))
+    hacia_atras = antes is not None and despues is None
+    cursor = antes if hacia_atras else despues
+    indice = posiciones.get(tuple(cursor)) if cursor is not None else None
+    if indice is None:
+        # Cursor inválido o fila ya borrada: empezar desde el principio.
+        cursor, hacia_atras = None, False
+
+    if hacia_atras:
+        inicio = max(0, indice - tamano)
+        pagina_filas = filas[inicio:indice]
+        hay_mas = inicio > 0
+    else:
+        inicio = indice + 1 if cursor is not None else 0
+        pagina_filas = filas[inicio:inicio + tamano]
+        hay_mas = inicio + tamano < len(filas)
+    return pagina_filas, _armar_pagina(pagina_filas, llaves, cursor, hacia_atras, hay_mas, tamano)
+
+# ---------------------- CONSULTAS EN PARALELO ----------------------
+# Para páginas con varias lecturas que no dependen entre sí. Cada tarea es una
+# función que recibe un cursor (dictionary=True) en su propia conexión del
+# pool, así la página tarda lo que la consulta más lenta y no la suma. La
+# primera tarea corre en el hilo de la petición con su conexión; las demás en
+# un pool de QUERY_FANOUT_WORKERS hilos con el contexto de la petición copiado.
+# QUERY_FANOUT_TIMEOUT (segundos) limita cada consulta: la petición deja de
+# esperar al vencer y MySQL la corta por su lado con el hint
+# MAX_EXECUTION_TIME que se agrega a cada SELECT.
+HILOS_PARALELO = int(os.getenv("QUERY_FANOUT_WORKERS", "8"))
+ESPERA_PARALELO = float(os.getenv("QUERY_FANOUT_TIMEOUT", "10"))
+ERROR_TIEMPO_EXCEDIDO = 3024  # ER_QUERY_TIMEOUT de MySQL
+
+_ejecutor_paralelo = None
+_ejecutor_paralelo_pid = None
+_ejecutor_paralelo_lock = threading.Lock()
+
+class ConsultaVencida(Exception):
+    """Una consulta del fan-out no terminó dentro de su límite."""
+
+
+class CursorConLimite:
+    """Cursor que agrega MAX_EXECUTION_TIME a los SELECT."""
+
+    def __init__(self, cur, limite_ms):
+        self._cur = cur
+        self._hint = f"SELECT /*+ MAX_EXECUTION_TIME({int(limite_ms)}) */"
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def execute(self, sql, params=()):
+        texto = sql.lstrip()
+        if texto[:6].upper() == "SELECT":
+            sql = self._hint + texto[6:]
+        try:
+            return self._cur.execute(sql, params)
+        except mysql.connector.Error as e:
+            if e.errno == ERROR_TIEMPO_EXCEDIDO:
+                raise ConsultaVencida(str(e)) from e
+            raise
+
+
+def _obtener_ejecutor_paralelo():
+    global _ejecutor_paralelo, _ejecutor_paralelo_pid
+    if _ejecutor_paralelo_pid != os.getpid():
+        with _ejecutor_paralelo_lock:
+            if _ejecutor_paralelo_pid != os.getpid():
+                _ejecutor_paralelo = ThreadPoolExecutor(max_workers=HILOS_PARALELO, thread_name_prefix="consultas")
+                _ejecutor_paralelo_pid = os.getpid()
+    return _ejecutor_paralelo
+
+def _correr_tarea(conn, funcion, limite_ms):
+    cur = CursorConLimite(conn.cursor(dictionary=True), limite_ms)
+    try:
+        return funcion(cur)
+    finally:
+        cur.close()
+
+def _tarea_en_hilo(funcion, limite_ms):
+    # Corre con una copia del contexto de la petición (request.args, url_for)
+    # pero con su propio g: el tiempo en BD se devuelve para sumarlo a la
+    # petición original.
+    g._db_segundos = 0.0
+    g._sql_sentencias = 0
+    conn = obtener_pool().obtener()
+    try:
+        resultado = _correr_tarea(conn, funcion, limite_ms)
+    finally:
+        conn.liberar()
+    return resultado, g._db_segundos, g._sql_sentencias
+
+def consultar_en_paralelo(tareas, espera_max=None) -> dict:
+    """Ejecuta {nombre: funcion(cur)} en paralelo y devuelve {nombre: resultado}.
+
+    Las funciones solo deben leer: lo que no se confirme se descarta con el
+    rollback al devolver la conexión al pool.
+    """
+    espera_max = ESPERA_PARALELO if espera_max is None else espera_max
+    limite_ms = espera_max * 1000
+    nombres = list(tareas)
+    if not has_request_context():
+        resultados = {}
+        for nombre in nombres:
+            conn = obtener_pool().obtener()
+            try:
+                resultados[nombre] = _correr_tarea(conn, tareas[nombre], limite_ms)
+            finally:
+                conn.liberar()
+        return resultados
+
+    vence = time.monotonic() + espera_max
+    ejecutor = _obtener_ejecutor_paralelo()
+    futuros = {
+        nombre: ejecutor.submit(copy_current_request_context(_tarea_en_hilo), tareas[nombre], limite_ms)
+        for nombre in nombres[1:]
+    }
+    resultados = {}
+    try:
+        if nombres:
+            resultados[nombres[0]] = _correr_tarea(obtener_conexion(), tareas[nombres[0]], limite_ms)
+        for nombre, futuro in futuros.items():
+            try:
+                resultado, segundos, sentencias = futuro.result(timeout=max(0.0, vence - time.monotonic()))
+            except FuturoVencido:
+                raise ConsultaVencida(nombre)
+            resultados[nombre] = resultado
+            if "_db_segundos" in g:
+                g._db_segundos += segundos
+                g._sql_sentencias += sentencias
+    finally:
+        for futuro in futuros.values():
+            futuro.cancel()
+    return resultados
+
+# ---------------------- CACHÉ DEL CATÁLOGO ----------------------
+# El catálogo se lee muchísimo más de lo que se escribe, así que se guarda
+# completo en memoria con índices por ID_Item y SKU. Se recarga al vencer
+# CATALOG_CACHE_TTL, al escribir en este proceso (al_cambiar) y, para enterarse
+# de escrituras hechas en otros workers, revisando la versión de "catalogo"
+# cada CATALOG_VERSION_CHECK segundos.
+
+class CacheCatalogo:
+    """Catálogo completo en memoria, ordenado por (Tipo_de_pieza, SKU)."""
+
+    def __init__(self, ttl=60.0, verificar=5.0):
+        self.ttl = ttl
+        self.verificar = verificar
+        self._lock = threading.Lock()
+        self._datos = None
+        self._cargado = 0.0
+        self._verificado = 0.0
+        self._version = None
+        self.cargas = 0
+
+    def _cargar(self):
+        version = versiones_datos("catalogo")
+        conn = obtener_conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("""
+                SELECT ID_Item, SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio
+                FROM catalogo
+                ORDER BY Tipo_de_pieza, SKU
+            """)
+            filas = cur.fetchall()
+        finally:
+            cur.close(); conn.close()
+
+        datos = {
+            "filas": filas,
+            "por_id": {f["ID_Item"]: f for f in filas},
+            "por_sku": {f["SKU"]: f for f in filas},
+            "posiciones": {(f["Tipo_de_pieza"], f["SKU"]): i for i, f in enumerate(filas)},
+        }
+        ahora = time.monotonic()
+        self._datos, self._version = datos, version
+        self._cargado = self._verificado = ahora
+        self.cargas += 1
+        return datos
+
+    def _vigente(self):
+        datos = self._datos
+        ahora = time.monotonic()
+        if datos is not None and ahora - self._cargado <= self.ttl:
+            if ahora - self._verificado <= self.verificar:
+                return datos
+            self._verificado = ahora
+            version = versiones_datos("catalogo")
+            if version is None or version == self._version:
+                return datos
+        with self._lock:
+            if self._datos is not None and self._datos is not datos:
+                return self._datos
+            return self._cargar()
+
+    def invalidar(self):
+        self._datos = None
+
+    def filas(self) -> list:
+        return self._vigente()["filas"]
+
+    def por_id(self, id_item):
+        return self._vigente()["por_id"].get(id_item)
+
+    def por_sku(self, sku):
+        return self._vigente()["por_sku"].get(sku)
+
+    def pagina(self):
+        datos = self._vigente()
+        return paginar_en_memoria(datos["filas"], ["Tipo_de_pieza", "SKU"], datos["posiciones"])
+
+
+cache_catalogo = CacheCatalogo(
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "60")),
+    verificar=float(os.getenv("CATALOG_VERSION_CHECK", "5")),
+)
+al_cambiar("catalogo", cache_catalogo.invalidar)
+
+# ---------------------- BÚSQUEDA EN CATÁLOGO ----------------------
+# Índice en memoria para el autocompletado de piezas: prefijo de SKU y
+# palabras de Descripcion/Medida sin acentos ni mayúsculas. Se alimenta de
+# cache_catalogo; cuando éste se recarga solo se reindexan las piezas que
+# cambiaron, no el catálogo completo.
+
+def normalizar_busqueda(texto) -> str:
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+
+def _tokens(texto) -> set:
+    return set(re.findall(r"[a-z0-9]+(?:[/.][a-z0-9]+)*", normalizar_busqueda(texto)))
+
+def _rango_prefijo(lista, prefijo):
+    """(inicio, fin) de las cadenas de una lista ordenada que empiezan con prefijo."""
+    inicio = bisect.bisect_left(lista, prefijo)
+    fin = bisect.bisect_left(lista, prefijo + "\uffff")
+    return inicio, fin
+
+class IndiceCatalogo:
+    """Índice de búsqueda por SKU (prefijo) y por palabras de descripción/medida."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fuente = None
+        self._piezas = {}     # ID_Item -> (sku_norm, tokens, fila)
+        self._skus = []       # [(sku_norm, ID_Item)] ordenada
+        self._por_token = {}  # token -> {ID_Item}
+        self._tokens = []     # tokens ordenados, para búsquedas por prefijo
+        self.reindexadas = 0
+
+    def _agregar(self, fila):
+        sku = normalizar_busqueda(fila["SKU"])
+        tokens = _tokens(fila.get("Descripcion")) | _tokens(fila.get("Medida"))
+        id_item = fila["ID_Item"]
+        self._piezas[id_item] = (sku, tokens, fila)
+        bisect.insort(self._skus, (sku, id_item))
+        for token in tokens:
+            ids = self._por_token.get(token)
+            if ids is None:
+                ids = self._por_token[token] = set()
+                bisect.insort(self._tokens, token)
+            ids.add(id_item)
+        self.reindexadas += 1
+
+    def _quitar(self, id_item):
+        sku, tokens, _ = self._piezas.pop(id_item)
+        i = bisect.bisect_left(self._skus, (sku, id_item))
+        if i < len(self._skus) and self._skus[i] == (sku, id_item):
+            del self._skus[i]
+        for token in tokens:
+            ids = self._por_token[token]
+            ids.discard(id_item)
+            if not ids:
+                del self._por_token[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _sincronizar(self):
+        datos = cache_catalogo._vigente()
+        if datos is self._fuente:
+            return
+        with self._lock:
+            if datos is self._fuente:
+                return
+            nuevas = datos["por_id"]
+            for id_item in [i for i in self._piezas if i not in nuevas]:
+                self._quitar(id_item)
+            for id_item, fila in nuevas.items():
+                actual = self._piezas.get(id_item)
+                if actual is not None:
+                    vieja = actual[2]
+                    if (vieja["SKU"], vieja.get("Descripcion"), vieja.get("Medida")) == \
+                            (fila["SKU"], fila.get("Descripcion"), fila.get("Medida")):
+                        # Misma pieza indexada; solo apuntar a la fila nueva (precio, etc.).
+                        self._piezas[id_item] = (actual[0], actual[1], fila)
+                        continue
+                    self._quitar(id_item)
+                self._agregar(fila)
+            self._fuente = datos
+
+    def _ids_por_termino(self, termino):
+        if len(termino) < 2:
+            return set(self._por_token.get(termino, ()))
+        inicio, fin = _rango_prefijo(self._tokens, termino)
+        ids = set()
+        for token in self._tokens[inicio:fin]:
+            ids |= self._por_token[token]
+        return ids
+
+    def buscar(self, consulta, limite=10) -> list:
+        self._sincronizar()
+        consulta = normalizar_busqueda(consulta).strip()
+        if not consulta:
+            return []
+
+        with self._lock:
+            # 1) Coincidencias por prefijo de SKU (la forma más común de buscar).
+            inicio = bisect.bisect_left(self._skus, (consulta,))
+            fin = bisect.bisect_left(self._skus, (consulta + "\uffff",))
+            por_sku = [id_item for _, id_item in self._skus[inicio:min(fin, inicio + limite)]]
+
+            # 2) Todas las palabras deben aparecer (como prefijo) en descripción o medida.
+            terminos = sorted(_tokens(consulta), key=len, reverse=True)
+            por_texto = set()
+            if terminos:
+                por_texto = self._ids_por_termino(terminos[0])
+                for termino in terminos[1:]:
+                    if not por_texto:
+                        break
+                    por_texto &= self._ids_por_termino(termino)
+
+            vistos = set(por_sku)
+            faltan = max(0, limite - len(por_sku))
+            extra = heapq.nsmallest(faltan, ((self._piezas[i][0], i) for i in por_texto if i not in vistos))
+            ids = por_sku + [i for _, i in extra]
+            return [self._piezas[i][2] for i in ids]
+
+
+indice_catalogo = IndiceCatalogo()
 
 # ---------------------- LOGIN ----------------------
 @app.route("/")
@@ -144,7 +2094,13 @@ def login():
         cur.close(); conn.close()
 
     if user:
-        if user["contrasena"] and bcrypt.checkpw(password.encode("utf-8"), user["contrasena"].encode("utf-8")):
+        try:
+            valida = bool(user["contrasena"]) and contrasenas.verificar(password, user["contrasena"])
+        except ContrasenasOcupadas:
+            return _respuesta_ocupado()
+        if valida:
+            if contrasenas.necesita_rehash(user["contrasena"]):
+                contrasenas.rehash(usuario, password, user["contrasena"])
             session["user_name"] = user["nombre"]
             session["rol"] = user["rol"]
             session["correo"] = usuario  
@@ -187,13 +2143,17 @@ def usuarios():
             cursor.close(); conexion.close()
             return render_template("error.html", mensaje="❌ Faltan datos para registrar el usuario."), 400
 
-        password_hash = bcrypt.hashpw("Temporal123!".encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        try:
+            password_hash = contrasenas.hashear("Temporal123!")
+        except ContrasenasOcupadas:
+            cursor.close(); conexion.close()
+            return _respuesta_ocupado()
 
         cursor.execute(
             "INSERT INTO usuarios (nombre, correo, rol, contrasena) VALUES (%s, %s, %s, %s)",
             (nombre, correo, rol, password_hash),
         )
-        conexion.commit()
+        confirmar_cambios(conexion, "usuarios")
         cursor.close(); conexion.close()
         return redirect(url_for("usuarios"))
 
@@ -216,13 +2176,14 @@ def eliminar_usuario(usuario_id):
     conn = obtener_conexion()
     cur = conn.cursor()
     cur.execute("DELETE FROM usuarios WHERE id = %s", (usuario_id,))
-    conn.commit()
+    confirmar_cambios(conn, "usuarios")
     cur.close(); conn.close()
 
     return redirect(url_for("usuarios"))
 
 # ---------------------- CLIENTES ----------------------
 @app.route("/clientes", methods=["GET", "POST"])
+@condicional("clientes", roles=("admin", "empleado"))
 def clientes():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "empleado"]:
@@ -239,7 +2200,7 @@ def clientes():
         cur = conn.cursor()
         try:
             cur.execute("INSERT INTO clientes (nombre, correo, telefono) VALUES (%s, %s, %s)", (nombre, correo, telefono))
-            conn.commit()
+            confirmar_cambios(conn, "clientes")
         except mysql.connector.Error as e:
             cur.close(); conn.close()
             return render_template("error.html", mensaje=f"❌ Error al guardar: {e}"), 500
@@ -248,13 +2209,16 @@ def clientes():
 
     conn = obtener_conexion()
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id_cliente, nombre, correo, telefono FROM clientes ORDER BY nombre;")
-    clientes = cur.fetchall()
+    clientes, pagina = paginar_keyset(
+        cur, "SELECT id_cliente, nombre, correo, telefono FROM clientes",
+        [("nombre", "nombre"), ("id_cliente", "id_cliente")],
+    )
     cur.close(); conn.close()
 
     return render_template(
         "clientes.html",
         clientes=clientes,
+        pagina=pagina,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
         rol=rol_actual
@@ -271,7 +2235,7 @@ def eliminar_cliente(id_cliente):
     cur = conn.cursor()
     try:
         cur.execute("DELETE FROM clientes WHERE id_cliente = %s", (id_cliente,))
-        conn.commit()
+        confirmar_cambios(conn, "clientes")
     finally:
         cur.close()
         conn.close()
@@ -302,7 +2266,7 @@ def editar_cliente(id_cliente):
             SET nombre=%s, correo=%s, telefono=%s
             WHERE id_cliente=%s
         """, (nombre, correo, telefono, id_cliente))
-        conn.commit()
+        confirmar_cambios(conn, "clientes")
         cur.close(); conn.close()
         return redirect(url_for("clientes"))
 
@@ -323,6 +2287,7 @@ def editar_cliente(id_cliente):
 
 # ---- PROVEEDORES (listar + alta) ----
 @app.route("/proveedores", methods=["GET", "POST"])
+@condicional("proveedores", roles=("admin", "empleado"))
 def proveedores():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "empleado"]:
@@ -344,15 +2309,18 @@ def proveedores():
             "INSERT INTO proveedores (nombre, correo, telefono) VALUES (%s, %s, %s)",
             (nombre, correo, telefono)
         )
-        conn.commit()
+        confirmar_cambios(conn, "proveedores")
 
-    cur.execute("SELECT id_proveedor, nombre, correo, telefono FROM proveedores ORDER BY nombre;")
-    proveedores = cur.fetchall()
+    proveedores, pagina = paginar_keyset(
+        cur, "SELECT id_proveedor, nombre, correo, telefono FROM proveedores",
+        [("nombre", "nombre"), ("id_proveedor", "id_proveedor")],
+    )
     cur.close(); conn.close()
 
     return render_template(
         "proveedores.html",
         proveedores=proveedores,
+        pagina=pagina,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
         rol=rol_actual
@@ -384,7 +2352,7 @@ def editar_proveedor(id_proveedor):
                    SET nombre=%s, correo=%s, telefono=%s, direccion=%s
                  WHERE id_proveedor=%s
             """, (nombre, correo, telefono, direccion, id_proveedor))
-            conn.commit()
+            confirmar_cambios(conn, "proveedores")
         except mysql.connector.Error as e:
             cur.close(); conn.close()
             return render_template("error.html", mensaje=f"❌ Error al actualizar: {e}"), 500
@@ -412,13 +2380,361 @@ def eliminar_proveedor(prov_id):
     conn = obtener_conexion()
     cur = conn.cursor()
     cur.execute("DELETE FROM proveedores WHERE id_proveedor = %s", (prov_id,))
-    conn.commit()
+    confirmar_cambios(conn, "proveedores")
     cur.close(); conn.close()
 
     return redirect(url_for("proveedores"))
 
+# ---------------------- RESUMEN DE PEDIDOS ----------------------
+# Tabla resumen_pedidos con conteos y cantidades ya agregados, para que los
+# reportes no recorran todo el historial. Cada fila es (origen, dimensión,
+# valor, estado): dimensión "total" (valor vacío), "contraparte" (cliente o
+# proveedor) o "dia" (fecha de fecha_estado, AAAA-MM-DD). Las rutas que crean
+# pedidos o cambian su estado la actualizan en la misma transacción con
+# aplicar_a_resumen(); si algo escribe los pedidos por fuera,
+# `flask reconstruir-resumen` la recalcula desde cero.
+#
+# La construcción inicial se hace una sola vez por base, no una por worker:
+# queda registrada como versión de "resumen_pedidos" en versiones_datos, y
+# quien la hace toma antes el candado con nombre BLOQUEO_RESUMEN (GET_LOCK), así
+# que los demás workers esperan y luego la encuentran hecha. La reconstrucción
+# bloquea primero todas las filas de pedidos (FOR UPDATE): espera a que acaben
+# los escritores en curso y detiene a los nuevos hasta su commit, así ningún
+# pedido queda contado por la reconstrucción y además por su propio
+# aplicar_a_resumen().
+BLOQUEO_RESUMEN = "industrial_parts.resumen_pedidos"
+ORIGENES_PEDIDOS = {
+    # origen -> (tabla, llave, columna de la contraparte)
+    "clientes": ("pedidos_clientes", "id_pedidoc", "cliente"),
+    "proveedores": ("pedidos_proveedores", "id_pedidop", "proveedor"),
+}
+
+ESTADOS_PEDIDOS = {
+    "clientes": ("pendiente", "confirmado", "enviado", "entregado", "cancelado"),
+    "proveedores": ("pendiente", "confirmado", "enviado", "recibido", "cancelado"),
+}
+
+_resumen_listo = False
+
+def _resumen_construido(conn, bloquear=False) -> bool:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT version FROM versiones_datos WHERE tabla = 'resumen_pedidos'"
+                    + (" FOR UPDATE" if bloquear else ""))
+        fila = cur.fetchone()
+    finally:
+        cur.close()
+    return bool(fila and fila[0])
+
+def _con_bloqueo_resumen(conn, funcion, espera=300):
+    """Llama funcion() con el candado BLOQUEO_RESUMEN tomado en `conn`.
+
+    En SQLite no hay GET_LOCK ni hace falta: el primer FOR UPDATE abre la
+    transacción con BEGIN IMMEDIATE, que ya excluye a los demás escritores.
+    """
+    if MOTOR_BD == "sqlite":
+        return funcion()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT GET_LOCK(%s, %s)", (BLOQUEO_RESUMEN, espera))
+        if cur.fetchone()[0] != 1:
+            raise mysql.connector.OperationalError(
+                msg=f"No se obtuvo el candado {BLOQUEO_RESUMEN} en {espera} s", errno=1205)
+        try:
+            return funcion()
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (BLOQUEO_RESUMEN,))
+            cur.fetchall()
+    finally:
+        cur.close()
+
+def _asegurar_tabla_resumen():
+    # En su propia conexión: un CREATE TABLE en MySQL confirma implícitamente
+    # la transacción abierta y rompería la de la ruta que llama. Las rutas la
+    # llaman antes de escribir: la construcción inicial bloquea las tablas de
+    # pedidos y esperaría por las filas que la propia ruta tuviera bloqueadas.
+    global _resumen_listo
+    if _resumen_listo:
+        return
+    _asegurar_tabla_versiones()
+    conn = obtener_pool().obtener()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS resumen_pedidos (
+                origen VARCHAR(20) NOT NULL,
+                dimension VARCHAR(20) NOT NULL,
+                valor VARCHAR(255) NOT NULL,
+                estado VARCHAR(20) NOT NULL,
+                pedidos INT NOT NULL DEFAULT 0,
+                cantidad BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (origen, dimension, valor, estado)
+            )
+        """)
+        cur.close()
+        if not _resumen_construido(conn):
+            def construir():
+                conn.rollback()  # lectura nueva: otro worker pudo construirlo mientras esperábamos
+                if _resumen_construido(conn, bloquear=True):
+                    conn.rollback()
+                else:
+                    reconstruir_resumen_pedidos(conn)
+            _con_bloqueo_resumen(conn, construir)
+    finally:
+        conn.liberar()
+    _resumen_listo = True
+
+def pedidos_para_resumen(conn, origen, ids, bloquear=False) -> dict:
+    """{id: datos del pedido} con lo que el resumen necesita; los ids inexistentes no aparecen.
+
+    Con bloquear=True las filas quedan tomadas (FOR UPDATE) hasta el commit, para
+    que dos cambios de estado simultáneos no descuenten el mismo estado dos veces.
+    """
+    _asegurar_tabla_resumen()
+    ids = tuple(ids)
+    if not ids:
+        return {}
+    tabla, llave, contraparte = ORIGENES_PEDIDOS[origen]
+    marcas = ", ".join(["%s"] * len(ids))
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT {llave} AS id, {contraparte} AS contraparte, cantidad, estado, DATE(fecha_estado) AS dia
+            FROM {tabla} WHERE {llave} IN ({marcas}) ORDER BY {llave}
+        """ + (" FOR UPDATE" if bloquear else ""), ids)
+        return {fila["id"]: fila for fila in cur.fetchall()}
+    finally:
+        cur.close()
+
+def pedido_para_resumen(conn, origen, id_pedido, bloquear=False):
+    """Como pedidos_para_resumen() para un solo pedido; None si no existe."""
+    return pedidos_para_resumen(conn, origen, [id_pedido], bloquear).get(id_pedido)
+
+def _filas_resumen(origen, pedido, signo):
+    estado = pedido["estado"] or ""
+    cantidad = signo * int(pedido["cantidad"] or 0)
+    dia = str(pedido["dia"] or "")
+    return [
+        (origen, dimension, valor, estado, signo, cantidad)
+        for dimension, valor in (("total", ""), ("contraparte", pedido["contraparte"] or ""), ("dia", dia))
+    ]
+
+def aplicar_a_resumen(conn, origen, antes=None, despues=None):
+    """Resta `antes` y suma `despues` en el resumen, dentro de la transacción de `conn`.
+
+    Cada uno es un pedido o una lista de pedidos tal como los devuelve
+    pedidos_para_resumen(). Para un alta solo se pasa `despues`; para un cambio
+    de estado ambos, leídos antes y después del UPDATE. El commit es del llamador.
+    """
+    acumulado = {}
+    for pedidos, signo in ((antes, -1), (despues, 1)):
+        if isinstance(pedidos, dict):
+            pedidos = [pedidos]
+        for pedido in pedidos or ():
+            for *llave, n, cantidad in _filas_resumen(origen, pedido, signo):
+                suma = acumulado.setdefault(tuple(llave), [0, 0])
+                suma[0] += n
+                suma[1] += cantidad
+    filas = [(*llave, n, cantidad) for llave, (n, cantidad) in acumulado.items() if n or cantidad]
+    if not filas:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO resumen_pedidos (origen, dimension, valor, estado, pedidos, cantidad)
+            VALUES """ + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(filas)) + """
+            ON DUPLICATE KEY UPDATE pedidos = pedidos + VALUES(pedidos), cantidad = cantidad + VALUES(cantidad)
+        """, tuple(itertools.chain.from_iterable(filas)))
+    finally:
+        cur.close()
+
+def reconstruir_resumen_pedidos(conn) -> dict:
+    """Recalcula resumen_pedidos desde las tablas de pedidos en una sola transacción.
+
+    Mientras dura, las altas y cambios de estado de pedidos esperan (ver
+    RESUMEN DE PEDIDOS); conviene llamarla con el candado BLOQUEO_RESUMEN.
+    """
+    cur = conn.cursor()
+    try:
+        for tabla, _, _ in ORIGENES_PEDIDOS.values():
+            cur.execute(f"SELECT COUNT(*) FROM {tabla} FOR UPDATE")
+            cur.fetchall()
+        cur.execute("DELETE FROM resumen_pedidos")
+        for origen, (tabla, _, contraparte) in ORIGENES_PEDIDOS.items():
+            for dimension, valor in (("total", None),
+                                     ("contraparte", f"COALESCE({contraparte}, '')"),
+                                     ("dia", "COALESCE(DATE(fecha_estado), '')")):
+                agrupar = f"{valor}, COALESCE(estado, '')" if valor else "COALESCE(estado, '')"
+                cur.execute(f"""
+                    INSERT INTO resumen_pedidos (origen, dimension, valor, estado, pedidos, cantidad)
+                    SELECT %s, %s, {valor or "''"}, COALESCE(estado, ''), COUNT(*), COALESCE(SUM(cantidad), 0)
+                    FROM {tabla}
+                    GROUP BY {agrupar}
+                """, (origen, dimension))
+        cur.execute("SELECT origen, SUM(pedidos) FROM resumen_pedidos WHERE dimension = 'total' GROUP BY origen")
+        totales = {_texto(o): int(n) for o, n in cur.fetchall()}
+        confirmar_cambios(conn, "resumen_pedidos")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return totales
+
+@app.cli.command("reconstruir-resumen")
+def reconstruir_resumen_cli():
+    """Recalcula la tabla resumen_pedidos (corrige cualquier desfase)."""
+    _asegurar_tabla_resumen()
+    conn = obtener_pool().obtener()
+    try:
+        totales = _con_bloqueo_resumen(conn, lambda: reconstruir_resumen_pedidos(conn))
+    finally:
+        conn.liberar()
+    click.echo(" · ".join(f"{origen}: {n} pedidos" for origen, n in sorted(totales.items())) or "sin pedidos")
+
+# El reporte de administración trabaja sobre una ventana de fechas (?desde= y
+# ?hasta=, AAAA-MM-DD, ambas inclusive; por omisión los últimos
+# VENTANA_REPORTE días) aplicada a fecha_estado. Estados, meses y días salen
+# del resumen con GROUP BY sobre las filas "dia" de la ventana; los
+# principales clientes/proveedores de la ventana se agrupan sobre la tabla de
+# pedidos con el índice por fecha_estado (ver _asegurar_indices_fecha), así
+# que solo se lee la ventana pedida. El detalle va paginado por keyset.
+VENTANA_REPORTE = int(os.getenv("REPORT_WINDOW_DAYS", "30"))
+MAX_DIAS_DETALLE = 92  # ventanas más largas se muestran por mes, no por día
+
+_indices_fecha_listos = False
+
+def _asegurar_indices_fecha():
+    # Igual que las tablas: DDL en su propia conexión. Si no se puede crear
+    # (p. ej. sin permiso de ALTER) el reporte funciona igual, solo que más lento.
+    global _indices_fecha_listos
+    if _indices_fecha_listos:
+        return
+    conn = obtener_pool().obtener()
+    try:
+        cur = conn.cursor()
+        for tabla, _, _ in ORIGENES_PEDIDOS.values():
+            cur.execute("""
+                SELECT 1 FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'fecha_estado'
+                  AND seq_in_index = 1
+                LIMIT 1
+            """, (tabla,))
+            if cur.fetchone() is None:
+                cur.execute(f"CREATE INDEX idx_{tabla}_fecha_estado ON {tabla} (fecha_estado)")
+        cur.close()
+    except Exception as e:
+        print(f"⚠️ No se pudo asegurar el índice por fecha_estado: {e}")
+    finally:
+        conn.liberar()
+    _indices_fecha_listos = True
+
+def rango_reporte():
+    """(desde, hasta) como date a partir de la query string; ValueError si no es válido."""
+    def leer(nombre):
+        valor = request.args.get(nombre, "").strip()
+        return datetime.strptime(valor, "%Y-%m-%d").date() if valor else None
+
+    hasta = leer("hasta") or datetime.now().date()
+    desde = leer("desde") or hasta - timedelta(days=VENTANA_REPORTE - 1)
+    if desde > hasta:
+        raise ValueError("la fecha inicial es posterior a la final")
+    return desde, hasta
+
+def leer_resumen_pedidos(desde, hasta, top=15) -> dict:
+    """Totales por estado, mes, día y contraparte de los pedidos con fecha_estado en [desde, hasta]."""
+    _asegurar_tabla_resumen()
+    _asegurar_indices_fecha()
+    por_dia = (hasta - desde).days < MAX_DIAS_DETALLE
+    rango = (desde.isoformat(), hasta.isoformat())
+
+    resumen = {}
+    for origen in ORIGENES_PEDIDOS:
+        resumen[origen] = {"estados": {}, "total": {"pedidos": 0, "cantidad": 0},
+                           "historico": {"pedidos": 0, "cantidad": 0},
+                           "contrapartes": [], "meses": {}, "dias": {}}
+
+    def agrupar(destino, valor, estado, fila):
+        grupo = destino.setdefault(valor, {"nombre": valor, "pedidos": 0, "cantidad": 0, "estados": {}})
+        grupo["pedidos"] += int(fila["pedidos"])
+        grupo["cantidad"] += int(fila["cantidad"])
+        grupo["estados"][estado] = grupo["estados"].get(estado, 0) + int(fila["pedidos"])
+
+    conn = obtener_conexion()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT origen, SUM(pedidos) AS pedidos, SUM(cantidad) AS cantidad
+            FROM resumen_pedidos WHERE dimension = 'total'
+            GROUP BY origen
+        """)
+        for fila in cur.fetchall():
+            datos = resumen.get(_texto(fila["origen"]))
+            if datos is not None:
+                datos["historico"] = {"pedidos": int(fila["pedidos"] or 0), "cantidad": int(fila["cantidad"] or 0)}
+
+        cur.execute("""
+            SELECT origen, SUBSTRING(valor, 1, 7) AS mes, estado,
+                   SUM(pedidos) AS pedidos, SUM(cantidad) AS cantidad
+            FROM resumen_pedidos
+            WHERE dimension = 'dia' AND valor BETWEEN %s AND %s
+            GROUP BY origen, SUBSTRING(valor, 1, 7), estado
+            HAVING SUM(pedidos) <> 0
+        """, rango)
+        for fila in cur.fetchall():
+            datos = resumen.get(_texto(fila["origen"]))
+            if datos is None:
+                continue
+            estado = _texto(fila["estado"])
+            cuenta = datos["estados"].setdefault(estado, {"pedidos": 0, "cantidad": 0})
+            for campo in ("pedidos", "cantidad"):
+                cuenta[campo] += int(fila[campo])
+                datos["total"][campo] += int(fila[campo])
+            agrupar(datos["meses"], _texto(fila["mes"]), estado, fila)
+
+        if por_dia:
+            cur.execute("""
+                SELECT origen, valor, estado, pedidos, cantidad
+                FROM resumen_pedidos
+                WHERE dimension = 'dia' AND valor BETWEEN %s AND %s AND pedidos <> 0
+            """, rango)
+            for fila in cur.fetchall():
+                datos = resumen.get(_texto(fila["origen"]))
+                if datos is not None:
+                    agrupar(datos["dias"], _texto(fila["valor"]), _texto(fila["estado"]), fila)
+
+        for origen, (tabla, _, contraparte) in ORIGENES_PEDIDOS.items():
+            estados = ESTADOS_PEDIDOS[origen]
+            por_estado = ", ".join(
+                f"SUM(CASE WHEN estado = %s THEN 1 ELSE 0 END) AS e{i}" for i in range(len(estados)))
+            cur.execute(f"""
+                SELECT COALESCE({contraparte}, '') AS nombre, COUNT(*) AS pedidos,
+                       COALESCE(SUM(cantidad), 0) AS cantidad, {por_estado}
+                FROM {tabla}
+                WHERE fecha_estado >= %s AND fecha_estado < %s
+                GROUP BY COALESCE({contraparte}, '')
+                ORDER BY pedidos DESC, nombre
+                LIMIT %s
+            """, (*estados, datetime.combine(desde, datetime.min.time()),
+                  datetime.combine(hasta + timedelta(days=1), datetime.min.time()), top))
+            resumen[origen]["contrapartes"] = [{
+                "nombre": _texto(fila["nombre"]),
+                "pedidos": int(fila["pedidos"]),
+                "cantidad": int(fila["cantidad"]),
+                "estados": {e: int(fila[f"e{i}"]) for i, e in enumerate(estados) if fila[f"e{i}"]},
+            } for fila in cur.fetchall()]
+    finally:
+        cur.close(); conn.close()
+
+    for datos in resumen.values():
+        datos["meses"] = sorted(datos["meses"].values(), key=lambda m: m["nombre"], reverse=True)
+        datos["dias"] = sorted(datos["dias"].values(), key=lambda d: d["nombre"], reverse=True)
+    return resumen
+
 # ---------------------- PEDIDOS DE CLIENTES ------
 @app.route("/pedidos", methods=["GET", "POST"])
+@condicional("pedidos_clientes", "pedido_detalle", "clientes", "catalogo",
+             roles=("admin", "empleado", "consultor"))
 def pedidos():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "empleado", "consultor"]:
@@ -439,60 +2755,74 @@ def pedidos():
                 return render_template("error.html", mensaje="❌ Completa todos los campos del pedido."), 400
 
             try:
+                _asegurar_tabla_resumen()
                 cur.execute("""
                     INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad, estado)
                     VALUES (%s, %s, %s, %s, %s, %s)
                 """, (cliente, codigo_pedido, descripcion, medida, int(cantidad), estado_form))
-                conn.commit()
+                aplicar_a_resumen(conn, "clientes", despues=pedido_para_resumen(conn, "clientes", cur.lastrowid))
+                confirmar_cambios(conn, "pedidos_clientes")
             except mysql.connector.Error as e:
                 return render_template("error.html", mensaje=f"❌ Error al guardar: {e}"), 500
 
-        cur.execute("SELECT id_cliente, nombre FROM clientes ORDER BY nombre;")
-        clientes = cur.fetchall()
-
-        filtro_estado = (request.args.get("estado") or "").strip().lower()
-        estados_validos = {"pendiente","confirmado","enviado","entregado","cancelado"}
-
-        if filtro_estado and filtro_estado in estados_validos:
-            cur.execute("""
-                SELECT id_pedidoc, cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado
-                FROM pedidos_clientes
-                WHERE estado = %s
-                ORDER BY id_pedidoc DESC;
-            """, (filtro_estado,))
-        else:
-            cur.execute("""
-                SELECT id_pedidoc, cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado
-                FROM pedidos_clientes
-                ORDER BY id_pedidoc DESC;
-            """)
-        pedidos_cli = cur.fetchall()
+    finally:
+        cur.close(); conn.close()
 
-        piezas = []
-        if tabla_existe("catalogo"):
-            cur.execute("SELECT ID_Item, SKU, Descripcion, Medida FROM catalogo ORDER BY SKU;")
-            piezas = cur.fetchall()
+    filtro_estado = (request.args.get("estado") or "").strip().lower()
+    estados_validos = ESTADOS_PEDIDOS["clientes"]
+
+    where, params = "", ()
+    if filtro_estado and filtro_estado in estados_validos:
+        where, params = "estado = %s", (filtro_estado,)
+    sql_pagina, params_pagina, estado_pagina = sql_keyset(
+        """
+            SELECT id_pedidoc, cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado
+            FROM pedidos_clientes
+        """,
+        [("id_pedidoc", "id_pedidoc")], descendente=True, where=where, params=params,
+    )
 
-        detalles = []
-        if tabla_existe("pedido_detalle"):
-            cur.execute("""
-                SELECT d.id_detalle, d.id_pedido, p.codigo_pedido,
-                       c.Descripcion AS nombre_pieza, d.cantidad AS cantidad_pieza, d.medida
-                FROM pedido_detalle d
-                JOIN pedidos_clientes p ON d.id_pedido = p.id_pedidoc
-                LEFT JOIN catalogo c ON d.id_pieza = c.ID_Item
-                ORDER BY d.id_detalle DESC;
-            """)
-            detalles = cur.fetchall()
+    def leer_clientes(cur):
+        cur.execute("SELECT id_cliente, nombre FROM clientes ORDER BY nombre;")
+        return cur.fetchall()
+
+    def leer_pedidos(cur):
+        cur.execute(sql_pagina, params_pagina)
+        return cur.fetchall()
+
+    def leer_detalles(cur):
+        # Los detalles de la misma página, sin esperar a que llegue la lista
+        # de pedidos: la consulta de la página va como tabla derivada.
+        cur.execute(f"""
+            SELECT d.id_detalle, d.id_pedido, p.codigo_pedido,
+                   c.Descripcion AS nombre_pieza, d.cantidad AS cantidad_pieza, d.medida
+            FROM pedido_detalle d
+            JOIN ({sql_pagina}) pg ON pg.id_pedidoc = d.id_pedido
+            JOIN pedidos_clientes p ON d.id_pedido = p.id_pedidoc
+            LEFT JOIN catalogo c ON d.id_pieza = c.ID_Item
+            ORDER BY d.id_detalle DESC;
+        """, params_pagina)
+        return cur.fetchall()
+
+    tareas = {"pedidos": leer_pedidos, "clientes": leer_clientes}
+    if tabla_existe("pedido_detalle"):
+        tareas["detalles"] = leer_detalles
+    try:
+        resultados = consultar_en_paralelo(tareas)
+    except ConsultaVencida:
+        return render_template("error.html", mensaje="❌ La consulta de pedidos tardó demasiado. Intenta de nuevo."), 504
 
-    finally:
-        cur.close(); conn.close()
+    clientes = resultados["clientes"]
+    pedidos_cli, pagina = _cerrar_pagina(resultados["pedidos"], estado_pagina)
+    # La tabla derivada trae una fila de más (la que indica si hay otra página).
+    ids_pagina = {p["id_pedidoc"] for p in pedidos_cli}
+    detalles = [d for d in resultados.get("detalles", []) if d["id_pedido"] in ids_pagina]
 
     return render_template(
         "pedidos.html",
         clientes=clientes,
         pedidos=pedidos_cli,
-        piezas=piezas,
+        pagina=pagina,
         detalles=detalles,
         filtro_estado=filtro_estado,
         user_name=session.get("user_name"),
@@ -536,19 +2866,22 @@ def actualizar_estado_pedcli(pedido_id):
         return render_template("error.html", mensaje="❌ No tienes permiso para cambiar estados."), 403
 
     nuevo_estado = (request.form.get("estado") or "").strip().lower()
-    estados_validos = {"pendiente","confirmado","enviado","entregado","cancelado"}
+    estados_validos = ESTADOS_PEDIDOS["clientes"]
     if nuevo_estado not in estados_validos:
         return render_template("error.html", mensaje="❌ Estado inválido."), 400
 
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
+        antes = pedido_para_resumen(conn, "clientes", pedido_id, bloquear=True)
         cur.execute("""
             UPDATE pedidos_clientes
                SET estado = %s
              WHERE id_pedidoc = %s
         """, (nuevo_estado, pedido_id))
-        conn.commit()
+        if antes and antes["estado"] != nuevo_estado:
+            aplicar_a_resumen(conn, "clientes", antes, pedido_para_resumen(conn, "clientes", pedido_id))
+        confirmar_cambios(conn, "pedidos_clientes")
     except mysql.connector.Error as e:
         cur.close(); conn.close()
         return render_template("error.html", mensaje=f"❌ Error al actualizar: {e}"), 500
@@ -583,7 +2916,7 @@ def detalle_pedido():
             INSERT INTO pedido_detalle (id_pedido, id_pieza, cantidad, medida)
             VALUES (%s, %s, %s, %s)
         """, (int(id_pedido), int(id_pieza), int(cantidad), medida))
-        conn.commit()
+        confirmar_cambios(conn, "pedido_detalle")
     except mysql.connector.Error as e:
         cur.close(); conn.close()
         return render_template("error.html", mensaje=f"❌ Error al guardar detalle: {e}"), 500
@@ -606,7 +2939,7 @@ def eliminar_detalle(id_detalle):
     cur = conn.cursor()
     try:
         cur.execute("DELETE FROM pedido_detalle WHERE id_detalle=%s", (id_detalle,))
-        conn.commit()
+        confirmar_cambios(conn, "pedido_detalle")
     finally:
         cur.close(); conn.close()
 
@@ -615,6 +2948,7 @@ def eliminar_detalle(id_detalle):
 
 # ---------------------- PEDIDOS PROVEEDORES ----------------------
 @app.route("/pedidos_proveedores", methods=["GET", "POST"])
+@condicional("pedidos_proveedores", "proveedores", roles=("admin", "empleado"))
 def pedidos_proveedores():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "empleado"]:
@@ -633,11 +2967,13 @@ def pedidos_proveedores():
         conn = obtener_conexion()
         cur = conn.cursor()
         try:
+            _asegurar_tabla_resumen()
             cur.execute("""
                 INSERT INTO pedidos_proveedores (proveedor, codigo_pedido, descripcion, medida, cantidad, estado)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (proveedor, codigo_pedido, descripcion, medida, int(cantidad), 'pendiente'))
-            conn.commit()
+            aplicar_a_resumen(conn, "proveedores", despues=pedido_para_resumen(conn, "proveedores", cur.lastrowid))
+            confirmar_cambios(conn, "pedidos_proveedores")
         except mysql.connector.Error as e:
             cur.close(); conn.close()
             return render_template("error.html", mensaje=f"❌ Error al guardar: {e}"), 500
@@ -645,7 +2981,7 @@ def pedidos_proveedores():
         return redirect(url_for("pedidos_proveedores"))
 
     filtro_estado = request.args.get("estado", "").strip()
-    estados_validos = {"pendiente","confirmado","enviado","recibido","cancelado"}
+    estados_validos = ESTADOS_PEDIDOS["proveedores"]
 
     conn = obtener_conexion()
     cur = conn.cursor(dictionary=True)
@@ -653,20 +2989,16 @@ def pedidos_proveedores():
         cur.execute("SELECT id_proveedor, nombre FROM proveedores ORDER BY nombre;")
         proveedores = cur.fetchall()
 
+        where, params = "", ()
         if filtro_estado and filtro_estado in estados_validos:
-            cur.execute("""
-                SELECT id_pedidop, proveedor, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado
-                FROM pedidos_proveedores
-                WHERE estado = %s
-                ORDER BY id_pedidop DESC;
-            """, (filtro_estado,))
-        else:
-            cur.execute("""
+            where, params = "estado = %s", (filtro_estado,)
+        pedidos_prov, pagina = paginar_keyset(
+            cur, """
                 SELECT id_pedidop, proveedor, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado
                 FROM pedidos_proveedores
-                ORDER BY id_pedidop DESC;
-            """)
-        pedidos_prov = cur.fetchall()
+            """,
+            [("id_pedidop", "id_pedidop")], descendente=True, where=where, params=params,
+        )
     finally:
         cur.close(); conn.close()
 
@@ -674,6 +3006,7 @@ def pedidos_proveedores():
         "pedidos_proveedores.html",
         proveedores=proveedores,
         pedidos=pedidos_prov,
+        pagina=pagina,
         filtro_estado=filtro_estado,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
@@ -687,19 +3020,22 @@ def actualizar_estado_pedprov(pedido_id):
         return render_template("error.html", mensaje="❌ No tienes permiso para cambiar estados."), 403
 
     nuevo_estado = request.form.get("estado", "").strip()
-    estados_validos = {"pendiente","confirmado","enviado","recibido","cancelado"}
+    estados_validos = ESTADOS_PEDIDOS["proveedores"]
     if nuevo_estado not in estados_validos:
         return render_template("error.html", mensaje="❌ Estado inválido."), 400
 
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
+        antes = pedido_para_resumen(conn, "proveedores", pedido_id, bloquear=True)
         cur.execute("""
             UPDATE pedidos_proveedores
             SET estado = %s
             WHERE id_pedidop = %s
         """, (nuevo_estado, pedido_id))
-        conn.commit()
+        if antes and antes["estado"] != nuevo_estado:
+            aplicar_a_resumen(conn, "proveedores", antes, pedido_para_resumen(conn, "proveedores", pedido_id))
+        confirmar_cambios(conn, "pedidos_proveedores")
     except mysql.connector.Error as e:
         cur.close(); conn.close()
         return render_template("error.html", mensaje=f"❌ Error al actualizar: {e}"), 500
@@ -708,28 +3044,137 @@ def actualizar_estado_pedprov(pedido_id):
     ref = request.args.get("ref")
     return redirect(ref if ref else url_for("pedidos_proveedores"))
 
+# ---------------------- CAMBIO DE ESTADO EN LOTE ----------------------
+# Cambia el estado de muchos pedidos en una sola petición y una sola
+# transacción: las filas se bloquean en orden de id y se actualizan con un
+# UPDATE ... WHERE id IN (...) por cada LOTE_ESTADOS ids. El resumen de pedidos
+# se ajusta en la misma transacción.
+LOTE_ESTADOS = 500
+
+def cambiar_estado_en_lote(origen, ids, nuevo_estado) -> dict:
+    """Pone `nuevo_estado` a los pedidos `ids`; devuelve el resultado de cada id."""
+    tabla, llave, _ = ORIGENES_PEDIDOS[origen]
+    resultados, validos = [], []
+    for valor in ids:
+        try:
+            id_pedido = int(valor)
+            if isinstance(valor, bool) or id_pedido <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            resultados.append({"id": valor, "ok": False, "error": "Id inválido"})
+            continue
+        resultados.append({"id": id_pedido})
+        validos.append(id_pedido)
+
+    ids = sorted(set(validos))
+    lotes = [ids[k:k + LOTE_ESTADOS] for k in range(0, len(ids), LOTE_ESTADOS)]
+    _asegurar_tabla_resumen()
+    conn = obtener_conexion()
+    cur = conn.cursor()
+    try:
+        # Transacción nueva para que FOR UPDATE no arrastre lecturas previas.
+        conn.rollback()
+        antes = {}
+        for parte in lotes:
+            antes.update(pedidos_para_resumen(conn, origen, parte, bloquear=True))
+
+        cambiar = [i for i in ids if i in antes and antes[i]["estado"] != nuevo_estado]
+        for k in range(0, len(cambiar), LOTE_ESTADOS):
+            parte = cambiar[k:k + LOTE_ESTADOS]
+            marcas = ", ".join(["%s"] * len(parte))
+            cur.execute(f"UPDATE {tabla} SET estado = %s WHERE {llave} IN ({marcas})", (nuevo_estado, *parte))
+
+        despues = {}
+        for k in range(0, len(cambiar), LOTE_ESTADOS):
+            despues.update(pedidos_para_resumen(conn, origen, cambiar[k:k + LOTE_ESTADOS]))
+        aplicar_a_resumen(conn, origen, [antes[i] for i in cambiar], list(despues.values()))
+        confirmar_cambios(conn, *((tabla,) if cambiar else ()))
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close(); conn.close()
+
+    cambiados = set(cambiar)
+    for r in resultados:
+        if "ok" in r:
+            continue
+        pedido = antes.get(r["id"])
+        if pedido is None:
+            r.update(ok=False, error="Pedido no encontrado")
+        else:
+            r.update(ok=True, estado_anterior=pedido["estado"], cambiado=r["id"] in cambiados)
+    return {
+        "estado": nuevo_estado,
+        "cambiados": len(cambiados),
+        "sin_cambio": sum(1 for r in resultados if r["ok"] and not r["cambiado"]),
+        "errores": sum(1 for r in resultados if not r["ok"]),
+        "resultados": resultados,
+    }
+
+def _estado_en_lote(origen):
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "empleado"]:
+        return jsonify({"error": "No tienes permiso para cambiar estados."}), 403
+
+    datos = request.get_json(silent=True)
+    if datos is None:
+        datos = {"ids": request.form.getlist("ids"), "estado": request.form.get("estado")}
+    if not isinstance(datos, dict) or not isinstance(datos.get("ids"), list) or not datos["ids"]:
+        return jsonify({"error": "Envía una lista 'ids' con al menos un pedido."}), 400
+    nuevo_estado = str(datos.get("estado") or "").strip().lower()
+    if nuevo_estado not in ESTADOS_PEDIDOS[origen]:
+        return jsonify({"error": f"Estado inválido: {nuevo_estado or '(vacío)'}"}), 400
+
+    try:
+        resumen = cambiar_estado_en_lote(origen, datos["ids"], nuevo_estado)
+    except mysql.connector.Error as e:
+        return jsonify({"error": f"Error al actualizar: {e}"}), 500
+    return jsonify(resumen), (200 if not resumen["errores"] else 207)
+
+@app.route("/pedidos/estado", methods=["POST"])
+def estado_lote_pedcli():
+    """Cambio de estado de varios pedidos de clientes: {"ids": [...], "estado": "enviado"}."""
+    return _estado_en_lote("clientes")
+
+@app.route("/pedidos_proveedores/estado", methods=["POST"])
+def estado_lote_pedprov():
+    """Cambio de estado de varios pedidos a proveedores: {"ids": [...], "estado": "recibido"}."""
+    return _estado_en_lote("proveedores")
+
 # ---------------------- CATALOGO ----------------------
 @app.route("/catalogo")
+@condicional("catalogo")
 def catalogo():
     rol_actual = session.get("rol")
-    conn = obtener_conexion()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio
-        FROM catalogo
-        ORDER BY Tipo_de_pieza, SKU;
-    """)
-    items = cur.fetchall()
-    cur.close(); conn.close()
+    items, pagina = cache_catalogo.pagina()
 
     return render_template(
         "catalogo.html",
         items=items,
+        pagina=pagina,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
         rol=rol_actual
     )
 
+@app.route("/catalogo/buscar")
+@condicional("catalogo", roles=("admin", "empleado", "consultor"))
+def buscar_piezas():
+    if session.get("rol") not in ["admin", "empleado", "consultor"]:
+        return jsonify({"error": "Acceso denegado"}), 403
+
+    consulta = request.args.get("q", "")
+    try:
+        limite = max(1, min(int(request.args.get("n", "10")), 50))
+    except ValueError:
+        limite = 10
+    piezas = indice_catalogo.buscar(consulta, limite)
+    return jsonify([
+        {"ID_Item": p["ID_Item"], "SKU": p["SKU"], "Descripcion": p["Descripcion"], "Medida": p["Medida"]}
+        for p in piezas
+    ])
+
 @app.route("/agregar_pieza")
 def agregar_pieza():
     return redirect(url_for("catalogo"))
@@ -747,6 +3192,7 @@ def guardar_pieza():
     if not SKU or not Tipo or not Unidades or not Precio:
         return render_template("error.html", mensaje="❌ Campos obligatorios faltantes para la pieza."), 400
 
+    _asegurar_tabla_stock_bajo()
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
@@ -761,7 +3207,8 @@ def guardar_pieza():
                 INSERT INTO catalogo (SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (SKU, Tipo, Descripcion, Medida, int(Unidades), float(Precio)))
-        conn.commit()
+            sincronizar_stock_bajo(conn, [cur.lastrowid])
+        confirmar_cambios(conn, "catalogo", "inventario")
     except mysql.connector.Error as e:
         cur.close(); conn.close()
         return render_template("error.html", mensaje=f"❌ Error al guardar la pieza: {e}"), 500
@@ -776,11 +3223,15 @@ def eliminar_pieza_por_sku(sku):
     if rol_actual not in ["admin", "empleado"]:
         return render_template("error.html", mensaje="❌ No tienes permiso para eliminar piezas."), 403
 
+    _asegurar_tabla_stock_bajo()
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
+        cur.execute("SELECT ID_Item FROM catalogo WHERE SKU=%s", (sku,))
+        ids = [fila[0] for fila in cur.fetchall()]
         cur.execute("DELETE FROM catalogo WHERE SKU=%s", (sku,))
-        conn.commit()
+        sincronizar_stock_bajo(conn, ids)
+        confirmar_cambios(conn, "catalogo", "inventario")
     finally:
         cur.close(); conn.close()
     return redirect(url_for("catalogo"))
@@ -791,11 +3242,13 @@ def eliminar_pieza(id):
     if rol_actual not in ["admin", "empleado"]:
         return render_template("error.html", mensaje="❌ No tienes permiso para eliminar piezas."), 403
 
+    _asegurar_tabla_stock_bajo()
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
         cur.execute("DELETE FROM catalogo WHERE ID_Item=%s", (id,))
-        conn.commit()
+        sincronizar_stock_bajo(conn, [id])
+        confirmar_cambios(conn, "catalogo", "inventario")
     finally:
         cur.close(); conn.close()
     return redirect(url_for("catalogo"))
@@ -821,7 +3274,7 @@ def editar_pieza(id):
             cur.execute("""
                 UPDATE catalogo SET Tipo_de_pieza=%s, Descripcion=%s, Medida=%s, Precio=%s WHERE ID_Item=%s
             """, (tipo, descripcion, medida, float(precio), id))
-            conn.commit()
+            confirmar_cambios(conn, "catalogo", "inventario")
             return redirect(url_for("catalogo"))
 
         cur.execute("SELECT * FROM catalogo WHERE ID_Item=%s", (id,))
@@ -835,8 +3288,149 @@ def editar_pieza(id):
     return render_template("editar_pieza.html", pieza=pieza,
                            user_name=session.get("user_name"), saludo=obtener_saludo(), rol=rol_actual)
 
+# ---------------------- STOCK BAJO ----------------------
+# Tabla stock_bajo con solo las piezas que están por debajo de su mínimo
+# ("bajo": stock < stock_min) o cerca de él ("medio": stock < stock_min +
+# STOCK_MARGIN, default 200), la misma regla que usaba reportes_inventario.html.
+# Cada escritura de stock la sincroniza para las piezas que tocó, dentro de su
+# transacción, así /inventario/stock_bajo solo lee unas cuantas filas por
+# llave en lugar de recorrer todo el inventario. `desde` guarda cuándo entró
+# la pieza a la lista. `flask reconstruir-stock-bajo` la recalcula completa.
+MARGEN_STOCK = int(os.getenv("STOCK_MARGIN", "200"))
+LOTE_STOCK_BAJO = 500
+
+_stock_bajo_listo = False
+
+def _asegurar_tabla_stock_bajo():
+    # Igual que el resumen de pedidos: DDL y carga inicial en su propia
+    # conexión y antes de que la ruta escriba.
+    global _stock_bajo_listo
+    if _stock_bajo_listo:
+        return
+    existia = "stock_bajo" in registro_esquema.refrescar()
+    conn = obtener_pool().obtener()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS stock_bajo (
+                ID_Item INT NOT NULL PRIMARY KEY,
+                nivel VARCHAR(10) NOT NULL,
+                faltante INT NOT NULL,
+                desde TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.close()
+        if not existia:
+            reconstruir_stock_bajo(conn)
+            confirmar_cambios(conn, "stock_bajo")
+            registro_esquema.invalidar()
+    finally:
+        conn.liberar()
+    _stock_bajo_listo = True
+
+_SQL_STOCK_BAJO = """
+    INSERT INTO stock_bajo (ID_Item, nivel, faltante)
+    SELECT ID_Item, CASE WHEN stock < stock_min THEN 'bajo' ELSE 'medio' END, stock_min - stock
+    FROM inventario
+    WHERE {filtro} stock < stock_min + %s
+    ON DUPLICATE KEY UPDATE nivel = VALUES(nivel), faltante = VALUES(faltante)
+"""
+
+def sincronizar_stock_bajo(conn, ids):
+    """Pone al día stock_bajo para `ids` dentro de la transacción de `conn` (el commit es del llamador)."""
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    cur = conn.cursor()
+    try:
+        for k in range(0, len(ids), LOTE_STOCK_BAJO):
+            parte = tuple(ids[k:k + LOTE_STOCK_BAJO])
+            marcas = ", ".join(["%s"] * len(parte))
+            cur.execute(f"""
+                DELETE FROM stock_bajo
+                WHERE ID_Item IN ({marcas})
+                  AND ID_Item NOT IN (SELECT ID_Item FROM inventario
+                                      WHERE ID_Item IN ({marcas}) AND stock < stock_min + %s)
+            """, parte + parte + (MARGEN_STOCK,))
+            cur.execute(_SQL_STOCK_BAJO.format(filtro=f"ID_Item IN ({marcas}) AND"), parte + (MARGEN_STOCK,))
+    finally:
+        cur.close()
+
+def reconstruir_stock_bajo(conn) -> int:
+    """Recalcula stock_bajo completa dentro de la transacción de `conn` (el commit es del llamador).
+
+    Conserva `desde` de las piezas que siguen en la lista; devuelve cuántas hay.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            DELETE FROM stock_bajo
+            WHERE ID_Item NOT IN (SELECT ID_Item FROM inventario WHERE stock < stock_min + %s)
+        """, (MARGEN_STOCK,))
+        cur.execute(_SQL_STOCK_BAJO.format(filtro=""), (MARGEN_STOCK,))
+        cur.execute("SELECT COUNT(*) FROM stock_bajo")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+@app.cli.command("reconstruir-stock-bajo")
+def reconstruir_stock_bajo_cli():
+    """Recalcula la lista de piezas con stock bajo."""
+    _asegurar_tabla_stock_bajo()
+    conn = obtener_pool().obtener()
+    try:
+        total = reconstruir_stock_bajo(conn)
+        confirmar_cambios(conn, "stock_bajo")
+    finally:
+        conn.liberar()
+    click.echo(f"{total} piezas en la lista de stock bajo (margen {MARGEN_STOCK}).")
+
+@app.route("/inventario/stock_bajo")
+@condicional("inventario", "catalogo", "stock_bajo", roles=("admin", "empleado", "consultor"))
+def stock_bajo():
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "empleado", "consultor"]:
+        return render_template("error.html", mensaje="❌ Acceso denegado: no tienes permiso para ver inventario."), 403
+
+    # ?nivel=bajo (default) solo las que ya están bajo el mínimo; ?nivel=medio
+    # también las que están cerca.
+    niveles = ("bajo", "medio") if request.args.get("nivel") == "medio" else ("bajo",)
+    _asegurar_tabla_stock_bajo()
+    conn = obtener_conexion()
+    cur = conn.cursor(dictionary=True)
+    try:
+        marcas = ", ".join(["%s"] * len(niveles))
+        cur.execute(f"""
+            SELECT s.ID_Item, c.SKU, c.Tipo_de_pieza, c.Descripcion, c.Medida, c.Precio,
+                   i.stock, i.stock_min, s.nivel, s.faltante, s.desde
+            FROM stock_bajo s
+            JOIN inventario i ON i.ID_Item = s.ID_Item
+            JOIN catalogo c ON c.ID_Item = s.ID_Item
+            WHERE s.nivel IN ({marcas})
+            ORDER BY s.nivel, s.faltante DESC, c.SKU
+        """, niveles)
+        piezas = cur.fetchall()
+    finally:
+        cur.close(); conn.close()
+
+    if request.args.get("formato") == "json" or request.accept_mimetypes.best == "application/json":
+        for pieza in piezas:
+            pieza["Precio"] = float(pieza["Precio"]) if pieza["Precio"] is not None else None
+            pieza["desde"] = str(pieza["desde"]) if pieza["desde"] is not None else None
+        return jsonify({"niveles": list(niveles), "margen": MARGEN_STOCK, "total": len(piezas), "piezas": piezas})
+
+    return render_template(
+        "reportes_inventario.html",
+        datos=piezas,
+        titulo="⚠️ Piezas con stock bajo",
+        user_name=session.get("user_name"),
+        saludo=obtener_saludo(),
+        rol=rol_actual
+    )
+
 # ---------------------- INVENTARIO ----------------------
 @app.route("/inventario")
+@condicional("inventario", "catalogo", roles=("admin", "empleado", "consultor"))
 def inventario():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "empleado", "consultor"]:
@@ -845,27 +3439,29 @@ def inventario():
     conn = obtener_conexion()
     cur = conn.cursor(dictionary=True)
     try:
-        cur.execute("""
-            SELECT 
-                i.ID_Item,
-                c.SKU,
-                c.Tipo_de_pieza,
-                c.Descripcion,
-                c.Medida,
-                c.Precio,
-                i.stock,
-                i.stock_min
-            FROM inventario i
-            JOIN catalogo c ON i.ID_Item = c.ID_Item
-            ORDER BY c.Tipo_de_pieza, c.SKU;
-        """)
-        inventario = cur.fetchall()
+        inventario, pagina = paginar_keyset(
+            cur, """
+                SELECT 
+                    i.ID_Item,
+                    c.SKU,
+                    c.Tipo_de_pieza,
+                    c.Descripcion,
+                    c.Medida,
+                    c.Precio,
+                    i.stock,
+                    i.stock_min
+                FROM inventario i
+                JOIN catalogo c ON i.ID_Item = c.ID_Item
+            """,
+            [("c.Tipo_de_pieza", "Tipo_de_pieza"), ("c.SKU", "SKU")],
+        )
     finally:
         cur.close(); conn.close()
 
     return render_template(
         "inventario.html",
         inventario=inventario,
+        pagina=pagina,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
         rol=rol_actual
@@ -883,16 +3479,382 @@ def actualizar_stock():
     if not id_item or not nuevo_stock:
         return render_template("error.html", mensaje="❌ Faltan datos para actualizar stock."), 400
 
+    _asegurar_tabla_stock_bajo()
     conn = obtener_conexion()
     cur = conn.cursor()
     try:
         cur.execute("UPDATE inventario SET stock = %s WHERE ID_Item = %s", (int(nuevo_stock), int(id_item)))
-        conn.commit()
+        sincronizar_stock_bajo(conn, [int(id_item)])
+        confirmar_cambios(conn, "inventario")
     finally:
         cur.close(); conn.close()
 
     return redirect(url_for("inventario"))
 
+# ---------------------- IMPORTACIÓN MASIVA (CSV) ----------------------
+# Carga listas de precios / conteos de stock desde CSV. El archivo se lee
+# fila por fila, se valida y se escribe por lotes (IMPORT_BATCH filas) con un
+# INSERT ... ON DUPLICATE KEY UPDATE de varias filas y un commit por lote.
+# Requiere índice único en catalogo.SKU y llave primaria en inventario.ID_Item.
+# Si un lote falla, se reintenta fila por fila para reportar la fila culpable.
+LOTE_IMPORTACION = int(os.getenv("IMPORT_BATCH", "1000"))
+MAX_ERRORES_IMPORTACION = 1000
+TABLAS_IMPORTABLES = {
+    # tabla -> tablas cuya versión cambia al importar (inventario muestra datos del catálogo)
+    "catalogo": ("catalogo", "inventario"),
+    "inventario": ("inventario",),
+}
+
+_ALIAS_COLUMNAS = {
+    "sku": "SKU",
+    "id_item": "ID_Item", "id": "ID_Item",
+    "tipo_de_pieza": "Tipo_de_pieza", "tipo": "Tipo_de_pieza",
+    "descripcion": "Descripcion",
+    "medida": "Medida",
+    "unidades": "Unidades",
+    "precio": "Precio",
+    "stock": "stock",
+    "stock_min": "stock_min", "stock_minimo": "stock_min",
+}
+
+def _columna_canonica(nombre):
+    clave = re.sub(r"[\s.]+", "_", normalizar_busqueda(nombre).strip())
+    return _ALIAS_COLUMNAS.get(clave)
+
+def _entero(valor, campo, minimo=None):
+    try:
+        numero = int(str(valor).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser entero: {valor!r}")
+    if minimo is not None and numero < minimo:
+        raise ValueError(f"{campo} no puede ser menor que {minimo}")
+    return numero
+
+def _decimal(valor, campo):
+    try:
+        return float(str(valor).replace("$", "").strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser numérico: {valor!r}")
+
+def _fila_catalogo(fila):
+    sku = (fila.get("SKU") or "").strip()
+    tipo = (fila.get("Tipo_de_pieza") or "").strip()
+    if not sku or not tipo:
+        raise ValueError("SKU y Tipo_de_pieza son obligatorios")
+    return (
+        sku, tipo,
+        (fila.get("Descripcion") or "").strip(),
+        (fila.get("Medida") or "").strip(),
+        _entero(fila.get("Unidades"), "Unidades", 0),
+        _decimal(fila.get("Precio"), "Precio"),
+    )
+
+def _fila_inventario(fila):
+    id_item = (fila.get("ID_Item") or "").strip()
+    sku = (fila.get("SKU") or "").strip()
+    if not id_item and not sku:
+        raise ValueError("Se requiere ID_Item o SKU")
+    stock = _entero(fila.get("stock"), "stock", 0)
+    stock_min = fila.get("stock_min")
+    stock_min = _entero(stock_min, "stock_min", 0) if (stock_min or "").strip() else None
+    return (_entero(id_item, "ID_Item", 1) if id_item else sku, stock, stock_min)
+
+_SQL_IMPORTACION = {
+    "catalogo": """
+        INSERT INTO catalogo (SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            Tipo_de_pieza = VALUES(Tipo_de_pieza), Descripcion = VALUES(Descripcion),
+            Medida = VALUES(Medida), Unidades = VALUES(Unidades), Precio = VALUES(Precio)
+    """,
+    "inventario": """
+        INSERT INTO inventario (ID_Item, stock, stock_min)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE stock = VALUES(stock), stock_min = VALUES(stock_min)
+    """,
+    # Filas sin stock_min: conservar el mínimo que ya tenga la pieza.
+    "inventario_sin_minimo": """
+        INSERT INTO inventario (ID_Item, stock, stock_min)
+        VALUES (%s, %s, 0)
+        ON DUPLICATE KEY UPDATE stock = VALUES(stock)
+    """,
+}
+
+def _resolver_skus(cur, lote, errores):
+    """Cambia SKU por ID_Item en un lote de inventario; descarta los SKU desconocidos."""
+    skus = sorted({fila[0] for _, fila in lote if isinstance(fila[0], str)})
+    ids = {}
+    if skus:
+        marcas = ", ".join(["%s"] * len(skus))
+        cur.execute(f"SELECT SKU, ID_Item FROM catalogo WHERE SKU IN ({marcas})", tuple(skus))
+        ids = {_texto(sku): id_item for sku, id_item in cur.fetchall()}
+    resueltas = []
+    for linea, (clave, stock, stock_min) in lote:
+        if isinstance(clave, str):
+            if clave not in ids:
+                errores.append({"linea": linea, "error": f"SKU no existe en catálogo: {clave}"})
+                continue
+            clave = ids[clave]
+        resueltas.append((linea, (clave, stock, stock_min)))
+    return resueltas
+
+def _ejecutar_lote(conn, cur, sql, lote, errores, tablas, stock=False):
+    # stock=True: las filas son de inventario (ID_Item primero) y stock_bajo se
+    # sincroniza en la misma transacción que cada lote o fila.
+    if not lote:
+        return 0
+    try:
+        cur.executemany(sql, [fila for _, fila in lote])
+        if stock:
+            sincronizar_stock_bajo(conn, [fila[0] for _, fila in lote])
+        confirmar_cambios(conn, *tablas)
+        return len(lote)
+    except mysql.connector.Error:
+        conn.rollback()
+
+    escritas = 0
+    for linea, fila in lote:
+        try:
+            cur.execute(sql, fila)
+            if stock:
+                sincronizar_stock_bajo(conn, [fila[0]])
+            confirmar_cambios(conn, *tablas)
+            escritas += 1
+        except mysql.connector.Error as e:
+            conn.rollback()
+            errores.append({"linea": linea, "error": str(e)})
+    return escritas
+
+def _escribir_lote(conn, tabla, lote, errores):
+    tablas = TABLAS_IMPORTABLES[tabla]
+    cur = conn.cursor()
+    try:
+        if tabla == "catalogo":
+            return _ejecutar_lote(conn, cur, _SQL_IMPORTACION["catalogo"], lote, errores, tablas)
+
+        lote = _resolver_skus(cur, lote, errores)
+        con_minimo = [(l, f) for l, f in lote if f[2] is not None]
+        sin_minimo = [(l, f[:2]) for l, f in lote if f[2] is None]
+        return (_ejecutar_lote(conn, cur, _SQL_IMPORTACION["inventario"], con_minimo, errores, tablas, stock=True)
+                + _ejecutar_lote(conn, cur, _SQL_IMPORTACION["inventario_sin_minimo"], sin_minimo, errores, tablas,
+                                 stock=True))
+    finally:
+        cur.close()
+
+def importar_csv(archivo, tabla, lote_max=None) -> dict:
+    """Importa un CSV (objeto de texto) a catalogo o inventario; devuelve un resumen."""
+    import csv
+    if tabla not in TABLAS_IMPORTABLES:
+        raise ValueError(f"Tabla no soportada para importar: {tabla}")
+    lote_max = lote_max or LOTE_IMPORTACION
+    convertir = _fila_catalogo if tabla == "catalogo" else _fila_inventario
+    inicio = time.perf_counter()
+
+    # Muestra para detectar el separador (Excel en español suele usar ";"),
+    # completada hasta fin de línea para seguir leyendo sin perder nada.
+    muestra = archivo.read(4096)
+    muestra += archivo.readline()
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(itertools.chain(io.StringIO(muestra), archivo), dialecto)
+
+    encabezado = next(lector, None)
+    if not encabezado:
+        raise ValueError("El archivo está vacío")
+    columnas = [_columna_canonica(c) for c in encabezado]
+
+    _asegurar_tabla_stock_bajo()
+    conn = obtener_conexion()
+    errores, procesadas, escritas, lote = [], 0, 0, []
+    try:
+        for linea, valores in enumerate(lector, start=2):
+            if not any(v.strip() for v in valores):
+                continue
+            procesadas += 1
+            fila = {col: val for col, val in zip(columnas, valores) if col}
+            try:
+                lote.append((linea, convertir(fila)))
+            except ValueError as e:
+                errores.append({"linea": linea, "error": str(e)})
+            if len(lote) >= lote_max:
+                escritas += _escribir_lote(conn, tabla, lote, errores)
+                lote = []
+        if lote:
+            escritas += _escribir_lote(conn, tabla, lote, errores)
+        if escritas and tabla == "catalogo":
+            # Las piezas nuevas pueden traer su renglón de inventario (p. ej.
+            # por trigger); una pasada completa es barata frente a la importación.
+            reconstruir_stock_bajo(conn)
+            confirmar_cambios(conn, *TABLAS_IMPORTABLES[tabla], "stock_bajo")
+    finally:
+        conn.close()
+
+    errores.sort(key=lambda e: e["linea"])
+    return {
+        "tabla": tabla,
+        "procesadas": procesadas,
+        "escritas": escritas,
+        "con_error": len(errores),
+        "errores": errores[:MAX_ERRORES_IMPORTACION],
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+@app.route("/importar/<tabla>", methods=["POST"])
+def importar(tabla):
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "empleado"]:
+        return jsonify({"error": "No tienes permiso para importar datos."}), 403
+    if tabla not in TABLAS_IMPORTABLES:
+        return jsonify({"error": f"Tabla inválida: {tabla}"}), 404
+
+    archivo = request.files.get("archivo")
+    if not archivo or not archivo.filename:
+        return jsonify({"error": "Falta el archivo CSV."}), 400
+
+    codificacion = request.form.get("codificacion") or "utf-8-sig"
+    try:
+        texto = io.TextIOWrapper(archivo.stream, encoding=codificacion, newline="")
+    except LookupError:
+        return jsonify({"error": f"Codificación desconocida: {codificacion}"}), 400
+    try:
+        resumen = importar_csv(texto, tabla)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(resumen)
+
+@app.cli.command("importar-csv")
+@click.argument("tabla", type=click.Choice(list(TABLAS_IMPORTABLES)))
+@click.argument("ruta", type=click.Path(exists=True, dir_okay=False))
+@click.option("--codificacion", default="utf-8-sig", show_default=True)
+@click.option("--lote", default=LOTE_IMPORTACION, show_default=True, help="Filas por transacción.")
+def importar_csv_cli(tabla, ruta, codificacion, lote):
+    """Importa un CSV a catalogo o inventario: flask --app appp importar-csv catalogo lista.csv"""
+    with open(ruta, encoding=codificacion, newline="") as f:
+        resumen = importar_csv(f, tabla, lote)
+    for error in resumen["errores"]:
+        click.echo(f"línea {error['linea']}: {error['error']}", err=True)
+    filas_s = resumen["procesadas"] / resumen["segundos"] if resumen["segundos"] else 0
+    click.echo(f"✅ {resumen['escritas']} de {resumen['procesadas']} filas escritas en {tabla} "
+               f"({resumen['con_error']} con error, {resumen['segundos']} s, {filas_s:,.0f} filas/s)")
+
+# ---------------------- AJUSTES DE STOCK EN LOTE ----------------------
+# Un conteo físico llega como una lista de ajustes {"ID_Item" o "SKU", "delta"
+# o "stock"}. Todo se aplica en una sola transacción: primero se bloquean las
+# filas (SELECT ... FOR UPDATE) para validar y calcular el resultado de cada
+# entrada, y luego un UPDATE por lote suma la diferencia (stock = stock + d),
+# así dos conteos simultáneos ya no se pisan entre sí.
+LOTE_AJUSTES = 500
+
+def _validar_ajuste(entrada):
+    if not isinstance(entrada, dict):
+        raise ValueError("Cada ajuste debe ser un objeto")
+    id_item = entrada.get("ID_Item", entrada.get("id_item"))
+    sku = entrada.get("SKU", entrada.get("sku"))
+    if id_item in (None, ""):
+        if not sku:
+            raise ValueError("Se requiere ID_Item o SKU")
+        pieza = cache_catalogo.por_sku(str(sku).strip())
+        if pieza is None:
+            raise ValueError(f"SKU no existe en catálogo: {sku}")
+        id_item = pieza["ID_Item"]
+    id_item = _entero(id_item, "ID_Item", 1)
+
+    tiene_delta, tiene_stock = "delta" in entrada, "stock" in entrada
+    if tiene_delta == tiene_stock:
+        raise ValueError("Indica exactamente uno de 'delta' o 'stock'")
+    if tiene_delta:
+        return id_item, _entero(entrada["delta"], "delta"), None
+    return id_item, None, _entero(entrada["stock"], "stock", 0)
+
+def aplicar_ajustes_stock(entradas, todo_o_nada=False) -> dict:
+    """Aplica una lista de ajustes de stock en una transacción; resultado por entrada."""
+    resultados = []
+    validos = []
+    for i, entrada in enumerate(entradas):
+        try:
+            validos.append((i, *_validar_ajuste(entrada)))
+            resultados.append(None)
+        except ValueError as e:
+            resultados.append({"indice": i, "ok": False, "error": str(e)})
+
+    ids = sorted({id_item for _, id_item, _, _ in validos})
+    _asegurar_tabla_stock_bajo()
+    conn = obtener_conexion()
+    cur = conn.cursor()
+    try:
+        # Transacción nueva para que FOR UPDATE no arrastre lecturas previas.
+        conn.rollback()
+        inicial = {}
+        for k in range(0, len(ids), LOTE_AJUSTES):
+            parte = ids[k:k + LOTE_AJUSTES]
+            marcas = ", ".join(["%s"] * len(parte))
+            cur.execute(f"SELECT ID_Item, stock FROM inventario WHERE ID_Item IN ({marcas}) FOR UPDATE", tuple(parte))
+            inicial.update(cur.fetchall())
+
+        actual = dict(inicial)
+        for i, id_item, delta, absoluto in validos:
+            if id_item not in actual:
+                resultados[i] = {"indice": i, "ok": False, "ID_Item": id_item, "error": "La pieza no está en inventario"}
+                continue
+            nuevo = absoluto if absoluto is not None else actual[id_item] + delta
+            if nuevo < 0:
+                resultados[i] = {"indice": i, "ok": False, "ID_Item": id_item,
+                                 "error": f"El stock quedaría negativo ({nuevo})"}
+                continue
+            resultados[i] = {"indice": i, "ok": True, "ID_Item": id_item,
+                             "stock_anterior": actual[id_item], "stock_nuevo": nuevo}
+            actual[id_item] = nuevo
+
+        errores = sum(1 for r in resultados if not r["ok"])
+        diferencias = [(id_item, actual[id_item] - inicial[id_item])
+                       for id_item in inicial if actual[id_item] != inicial[id_item]]
+        if todo_o_nada and errores:
+            conn.rollback()
+            for r in resultados:
+                if r["ok"]:
+                    r.update(ok=False, error="No aplicado: hubo errores en otras entradas")
+            return {"aplicados": 0, "errores": len(resultados), "resultados": resultados}
+
+        for k in range(0, len(diferencias), LOTE_AJUSTES):
+            parte = diferencias[k:k + LOTE_AJUSTES]
+            casos = " ".join(["WHEN %s THEN %s"] * len(parte))
+            marcas = ", ".join(["%s"] * len(parte))
+            params = [v for par in parte for v in par] + [id_item for id_item, _ in parte]
+            cur.execute(f"""
+                UPDATE inventario
+                   SET stock = stock + CASE ID_Item {casos} END
+                 WHERE ID_Item IN ({marcas})
+            """, tuple(params))
+        sincronizar_stock_bajo(conn, [id_item for id_item, _ in diferencias])
+        confirmar_cambios(conn, *(("inventario",) if diferencias else ()))
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close(); conn.close()
+
+    return {"aplicados": len(resultados) - errores, "errores": errores, "resultados": resultados}
+
+@app.route("/inventario/ajustes", methods=["POST"])
+def ajustes_stock():
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "empleado"]:
+        return jsonify({"error": "No tienes permiso para actualizar el inventario."}), 403
+
+    datos = request.get_json(silent=True)
+    if isinstance(datos, list):
+        datos = {"ajustes": datos}
+    if not isinstance(datos, dict) or not isinstance(datos.get("ajustes"), list):
+        return jsonify({"error": "Envía JSON con una lista 'ajustes'."}), 400
+
+    try:
+        resumen = aplicar_ajustes_stock(datos["ajustes"], todo_o_nada=bool(datos.get("todo_o_nada")))
+    except mysql.connector.Error as e:
+        return jsonify({"error": f"Error al aplicar ajustes: {e}"}), 500
+    return jsonify(resumen), (200 if not resumen["errores"] else 207)
+
 # ---------------------- CHECAR CONEXIÓN ----------------------
 @app.route("/dbcheck")
 def dbcheck():
@@ -906,6 +3868,20 @@ def dbcheck():
     except Exception as e:
         return f"DB ERROR: {e}", 500
 
+@app.route("/dbpool")
+def dbpool():
+    if session.get("rol") != "admin":
+        return jsonify({"error": "solo admin"}), 403
+    return jsonify(obtener_pool().estadisticas())
+
+@app.route("/dbschema", methods=["GET", "POST"])
+def dbschema():
+    if session.get("rol") != "admin":
+        return jsonify({"error": "solo admin"}), 403
+    if request.method == "POST":
+        registro_esquema.refrescar()
+    return jsonify(registro_esquema.resumen())
+
 # ---------------------- CAMBIAR CONTRASEÑA ----------------------
 @app.route("/cambiar_contrasena", methods=["GET", "POST"])
 def cambiar_contrasena():
@@ -931,10 +3907,13 @@ def cambiar_contrasena():
             cur.execute("SELECT id, contrasena FROM usuarios WHERE correo = %s", (correo,))
             user = cur.fetchone()
 
-            if not user or not bcrypt.checkpw(actual.encode("utf-8"), user["contrasena"].encode("utf-8")):
-                return render_template("error.html", mensaje="❌ Contraseña actual incorrecta."), 401
+            try:
+                if not user or not contrasenas.verificar(actual, user["contrasena"]):
+                    return render_template("error.html", mensaje="❌ Contraseña actual incorrecta."), 401
+                nueva_hash = contrasenas.hashear(nueva)
+            except ContrasenasOcupadas:
+                return _respuesta_ocupado()
 
-            nueva_hash = bcrypt.hashpw(nueva.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
             cur.execute("UPDATE usuarios SET contrasena = %s WHERE id = %s", (nueva_hash, user["id"]))
             conn.commit()
         finally:
@@ -951,33 +3930,85 @@ def cambiar_contrasena():
                            rol=session.get("rol"))
     # ---------------------- REPORTES ADMIN (MOVIMIENTOS + PEDIDOS) ----------------------
 @app.route("/reportes_admin")
+@condicional("pedidos_clientes", "pedidos_proveedores", "resumen_pedidos", roles=("admin",))
 def reportes_admin():
     rol_actual = session.get("rol")
     if rol_actual != "admin":
         return render_template("error.html", mensaje="❌ Solo un administrador puede acceder a reportes avanzados."), 403
 
+    try:
+        desde, hasta = rango_reporte()
+    except ValueError as e:
+        return render_template("error.html", mensaje=f"❌ Rango de fechas inválido: {e}"), 400
+    resumen = leer_resumen_pedidos(desde, hasta)
+
+    return render_template(
+        "reportes_admin.html",
+        resumen=resumen,
+        desde=desde,
+        hasta=hasta,
+        por_dia=(hasta - desde).days < MAX_DIAS_DETALLE,
+        user_name=session.get("user_name"),
+        saludo=obtener_saludo(),
+        rol=rol_actual
+    )
+@app.route("/reportes_admin/<origen>")
+@condicional("pedidos_clientes", "pedidos_proveedores", roles=("admin",))
+def reportes_admin_detalle(origen):
+    """Pedidos de la ventana del reporte, filtrables por estado y contraparte, paginados."""
+    rol_actual = session.get("rol")
+    if rol_actual != "admin":
+        return render_template("error.html", mensaje="❌ Solo un administrador puede acceder a reportes avanzados."), 403
+    if origen not in ORIGENES_PEDIDOS:
+        return render_template("error.html", mensaje="❌ Origen de pedidos desconocido."), 404
+    try:
+        desde, hasta = rango_reporte()
+    except ValueError as e:
+        return render_template("error.html", mensaje=f"❌ Rango de fechas inválido: {e}"), 400
+
+    tabla, llave, contraparte = ORIGENES_PEDIDOS[origen]
+    condiciones = ["fecha_estado >= %s", "fecha_estado < %s"]
+    params = [datetime.combine(desde, datetime.min.time()),
+              datetime.combine(hasta + timedelta(days=1), datetime.min.time())]
+    estado = request.args.get("estado", "").strip().lower()
+    if estado:
+        condiciones.append("estado = %s")
+        params.append(estado)
+    nombre = request.args.get("contraparte")
+    if nombre is not None:
+        condiciones.append(f"COALESCE({contraparte}, '') = %s")
+        params.append(nombre)
+
+    _asegurar_indices_fecha()
     conn = obtener_conexion()
     cur = conn.cursor(dictionary=True)
-
-    # Pedidos de clientes
-    cur.execute("SELECT * FROM pedidos_clientes ORDER BY fecha_estado DESC")
-    pedidos_clientes = cur.fetchall()
-
-    # Pedidos a proveedores
-    cur.execute("SELECT * FROM pedidos_proveedores ORDER BY fecha_estado DESC")
-    pedidos_proveedores = cur.fetchall()
-
-    cur.close()
-    conn.close()
+    try:
+        pedidos, pagina = paginar_keyset(
+            cur, f"""
+                SELECT {llave} AS id, {contraparte} AS contraparte, codigo_pedido, descripcion, medida,
+                       cantidad, estado, fecha_estado
+                FROM {tabla}
+            """,
+            [("fecha_estado", "fecha_estado"), (llave, "id")], descendente=True,
+            where=" AND ".join(condiciones), params=params,
+        )
+    finally:
+        cur.close(); conn.close()
 
     return render_template(
-        "reportes_admin.html",
-        pedidos_clientes=pedidos_clientes,
-        pedidos_proveedores=pedidos_proveedores,
+        "reportes_admin_detalle.html",
+        origen=origen,
+        pedidos=pedidos,
+        pagina=pagina,
+        desde=desde,
+        hasta=hasta,
+        estado=estado,
+        contraparte=nombre,
         user_name=session.get("user_name"),
         saludo=obtener_saludo(),
         rol=rol_actual
     )
+
 @app.route("/reportes_consultor")
 def reportes_consultor():
     rol_actual = session.get("rol")
@@ -1007,64 +4038,453 @@ def reportes():
         rol=rol_actual
     )
 
+# ---------------------- PDF EN STREAMING ----------------------
+# Escritor PDF mínimo que emite cada página en cuanto está lista. ReportLab
+# no sirve para esto: canvas.Canvas solo serializa el documento en save() (la
+# xref final necesita los offsets de todo lo anterior) y varios PDF pegados
+# uno tras otro no son un PDF válido. Aquí solo se conservan los offsets de
+# los objetos para la xref, así que la memoria no crece con el número de
+# filas y el primer byte sale enseguida.
+#
+# Lo que cubre frente al reporte con canvas que reemplaza: las mismas
+# coordenadas, fuentes y tamaños (Helvetica / Helvetica-Bold estándar, sin
+# incrustar, igual que las deja ReportLab), texto y líneas. Lo que no: solo
+# caracteres de WinAnsi (cp1252), el resto sale como "?"; sin imágenes,
+# colores, tablas ni platypus. Un reporte que necesite algo de eso debe
+# seguir con ReportLab. tests/test_reporte_pdf.py abre el resultado con pypdf.
+LOTE_REPORTE = int(os.getenv("REPORT_BATCH", "500"))
+
+def _pdf_texto(texto: str) -> str:
+    crudo = str(texto).encode("cp1252", "replace")
+    salida = []
+    for b in crudo:
+        ch = chr(b)
+        if ch in "\\()":
+            salida.append("\\" + ch)
+        elif b < 32 or b > 126:
+            salida.append(f"\\{b:03o}")
+        else:
+            salida.append(ch)
+    return "".join(salida)
+
+class PaginaPDF:
+    """Comandos de dibujo de una página (coordenadas en puntos, origen abajo-izquierda)."""
+
+    def __init__(self):
+        self._ops = []
+
+    def texto(self, x, y, texto, negrita=False, tamano=11):
+        fuente = "F2" if negrita else "F1"
+        self._ops.append(f"BT /{fuente} {tamano} Tf {x} {y} Td ({_pdf_texto(texto)}) Tj ET")
+
+    def linea(self, x1, y1, x2, y2):
+        self._ops.append(f"{x1} {y1} m {x2} {y2} l S")
+
+    def contenido(self) -> bytes:
+        return "\n".join(self._ops).encode("latin-1")
+
+
+class PDFEnStreaming:
+    """Genera un PDF por partes: inicio(), pagina(...) por cada hoja y fin()."""
+
+    # Objetos fijos: 1 catálogo, 2 árbol de páginas, 3-4 fuentes, 5 info.
+    _PAGINAS = 2
+
+    def __init__(self, ancho=612, alto=792, titulo=""):
+        self.ancho = ancho
+        self.alto = alto
+        self.titulo = titulo
+        self._offsets = {}
+        self._posicion = 0
+        self._siguiente = 6
+        self._hojas = []
+
+    def _objeto(self, numero, cuerpo: bytes) -> bytes:
+        self._offsets[numero] = self._posicion
+        datos = f"{numero} 0 obj\n".encode("latin-1") + cuerpo + b"\nendobj\n"
+        self._posicion += len(datos)
+        return datos
+
+    def inicio(self) -> bytes:
+        cabecera = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._posicion = len(cabecera)
+        partes = [cabecera]
+        for numero, base in ((3, "Helvetica"), (4, "Helvetica-Bold")):
+            partes.append(self._objeto(numero, (
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>"
+            ).encode("latin-1")))
+        fecha = datetime.now().strftime("D:%Y%m%d%H%M%S")
+        partes.append(self._objeto(5, (
+            f"<< /Title ({_pdf_texto(self.titulo)}) /Producer (Industrial Parts) /CreationDate ({fecha}) >>"
+        ).encode("latin-1")))
+        return b"".join(partes)
+
+    def pagina(self, hoja: PaginaPDF) -> bytes:
+        flujo = zlib.compress(hoja.contenido())
+        num_flujo, num_hoja = self._siguiente, self._siguiente + 1
+        self._siguiente += 2
+        self._hojas.append(num_hoja)
+        partes = [
+            self._objeto(num_flujo, f"<< /Length {len(flujo)} /Filter /FlateDecode >>\nstream\n".encode("latin-1")
+                         + flujo + b"\nendstream"),
+            self._objeto(num_hoja, (
+                f"<< /Type /Page /Parent {self._PAGINAS} 0 R /MediaBox [0 0 {self.ancho} {self.alto}] "
+                f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {num_flujo} 0 R >>"
+            ).encode("latin-1")),
+        ]
+        return b"".join(partes)
+
+    def fin(self) -> bytes:
+        hijos = " ".join(f"{n} 0 R" for n in self._hojas)
+        partes = [
+            self._objeto(self._PAGINAS, f"<< /Type /Pages /Kids [{hijos}] /Count {len(self._hojas)} >>".encode("latin-1")),
+            self._objeto(1, f"<< /Type /Catalog /Pages {self._PAGINAS} 0 R >>".encode("latin-1")),
+        ]
+        inicio_xref = self._posicion
+        total = self._siguiente
+        xref = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        for numero in range(1, total):
+            xref.append(f"{self._offsets[numero]:010d} 00000 n \n")
+        xref.append(f"trailer\n<< /Size {total} /Root 1 0 R /Info 5 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        partes.append("".join(xref).encode("latin-1"))
+        return b"".join(partes)
+
+
+def generar_pdf_pedidos_clientes(generado_por, avance=None):
+    """Genera el PDF de pedidos de clientes por trozos de bytes (uno por página).
+
+    avance(hechas, total), si se da, se llama tras cada página.
+    """
+    return medir_pdf_en_streaming("pedidos_clientes", _trozos_pdf_pedidos_clientes(generado_por, avance))
+
+def _trozos_pdf_pedidos_clientes(generado_por, avance):
+    conn = obtener_conexion()
+    cur = conn.cursor(dictionary=True, buffered=False)
+    try:
+        total = None
+        if avance is not None:
+            cur.execute("SELECT COUNT(*) AS n FROM pedidos_clientes")
+            total = cur.fetchone()["n"]
+
+        # Cursor sin buffer: las filas se leen del socket por lotes.
+        cur.execute("SELECT cliente, codigo_pedido, descripcion, medida, cantidad FROM pedidos_clientes ORDER BY id_pedidoc DESC")
+
+        pdf = PDFEnStreaming(titulo="Reporte de Pedidos de Clientes")
+        yield pdf.inicio()
+
+        hoja = PaginaPDF()
+        hoja.texto(180, 750, "REPORTE DE PEDIDOS DE CLIENTES", negrita=True, tamano=16)
+        hoja.texto(50, 730, f"Generado por: {generado_por}", tamano=12)
+        hoja.texto(400, 730, f"Fecha: {datetime.now().strftime('%d/%m/%Y')}", tamano=12)
+
+        y = 700
+        hoja.texto(50, y, "Cliente", negrita=True, tamano=12)
+        hoja.texto(160, y, "Código", negrita=True, tamano=12)
+        hoja.texto(250, y, "Descripción", negrita=True, tamano=12)
+        hoja.texto(400, y, "Medida", negrita=True, tamano=12)
+        hoja.texto(480, y, "Cant.", negrita=True, tamano=12)
+        hoja.linea(45, y-5, 560, y-5)
+
+        y -= 20
+        hechas = 0
+        while True:
+            lote = cur.fetchmany(LOTE_REPORTE)
+            if not lote:
+                break
+            for pedido in lote:
+                hoja.texto(50, y, str(pedido["cliente"])[:20])
+                hoja.texto(160, y, str(pedido["codigo_pedido"]))
+                hoja.texto(250, y, str(pedido["descripcion"])[:25])
+                hoja.texto(400, y, str(pedido["medida"]))
+                hoja.texto(480, y, str(pedido["cantidad"]))
+                hechas += 1
+                y -= 18
+                if y < 80:
+                    yield pdf.pagina(hoja)
+                    if avance is not None:
+                        avance(hechas, total)
+                    hoja = PaginaPDF()
+                    y = 750
+
+        yield pdf.pagina(hoja)
+        yield pdf.fin()
+        if avance is not None:
+            avance(hechas, total)
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
 # REPORTE: PEDIDOS DE CLIENTES
 @app.route("/reporte_pedidos_clientes")
+@condicional("pedidos_clientes", roles=("admin", "consultor"))
 def reporte_pedidos_clientes():
     rol_actual = session.get("rol")
     if rol_actual not in ["admin", "consultor"]:
         return render_template("error.html", mensaje="❌ No tienes permiso para generar este reporte."), 403
 
+    return Response(
+        stream_with_context(generar_pdf_pedidos_clientes(session.get("user_name"))),
+        mimetype="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="reporte_pedidos_clientes.pdf"'},
+    )
+
+# ---------------------- EXPORTACIÓN (NDJSON / CSV) ----------------------
+# GET /exportar/<tabla>?formato=ndjson|csv manda la tabla fila por fila desde
+# un cursor sin buffer, en lotes de LOTE_EXPORTACION, así que la memoria no
+# depende del tamaño de la tabla. Filtros opcionales:
+#   since_id  solo filas con llave mayor (para sincronizar por incrementos)
+#   desde / hasta  AAAA-MM-DD sobre fecha_estado (solo pedidos; hasta inclusive)
+#   estado    estado exacto (solo pedidos)
+# Antes de empezar se fija la llave máxima que cumple los filtros y se manda
+# en X-Export-Ultimo-Id: la exportación no incluye filas más nuevas que esa,
+# y la siguiente corrida puede pedir since_id=<ese valor> para traer solo lo
+# nuevo. Las filas salen ordenadas por llave ascendente.
+LOTE_EXPORTACION = int(os.getenv("EXPORT_BATCH", "1000"))
+
+EXPORTACIONES = {
+    # tabla -> (SELECT sin WHERE, columna llave, columna de fecha, tiene estado)
+    "pedidos_clientes": (
+        "SELECT id_pedidoc, cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado "
+        "FROM pedidos_clientes", "id_pedidoc", "fecha_estado", True),
+    "pedidos_proveedores": (
+        "SELECT id_pedidop, proveedor, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado "
+        "FROM pedidos_proveedores", "id_pedidop", "fecha_estado", True),
+    "clientes": (
+        "SELECT id_cliente, nombre, correo, telefono FROM clientes", "id_cliente", None, False),
+    "proveedores": (
+        "SELECT id_proveedor, nombre, correo, telefono FROM proveedores", "id_proveedor", None, False),
+    "inventario": (
+        "SELECT i.ID_Item, c.SKU, c.Tipo_de_pieza, c.Descripcion, c.Medida, c.Precio, i.stock, i.stock_min "
+        "FROM inventario i JOIN catalogo c ON i.ID_Item = c.ID_Item", "i.ID_Item", None, False),
+}
+
+metricas.definir("exportacion_filas_total", "counter", "Filas enviadas por /exportar, por tabla y formato.")
+
+def _valor_exportable(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=" ")
+    if hasattr(valor, "isoformat"):  # date, time
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode("utf-8", "replace")
+    return valor
+
+def _filtros_exportacion(tabla):
+    """Arma (condiciones, params) a partir de la query string; ValueError si algo no cuadra."""
+    _, llave, col_fecha, tiene_estado = EXPORTACIONES[tabla]
+    condiciones, params = [], []
+
+    since_id = request.args.get("since_id", "").strip()
+    if since_id:
+        condiciones.append(f"{llave} > %s")
+        params.append(int(since_id))
+
+    for nombre, op, dias in (("desde", ">=", 0), ("hasta", "<", 1)):
+        valor = request.args.get(nombre, "").strip()
+        if not valor:
+            continue
+        if col_fecha is None:
+            raise ValueError(f"{tabla} no tiene fecha para filtrar")
+        fecha = datetime.strptime(valor, "%Y-%m-%d") + timedelta(days=dias)
+        condiciones.append(f"{col_fecha} {op} %s")
+        params.append(fecha)
+
+    estado = request.args.get("estado", "").strip().lower()
+    if estado:
+        if not tiene_estado:
+            raise ValueError(f"{tabla} no tiene estado para filtrar")
+        condiciones.append("estado = %s")
+        params.append(estado)
+    return condiciones, params
+
+def generar_exportacion(tabla, formato, condiciones, params):
+    """Genera la exportación en trozos de bytes, un lote de filas por trozo."""
+    import csv
+    select_sql, llave, _, _ = EXPORTACIONES[tabla]
+    sql = select_sql
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {llave}"
+
     conn = obtener_conexion()
-    cur = conn.cursor(dictionary=True)
+    cur = conn.cursor(buffered=False)
+    enviadas = 0
     try:
-        cur.execute("SELECT cliente, codigo_pedido, descripcion, medida, cantidad FROM pedidos_clientes ORDER BY id_pedidoc DESC")
-        pedidos = cur.fetchall()
+        # Cursor sin buffer: las filas se leen del socket por lotes.
+        cur.execute(sql, tuple(params))
+        columnas = list(cur.column_names)
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        if formato == "csv":
+            escritor.writerow(columnas)
+
+        while True:
+            lote = cur.fetchmany(LOTE_EXPORTACION)
+            if not lote:
+                break
+            if formato == "csv":
+                for fila in lote:
+                    escritor.writerow([_valor_exportable(v) for v in fila])
+            else:
+                for fila in lote:
+                    salida.write(json.dumps(
+                        dict(zip(columnas, map(_valor_exportable, fila))), ensure_ascii=False))
+                    salida.write("\n")
+            enviadas += len(lote)
+            yield salida.getvalue().encode("utf-8")
+            salida.seek(0)
+            salida.truncate()
+
+        if formato == "csv" and enviadas == 0:
+            yield salida.getvalue().encode("utf-8")  # solo el encabezado
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+        metricas.incrementar("exportacion_filas_total", enviadas, tabla=tabla, formato=formato)
+
+@app.route("/exportar/<tabla>")
+def exportar(tabla):
+    if session.get("rol") not in ("admin", "consultor"):
+        return jsonify({"error": "solo admin o consultor"}), 403
+    if tabla not in EXPORTACIONES:
+        return jsonify({"error": f"tabla no exportable: {tabla}", "tablas": sorted(EXPORTACIONES)}), 404
+
+    formato = request.args.get("formato", "ndjson").strip().lower()
+    if formato not in ("ndjson", "csv"):
+        return jsonify({"error": "formato debe ser ndjson o csv"}), 400
+    try:
+        condiciones, params = _filtros_exportacion(tabla)
+    except ValueError as e:
+        return jsonify({"error": f"filtro inválido: {e}"}), 400
+
+    # Tope fijo antes de empezar: lo que se inserte durante la exportación
+    # queda para la siguiente corrida.
+    select_sql, llave, _, _ = EXPORTACIONES[tabla]
+    desde_sql = select_sql[select_sql.index(" FROM "):]
+    conn = obtener_conexion()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT MAX({llave}){desde_sql}"
+                    + (" WHERE " + " AND ".join(condiciones) if condiciones else ""), tuple(params))
+        ultimo = cur.fetchone()[0]
     finally:
         cur.close(); conn.close()
+    if ultimo is not None:
+        condiciones = condiciones + [f"{llave} <= %s"]
+        params = params + [ultimo]
+    else:
+        # Nada nuevo: se devuelve el mismo since_id para no perder la posición.
+        condiciones = condiciones + ["1 = 0"]
+        ultimo = request.args.get("since_id", "").strip() or None
+
+    fecha = datetime.now().strftime("%Y%m%d")
+    extension = "csv" if formato == "csv" else "ndjson"
+    return Response(
+        stream_with_context(generar_exportacion(tabla, formato, condiciones, params)),
+        mimetype="text/csv" if formato == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{tabla}_{fecha}.{extension}"',
+            "X-Export-Ultimo-Id": "" if ultimo is None else str(ultimo),
+            "Cache-Control": "no-store",
+        },
+    )
 
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    pdf.setTitle("Reporte de Pedidos de Clientes")
-
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawString(180, 750, "REPORTE DE PEDIDOS DE CLIENTES")
-    pdf.setFont("Helvetica", 12)
-    pdf.drawString(50, 730, f"Generado por: {session.get('user_name')}")
-    pdf.drawString(400, 730, f"Fecha: {datetime.now().strftime('%d/%m/%Y')}")
-
-    y = 700
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "Cliente")
-    pdf.drawString(160, y, "Código")
-    pdf.drawString(250, y, "Descripción")
-    pdf.drawString(400, y, "Medida")
-    pdf.drawString(480, y, "Cant.")
-    pdf.line(45, y-5, 560, y-5)
-
-    pdf.setFont("Helvetica", 11)
-    y -= 20
-    for pedido in pedidos:
-        pdf.drawString(50, y, str(pedido["cliente"])[:20])
-        pdf.drawString(160, y, str(pedido["codigo_pedido"]))
-        pdf.drawString(250, y, str(pedido["descripcion"])[:25])
-        pdf.drawString(400, y, str(pedido["medida"]))
-        pdf.drawString(480, y, str(pedido["cantidad"]))
-        y -= 18
-        if y < 80:
-            pdf.showPage()
-            y = 750
-
-    pdf.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name="reporte_pedidos_clientes.pdf", mimetype="application/pdf")
+# ---------------------- CACHÉ DE REPORTES ----------------------
+# Los PDF de inventario y catálogo solo cambian cuando cambian sus tablas, así
+# que se guardan por (reporte, versiones de datos). El tamaño total está
+# acotado por REPORT_CACHE_MB y se expulsa primero lo menos usado (LRU).
+
+class CacheReportes:
+    """Caché LRU de bytes acotada por tamaño total."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsados = 0
+
+    def obtener(self, llave):
+        with self._lock:
+            datos = self._datos.get(llave)
+            if datos is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(llave)
+            self.aciertos += 1
+            return datos
+
+    def guardar(self, llave, datos: bytes):
+        if len(datos) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(llave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            # Las versiones viejas del mismo reporte ya no se pedirán.
+            for vieja in [k for k in self._datos if k[0] == llave[0]]:
+                self._bytes -= len(self._datos.pop(vieja))
+            self._datos[llave] = datos
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._datos.popitem(last=False)
+                self._bytes -= len(expulsado)
+                self.expulsados += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsados": self.expulsados,
+            }
 
-# REPORTE: INVENTARIO
-@app.route("/reporte_inventario")
-def reporte_inventario():
-    rol_actual = session.get("rol")
-    if rol_actual not in ["admin", "consultor"]:
-        return render_template("error.html", mensaje="❌ No tienes permiso para generar este reporte."), 403
 
+cache_reportes = CacheReportes(int(float(os.getenv("REPORT_CACHE_MB", "64")) * 1024 * 1024))
+
+def _reporte_cacheado(nombre, tablas, construir) -> bytes:
+    """Devuelve el PDF de la caché si los datos no cambiaron; si no, lo construye."""
+    versiones = versiones_datos(*tablas)
+    if versiones is None:
+        return construir()
+    llave = (nombre, versiones)
+    datos = cache_reportes.obtener(llave)
+    if datos is None:
+        datos = construir()
+        cache_reportes.guardar(llave, datos)
+    return datos
+
+def _estilo_tabla_reporte():
+    rl = reportlab()
+    return rl.TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), rl.colors.HexColor("#0074D9")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), rl.colors.white),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+        ("BACKGROUND", (0, 1), (-1, -1), rl.colors.whitesmoke),
+        ("GRID", (0, 0), (-1, -1), 0.25, rl.colors.grey),
+    ])
+
+def construir_pdf_inventario() -> bytes:
+    with medir_pdf("inventario"):
+        return _construir_pdf_inventario()
+
+def _construir_pdf_inventario() -> bytes:
     conn = obtener_conexion()
     cur = conn.cursor(dictionary=True)
     try:
@@ -1085,13 +4505,14 @@ def reporte_inventario():
     finally:
         cur.close(); conn.close()
 
+    rl = reportlab()
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    styles = getSampleStyleSheet()
+    doc = rl.SimpleDocTemplate(buffer, pagesize=rl.landscape(rl.letter), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+    styles = rl.getSampleStyleSheet()
     elementos = []
-    titulo = Paragraph("📦 Reporte de Inventario - Industrial Parts", styles["Title"])
+    titulo = rl.Paragraph("📦 Reporte de Inventario - Industrial Parts", styles["Title"])
     elementos.append(titulo)
-    elementos.append(Spacer(1, 12))
+    elementos.append(rl.Spacer(1, 12))
 
     encabezados = ["SKU", "Tipo de pieza", "Descripción", "Medida", "Stock", "Stock mín.", "Precio (MXN)"]
     datos_tabla = [encabezados]
@@ -1107,44 +4528,27 @@ def reporte_inventario():
         ]
         datos_tabla.append(fila)
 
-    tabla = Table(datos_tabla, colWidths=[3.5*cm, 4.5*cm, 6.5*cm, 3.5*cm, 2.5*cm, 2.8*cm, 3*cm])
-    tabla.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0074D9")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, -1), 9),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-        ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
+    tabla = rl.Table(datos_tabla, colWidths=[3.5*rl.cm, 4.5*rl.cm, 6.5*rl.cm, 3.5*rl.cm, 2.5*rl.cm, 2.8*rl.cm, 3*rl.cm])
+    tabla.setStyle(_estilo_tabla_reporte())
     elementos.append(tabla)
     doc.build(elementos)
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name="reporte_inventario.pdf", mimetype="application/pdf")
+    return buffer.getvalue()
 
-# REPORTE: CATALOGO
-@app.route("/reporte_catalogo")
-def reporte_catalogo():
-    rol_actual = session.get("rol")
-    if rol_actual not in ["admin", "consultor"]:
-        return render_template("error.html", mensaje="❌ No tienes permiso para generar este reporte."), 403
+def construir_pdf_catalogo() -> bytes:
+    with medir_pdf("catalogo"):
+        return _construir_pdf_catalogo()
 
-    conn = obtener_conexion()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute("SELECT SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio FROM catalogo ORDER BY Tipo_de_pieza, SKU")
-        catalogo = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
+def _construir_pdf_catalogo() -> bytes:
+    catalogo = cache_catalogo.filas()
 
+    rl = reportlab()
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    styles = getSampleStyleSheet()
+    doc = rl.SimpleDocTemplate(buffer, pagesize=rl.landscape(rl.letter), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+    styles = rl.getSampleStyleSheet()
     elementos = []
-    titulo = Paragraph("📘 Reporte del Catálogo de Piezas Industriales", styles["Title"])
+    titulo = rl.Paragraph("📘 Reporte del Catálogo de Piezas Industriales", styles["Title"])
     elementos.append(titulo)
-    elementos.append(Spacer(1, 12))
+    elementos.append(rl.Spacer(1, 12))
 
     encabezados = ["SKU", "Tipo de pieza", "Descripción", "Medida", "Unidades", "Precio ($)"]
     datos_tabla = [encabezados]
@@ -1159,21 +4563,217 @@ def reporte_catalogo():
         ]
         datos_tabla.append(fila)
 
-    tabla = Table(datos_tabla, colWidths=[3.5*cm, 4.5*cm, 6.5*cm, 3.5*cm, 3*cm, 3*cm])
-    tabla.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0074D9")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, -1), 9),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-        ("BACKGROUND", (0, 1), (-1, -1), colors.whitesmoke),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
+    tabla = rl.Table(datos_tabla, colWidths=[3.5*rl.cm, 4.5*rl.cm, 6.5*rl.cm, 3.5*rl.cm, 3*rl.cm, 3*rl.cm])
+    tabla.setStyle(_estilo_tabla_reporte())
     elementos.append(tabla)
     doc.build(elementos)
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name="reporte_catalogo.pdf", mimetype="application/pdf")
+    return buffer.getvalue()
+
+# REPORTE: INVENTARIO
+@app.route("/reporte_inventario")
+@condicional("inventario", "catalogo", roles=("admin", "consultor"))
+def reporte_inventario():
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "consultor"]:
+        return render_template("error.html", mensaje="❌ No tienes permiso para generar este reporte."), 403
+
+    datos = _reporte_cacheado("inventario", ("catalogo", "inventario"), construir_pdf_inventario)
+    return send_file(BytesIO(datos), as_attachment=True, download_name="reporte_inventario.pdf", mimetype="application/pdf")
+
+# REPORTE: CATALOGO
+@app.route("/reporte_catalogo")
+@condicional("catalogo", roles=("admin", "consultor"))
+def reporte_catalogo():
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "consultor"]:
+        return render_template("error.html", mensaje="❌ No tienes permiso para generar este reporte."), 403
+
+    datos = _reporte_cacheado("catalogo", ("catalogo",), construir_pdf_catalogo)
+    return send_file(BytesIO(datos), as_attachment=True, download_name="reporte_catalogo.pdf", mimetype="application/pdf")
+
+@app.route("/cache_reportes")
+def cache_reportes_stats():
+    if session.get("rol") != "admin":
+        return jsonify({"error": "solo admin"}), 403
+    return jsonify(cache_reportes.estadisticas())
+
+# ---------------------- REPORTES EN SEGUNDO PLANO ----------------------
+# Los PDF se pueden pedir como trabajo: el web worker solo encola y responde
+# con un id; el render corre en un pool de procesos (REPORT_WORKERS) fuera
+# del GIL de los hilos que atienden peticiones. El estado de cada trabajo vive
+# en disco (REPORT_JOBS_DIR) para que cualquier worker de gunicorn pueda
+# consultarlo o servir el archivo. Los trabajos terminados se borran tras
+# REPORT_RETENTION segundos.
+DIR_TRABAJOS = os.getenv("REPORT_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "industrial_parts_reportes")
+RETENCION_TRABAJOS = float(os.getenv("REPORT_RETENTION", "3600"))
+MAX_TRABAJOS_PENDIENTES = int(os.getenv("REPORT_MAX_PENDING", "20"))
+
+TIPOS_REPORTE = {
+    "pedidos_clientes": "reporte_pedidos_clientes.pdf",
+    "inventario": "reporte_inventario.pdf",
+    "catalogo": "reporte_catalogo.pdf",
+}
+
+_ejecutor_reportes = None
+_ejecutor_lock = threading.Lock()
+_pendientes = set()
+
+def _ruta_trabajo(id_trabajo, extension):
+    return os.path.join(DIR_TRABAJOS, f"{id_trabajo}.{extension}")
+
+def _leer_trabajo(id_trabajo):
+    if not re.fullmatch(r"[0-9a-f]{32}", id_trabajo or ""):
+        return None
+    try:
+        with open(_ruta_trabajo(id_trabajo, "json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _guardar_trabajo(trabajo):
+    # Escritura atómica: los lectores nunca ven un JSON a medias.
+    ruta = _ruta_trabajo(trabajo["id"], "json")
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(trabajo, f)
+    os.replace(temporal, ruta)
+
+def _ejecutar_trabajo(id_trabajo):
+    """Corre en el proceso hijo: genera el PDF y va dejando el progreso en disco."""
+    trabajo = _leer_trabajo(id_trabajo)
+    trabajo.update(estado="procesando", inicio=time.time())
+    _guardar_trabajo(trabajo)
+
+    ultimo = [0.0]
+    def avance(hechas, total):
+        trabajo["filas"] = hechas
+        if total:
+            trabajo["progreso"] = min(99, int(hechas * 100 / total))
+        ahora = time.monotonic()
+        if ahora - ultimo[0] >= 0.5:
+            ultimo[0] = ahora
+            _guardar_trabajo(trabajo)
+
+    tipo = trabajo["tipo"]
+    destino = _ruta_trabajo(id_trabajo, "pdf")
+    parcial = destino + ".parcial"
+    try:
+        if tipo == "pedidos_clientes":
+            trozos = generar_pdf_pedidos_clientes(trabajo["generado_por"], avance)
+        elif tipo == "inventario":
+            trozos = [construir_pdf_inventario()]
+        else:
+            trozos = [construir_pdf_catalogo()]
+        with open(parcial, "wb") as f:
+            for trozo in trozos:
+                f.write(trozo)
+        os.replace(parcial, destino)
+        trabajo.update(estado="listo", progreso=100, fin=time.time(), bytes=os.path.getsize(destino))
+    except Exception as e:
+        trabajo.update(estado="error", error=str(e), fin=time.time())
+        try:
+            os.remove(parcial)
+        except OSError:
+            pass
+    _guardar_trabajo(trabajo)
+
+def _obtener_ejecutor():
+    global _ejecutor_reportes
+    if _ejecutor_reportes is None:
+        with _ejecutor_lock:
+            if _ejecutor_reportes is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn: no heredar sockets del pool ni candados de otros hilos.
+                _ejecutor_reportes = ProcessPoolExecutor(
+                    max_workers=int(os.getenv("REPORT_WORKERS", "2")),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _ejecutor_reportes
+
+def _limpiar_trabajos():
+    """Borra los trabajos terminados más viejos que la retención."""
+    limite = time.time() - RETENCION_TRABAJOS
+    try:
+        nombres = os.listdir(DIR_TRABAJOS)
+    except OSError:
+        return
+    for nombre in nombres:
+        if not nombre.endswith(".json"):
+            continue
+        trabajo = _leer_trabajo(nombre[:-5])
+        if not trabajo:
+            continue
+        terminado = trabajo.get("fin") or 0
+        # Un trabajo que lleva 4x la retención "procesando" se da por perdido.
+        perdido = trabajo["estado"] in ("en_cola", "procesando") and trabajo["creado"] < limite - 3 * RETENCION_TRABAJOS
+        if (terminado and terminado < limite) or perdido:
+            for extension in ("pdf", "pdf.parcial", "json"):
+                try:
+                    os.remove(_ruta_trabajo(trabajo["id"], extension))
+                except OSError:
+                    pass
+
+def _puede_ver_trabajo(trabajo):
+    return session.get("rol") == "admin" or trabajo.get("correo") == session.get("correo")
+
+def _respuesta_trabajo(trabajo):
+    datos = {k: trabajo.get(k) for k in ("id", "tipo", "estado", "progreso", "filas", "error", "bytes")}
+    datos["estado_url"] = url_for("estado_trabajo_reporte", id_trabajo=trabajo["id"])
+    if trabajo["estado"] == "listo":
+        datos["descarga_url"] = url_for("descargar_trabajo_reporte", id_trabajo=trabajo["id"])
+    return datos
+
+@app.route("/reportes/trabajos", methods=["POST"])
+def crear_trabajo_reporte():
+    rol_actual = session.get("rol")
+    if rol_actual not in ["admin", "consultor"]:
+        return jsonify({"error": "No tienes permiso para generar reportes."}), 403
+
+    tipo = (request.form.get("tipo") or request.args.get("tipo") or "").strip()
+    if tipo not in TIPOS_REPORTE:
+        return jsonify({"error": f"Tipo de reporte inválido: {tipo}"}), 400
+
+    os.makedirs(DIR_TRABAJOS, exist_ok=True)
+    _limpiar_trabajos()
+
+    with _ejecutor_lock:
+        _pendientes.difference_update({f for f in _pendientes if f.done()})
+        if len(_pendientes) >= MAX_TRABAJOS_PENDIENTES:
+            return jsonify({"error": "Demasiados reportes en cola, intenta más tarde."}), 503
+
+    trabajo = {
+        "id": uuid.uuid4().hex,
+        "tipo": tipo,
+        "estado": "en_cola",
+        "progreso": 0,
+        "filas": 0,
+        "creado": time.time(),
+        "correo": session.get("correo"),
+        "generado_por": session.get("user_name"),
+    }
+    _guardar_trabajo(trabajo)
+    futuro = _obtener_ejecutor().submit(_ejecutar_trabajo, trabajo["id"])
+    with _ejecutor_lock:
+        _pendientes.add(futuro)
+    return jsonify(_respuesta_trabajo(trabajo)), 202
+
+@app.route("/reportes/trabajos/<id_trabajo>")
+def estado_trabajo_reporte(id_trabajo):
+    trabajo = _leer_trabajo(id_trabajo)
+    if not trabajo or not _puede_ver_trabajo(trabajo):
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(_respuesta_trabajo(trabajo))
+
+@app.route("/reportes/trabajos/<id_trabajo>/descarga")
+def descargar_trabajo_reporte(id_trabajo):
+    trabajo = _leer_trabajo(id_trabajo)
+    if not trabajo or not _puede_ver_trabajo(trabajo):
+        return render_template("error.html", mensaje="❌ Reporte no encontrado o expirado."), 404
+    if trabajo["estado"] != "listo":
+        return render_template("error.html", mensaje="❌ El reporte todavía no está listo."), 409
+    return send_file(_ruta_trabajo(id_trabajo, "pdf"), as_attachment=True,
+                     download_name=TIPOS_REPORTE[trabajo["tipo"]], mimetype="application/pdf")
 
 @app.route("/dbping")
 def dbping():
@@ -1188,6 +4788,71 @@ def dbping():
     except Exception as e:
         return f"db error ❌: {e}", 500
 
+# ---------------------- ARRANQUE DEL WORKER ----------------------
+def _rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+# Módulos que el arranque no debería cargar (ver el inicio del archivo); si
+# alguno aparece en "cargados" es que algo volvió a importarlo de entrada.
+MODULOS_DIFERIDOS = ("reportlab", "sqlite3", "multiprocessing", "concurrent.futures.process", "csv",
+                     "logging.handlers", "statistics")
+
+_SCRIPT_BENCHMARK = """
+import json, sys, time
+inicio = time.perf_counter()
+import appp
+importacion = time.perf_counter() - inicio
+rss = appp._rss_bytes()
+cargados = [m for m in appp.MODULOS_DIFERIDOS if m in sys.modules]
+inicio = time.perf_counter()
+appp.reportlab()
+print(json.dumps({"importacion": importacion, "rss": rss, "cargados": cargados,
+                  "primer_reporte": time.perf_counter() - inicio, "rss_reportlab": appp._rss_bytes()}))
+"""
+
+@app.cli.command("benchmark-arranque")
+@click.option("--repeticiones", default=5, show_default=True, help="Procesos nuevos por modo.")
+@click.option("--modo", "modos", multiple=True, type=click.Choice(MODOS_REPORTLAB), help="Repetible; default todos.")
+def benchmark_arranque(repeticiones, modos):
+    """Mide tiempo de importación y RSS de un worker recién creado en cada modo de REPORTLAB_LOAD."""
+    import statistics
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    for modo in modos or MODOS_REPORTLAB:
+        muestras = []
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, "-c", _SCRIPT_BENCHMARK], cwd=directorio,
+                                    env=dict(os.environ, REPORTLAB_LOAD=modo),
+                                    capture_output=True, text=True, check=True)
+            muestras.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+        mediana = {k: statistics.median(m[k] for m in muestras) for k in muestras[0] if k != "cargados"}
+        cargados = sorted({m for muestra in muestras for m in muestra["cargados"]})
+        click.echo(f"{modo:6} importación {mediana['importacion'] * 1000:7.1f} ms  RSS {mediana['rss'] / 2**20:6.1f} MB"
+                   f"  | primer reporte +{mediana['primer_reporte'] * 1000:7.1f} ms"
+                   f"  RSS {mediana['rss_reportlab'] / 2**20:6.1f} MB"
+                   f"  | cargados al importar: {', '.join(cargados) or 'ninguno'}")
+
+if MODO_REPORTLAB not in MODOS_REPORTLAB:
+    print(f"⚠️ REPORTLAB_LOAD={MODO_REPORTLAB!r} no es válido; se usa 'lazy'.")
+elif MODO_REPORTLAB == "eager":
+    reportlab()
+elif MODO_REPORTLAB == "warm":
+    _calentar_reportlab()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_despues_de_fork)
+
+TIEMPO_IMPORTACION = time.perf_counter() - _INICIO_IMPORTACION
+
 # ---------------------- EJECUCIÓN ----------------------
 if __name__ == "__main__":
     from waitress import serve
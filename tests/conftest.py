@@ -0,0 +1,90 @@
+"""Fixtures comunes: la app sobre una base SQLite temporal (DB_BACKEND=sqlite).
+
+El entorno se fija antes de importar appp porque el motor, la ruta de la base
+y los demás parámetros se leen al importar el módulo.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+DIR_PRUEBAS = tempfile.mkdtemp(prefix="industrial_parts_pruebas_")
+os.environ.update(
+    DB_BACKEND="sqlite",
+    SQLITE_PATH=os.path.join(DIR_PRUEBAS, "pruebas.db"),
+    BCRYPT_ROUNDS="4",
+    CATALOG_VERSION_CHECK="0",
+    SLOW_QUERY_LOG=os.path.join(DIR_PRUEBAS, "consultas_lentas.log"),
+    REPORT_JOBS_DIR=os.path.join(DIR_PRUEBAS, "reportes"),
+)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import appp  # noqa: E402
+
+appp.app.config["TESTING"] = True
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DIR_PRUEBAS, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def bd():
+    """Conexión propia del pool; cada prueba empieza con las tablas vacías.
+
+    Las versiones de datos no se borran sino que suben, para que ninguna
+    caché (catálogo, ETags, reportes) confunda los datos de una prueba con
+    los de la anterior.
+    """
+    conn = appp.obtener_pool().obtener()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite!_%' ESCAPE '!' AND name <> 'versiones_datos'
+    """)
+    tablas = [nombre for (nombre,) in cur.fetchall()]
+    for tabla in tablas:
+        cur.execute(f"DELETE FROM {tabla}")
+    cur.execute("DELETE FROM sqlite_sequence")
+    cur.close()
+    appp.confirmar_cambios(conn, *tablas)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.liberar()
+
+
+@pytest.fixture
+def datos(bd):
+    """Un cliente, un proveedor y dos piezas con inventario."""
+    cur = bd.cursor()
+    cur.execute("INSERT INTO clientes (nombre, correo, telefono) VALUES ('Acme', 'compras@acme.mx', '5550001')")
+    cur.execute("INSERT INTO proveedores (nombre, correo, telefono, direccion) "
+                "VALUES ('Aceros del Norte', 'ventas@aceros.mx', '8180001', 'Monterrey')")
+    cur.executemany("""
+        INSERT INTO catalogo (SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [("TOR-14", "Tornillo", "Tornillo hexagonal", "1/4", 100, 1.5),
+          ("TUE-14", "Tuerca", "Tuerca hexagonal", "1/4", 100, 0.8)])
+    cur.executemany("INSERT INTO inventario (ID_Item, stock, stock_min) VALUES (%s, %s, %s)",
+                    [(1, 50, 10), (2, 5, 10)])
+    cur.close()
+    appp.confirmar_cambios(bd, "clientes", "proveedores", "catalogo", "inventario")
+    return bd
+
+
+@pytest.fixture
+def cliente():
+    """cliente(rol) -> cliente de pruebas con esa sesión; cliente() sin sesión."""
+    def crear(rol=None):
+        c = appp.app.test_client()
+        if rol:
+            with c.session_transaction() as s:
+                s["rol"] = rol
+                s["user_name"] = f"Pruebas {rol}"
+                s["correo"] = f"{rol}@pruebas.mx"
+        return c
+    return crear
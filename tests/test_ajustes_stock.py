@@ -0,0 +1,80 @@
+"""aplicar_ajustes_stock: validación por entrada y modo todo_o_nada."""
+import appp
+
+
+def _stock(bd):
+    cur = bd.cursor()
+    cur.execute("SELECT ID_Item, stock FROM inventario ORDER BY ID_Item")
+    filas = dict(cur.fetchall())
+    cur.close()
+    return filas
+
+
+def test_valida_cada_entrada(datos):
+    resumen = appp.aplicar_ajustes_stock([
+        {"ID_Item": 1, "delta": -20},
+        "no es un objeto",
+        {"delta": 1},
+        {"SKU": "NO-EXISTE", "delta": 1},
+        {"ID_Item": 1, "delta": 1, "stock": 3},
+        {"ID_Item": 1},
+        {"ID_Item": "uno", "delta": 1},
+        {"ID_Item": 2, "stock": -1},
+        {"ID_Item": 99, "delta": 1},
+        {"ID_Item": 2, "delta": -6},
+        {"sku": "TUE-14", "stock": 40},
+    ])
+    errores = {r["indice"]: r["error"] for r in resumen["resultados"] if not r["ok"]}
+    assert errores == {
+        1: "Cada ajuste debe ser un objeto",
+        2: "Se requiere ID_Item o SKU",
+        3: "SKU no existe en catálogo: NO-EXISTE",
+        4: "Indica exactamente uno de 'delta' o 'stock'",
+        5: "Indica exactamente uno de 'delta' o 'stock'",
+        6: "ID_Item debe ser entero: 'uno'",
+        7: "stock no puede ser menor que 0",
+        8: "La pieza no está en inventario",
+        9: "El stock quedaría negativo (-1)",
+    }
+    assert (resumen["aplicados"], resumen["errores"]) == (2, 9)
+    assert resumen["resultados"][0] == {"indice": 0, "ok": True, "ID_Item": 1, "stock_anterior": 50, "stock_nuevo": 30}
+    assert resumen["resultados"][10]["stock_nuevo"] == 40
+    assert _stock(datos) == {1: 30, 2: 40}
+
+
+def test_ajustes_sucesivos_de_la_misma_pieza(datos):
+    resumen = appp.aplicar_ajustes_stock([
+        {"ID_Item": 2, "delta": 10},
+        {"ID_Item": 2, "delta": -12},
+        {"ID_Item": 2, "delta": -4},
+    ])
+    assert [r.get("stock_nuevo") for r in resumen["resultados"]] == [15, 3, None]
+    assert resumen["resultados"][2]["error"] == "El stock quedaría negativo (-1)"
+    assert _stock(datos)[2] == 3
+
+
+def test_todo_o_nada_no_aplica_si_hay_errores(datos):
+    resumen = appp.aplicar_ajustes_stock([{"ID_Item": 1, "delta": 5}, {"ID_Item": 2, "delta": -50}],
+                                         todo_o_nada=True)
+    assert (resumen["aplicados"], resumen["errores"]) == (0, 2)
+    assert resumen["resultados"][0]["error"] == "No aplicado: hubo errores en otras entradas"
+    assert _stock(datos) == {1: 50, 2: 5}
+
+
+def test_actualiza_stock_bajo(datos):
+    appp.aplicar_ajustes_stock([{"ID_Item": 1, "stock": 2}, {"ID_Item": 2, "stock": 10 + appp.MARGEN_STOCK}])
+    cur = datos.cursor()
+    cur.execute("SELECT ID_Item, nivel FROM stock_bajo")
+    assert cur.fetchall() == [(1, "bajo")]
+    cur.close()
+
+
+def test_ruta_de_ajustes(datos, cliente):
+    c = cliente("empleado")
+    r = c.post("/inventario/ajustes", json=[{"ID_Item": 1, "delta": 1}])
+    assert r.status_code == 200
+    r = c.post("/inventario/ajustes", json={"ajustes": [{"ID_Item": 1, "delta": 1}, {"ID_Item": 9, "delta": 1}]})
+    assert r.status_code == 207
+    assert c.post("/inventario/ajustes", json={"ajustes": "x"}).status_code == 400
+    assert cliente("consultor").post("/inventario/ajustes", json=[]).status_code == 403
+    assert _stock(datos)[1] == 52
@@ -0,0 +1,54 @@
+"""Importaciones diferidas: un worker recién creado no carga lo que solo usan algunas rutas."""
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import appp
+
+SCRIPT = """
+import json, sys
+import appp
+cargados = [m for m in appp.MODULOS_DIFERIDOS if m in sys.modules]
+appp.obtener_pool().obtener().liberar()
+print(json.dumps({"al_importar": cargados, "con_conexion": [m for m in appp.MODULOS_DIFERIDOS if m in sys.modules]}))
+"""
+
+
+def test_modulos_diferidos_no_se_cargan_al_importar(tmp_path):
+    entorno = dict(os.environ, REPORTLAB_LOAD="lazy", SQLITE_PATH=str(tmp_path / "arranque.db"))
+    salida = subprocess.run([sys.executable, "-c", SCRIPT], cwd=os.path.dirname(appp.__file__), env=entorno,
+                            capture_output=True, text=True, check=True).stdout
+    resultado = json.loads(salida.strip().splitlines()[-1])
+    assert resultado["al_importar"] == []
+    # Con DB_BACKEND=sqlite la primera conexión trae sqlite3, y nada más.
+    assert resultado["con_conexion"] == ["sqlite3"]
+
+
+def _importaciones_locales():
+    """Módulos que appp importa dentro de funciones (incluye dónde vive cada nombre de un from ... import)."""
+    with open(appp.__file__, encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    modulos = set()
+    for funcion in ast.walk(arbol):
+        if not isinstance(funcion, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for nodo in ast.walk(funcion):
+            if isinstance(nodo, ast.Import):
+                modulos.update(alias.name for alias in nodo.names)
+            elif isinstance(nodo, ast.ImportFrom) and nodo.module:
+                modulos.add(nodo.module)
+                modulo = importlib.import_module(nodo.module)
+                for alias in nodo.names:
+                    objeto = getattr(modulo, alias.name, None)
+                    modulos.add(getattr(objeto, "__module__", None) or getattr(objeto, "__name__", ""))
+    return modulos
+
+
+def test_cada_modulo_diferido_se_importa_en_una_funcion():
+    # Si la app deja de usar un módulo, su entrada ya no prueba nada y sobra.
+    locales = _importaciones_locales()
+    for modulo in appp.MODULOS_DIFERIDOS:
+        assert any(m == modulo or m.startswith(modulo + ".") for m in locales), modulo
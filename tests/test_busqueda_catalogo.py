@@ -0,0 +1,102 @@
+"""IndiceCatalogo y /catalogo/buscar: coincidencias sin acentos, orden por SKU y reindexado incremental."""
+import pytest
+
+import appp
+
+
+@pytest.fixture
+def piezas(datos):
+    cur = datos.cursor()
+    cur.executemany("""
+        INSERT INTO catalogo (SKU, Tipo_de_pieza, Descripcion, Medida, Unidades, Precio)
+        VALUES (%s, %s, %s, %s, 10, 1)
+    """, [("ABC-1", "Tornillo", "Tornillo Allen cabeza cilíndrica", "3/8"),
+          ("VAL-2", "Válvula", "Válvula de presión", "1/2"),
+          ("TORN-9", "Tornillo", "Tornillo para madera", "1/4")])
+    cur.close()
+    appp.confirmar_cambios(datos, "catalogo")
+    return datos
+
+
+@pytest.fixture
+def buscar(cliente):
+    c = cliente("empleado")
+
+    def hacer(q, n=10):
+        r = c.get("/catalogo/buscar", query_string={"q": q, "n": n})
+        assert r.status_code == 200
+        return [p["SKU"] for p in r.get_json()]
+    return hacer
+
+
+def test_sin_acentos_ni_mayusculas(piezas, buscar):
+    assert buscar("valvula presion") == ["VAL-2"]
+    assert buscar("VÁLV PRES") == ["VAL-2"]
+    assert buscar("cilindrica") == ["ABC-1"]
+    assert buscar("1/2") == ["VAL-2"]
+
+
+def test_todas_las_palabras_deben_coincidir(piezas, buscar):
+    assert buscar("tornillo madera") == ["TORN-9"]
+    assert buscar("tornillo presion") == []
+    assert buscar("   ") == []
+
+
+def test_prefijo_de_sku_primero(piezas, buscar):
+    # "tor" es prefijo de dos SKU y de la palabra "tornillo" en tres descripciones:
+    # primero los SKU en orden, luego el resto por SKU, sin repetir.
+    assert buscar("tor") == ["TOR-14", "TORN-9", "ABC-1"]
+    assert buscar("tor", n=2) == ["TOR-14", "TORN-9"]
+    assert buscar("tor-1") == ["TOR-14"]
+
+
+def test_alta_reindexa_solo_la_pieza_nueva(piezas, buscar, cliente):
+    buscar("tor")
+    antes = appp.indice_catalogo.reindexadas
+    r = cliente("admin").post("/guardar_pieza", data={"SKU": "ARA-5", "Tipo_de_pieza": "Arandela",
+                                                      "Descripcion": "Arandela de presión", "Medida": "5/16",
+                                                      "Unidades": "100", "Precio": "0.4"})
+    assert r.status_code == 302
+    assert buscar("presion") == ["ARA-5", "VAL-2"]
+    assert appp.indice_catalogo.reindexadas == antes + 1
+
+
+def test_edicion_reindexa_solo_si_cambia_el_texto(piezas, buscar, cliente):
+    buscar("tor")
+    antes = appp.indice_catalogo.reindexadas
+    c = cliente("admin")
+    datos_pieza = {"tipo": "Tornillo", "descripcion": "Tornillo para madera", "medida": "1/4", "precio": "9.5"}
+    assert c.post("/editar_pieza/5", data=datos_pieza).status_code == 302
+    assert buscar("madera") == ["TORN-9"]
+    assert appp.indice_catalogo.reindexadas == antes
+    assert appp.indice_catalogo.buscar("madera")[0]["Precio"] == 9.5  # apunta a la fila nueva
+
+    assert c.post("/editar_pieza/5", data=dict(datos_pieza, descripcion="Tornillo para lámina")).status_code == 302
+    assert buscar("madera") == []
+    assert buscar("lamina") == ["TORN-9"]
+    assert appp.indice_catalogo.reindexadas == antes + 1
+
+    # Cambio de SKU desde /guardar_pieza: el prefijo viejo deja de encontrarla.
+    r = c.post("/guardar_pieza", data={"sku_original": "TORN-9", "SKU": "LAM-9", "Tipo_de_pieza": "Tornillo",
+                                       "Descripcion": "Tornillo para lámina", "Medida": "1/4",
+                                       "Unidades": "10", "Precio": "9.5"})
+    assert r.status_code == 302
+    assert buscar("torn") == ["ABC-1", "LAM-9", "TOR-14"]  # ya solo por descripción
+    assert buscar("lam-") == ["LAM-9"]
+    assert appp.indice_catalogo.reindexadas == antes + 2
+
+
+def test_baja_quita_la_pieza_del_indice(piezas, buscar, cliente):
+    buscar("tor")
+    antes = appp.indice_catalogo.reindexadas
+    c = cliente("admin")
+    assert c.post("/eliminar_pieza_id/3").status_code == 302
+    assert buscar("tor") == ["TOR-14", "TORN-9"]
+    assert c.post("/eliminar_pieza/VAL-2").status_code == 302
+    assert buscar("valvula") == []
+    assert buscar("1/2") == []  # la palabra desaparece con su última pieza
+    assert appp.indice_catalogo.reindexadas == antes
+
+
+def test_solo_usuarios_con_rol(piezas, cliente):
+    assert cliente().get("/catalogo/buscar?q=tor").status_code == 403
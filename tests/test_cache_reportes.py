@@ -0,0 +1,57 @@
+"""CacheReportes: LRU acotada por bytes y PDFs cacheados por versión de datos."""
+import appp
+
+
+def test_expulsa_lo_menos_usado_al_pasar_del_limite():
+    cache = appp.CacheReportes(max_bytes=10)
+    cache.guardar(("a", (1,)), b"1234")
+    cache.guardar(("b", (1,)), b"1234")
+    assert cache.obtener(("a", (1,))) == b"1234"  # "a" pasa a ser la más reciente
+    cache.guardar(("c", (1,)), b"1234")
+    assert cache.obtener(("b", (1,))) is None
+    assert cache.obtener(("a", (1,))) == b"1234"
+    assert cache.obtener(("c", (1,))) == b"1234"
+    est = cache.estadisticas()
+    assert (est["entradas"], est["bytes"], est["expulsados"]) == (2, 8, 1)
+    assert (est["aciertos"], est["fallos"]) == (3, 1)
+
+
+def test_una_version_nueva_reemplaza_a_la_vieja():
+    cache = appp.CacheReportes(max_bytes=100)
+    cache.guardar(("inventario", (1, 1)), b"viejo")
+    cache.guardar(("catalogo", (1,)), b"cat")
+    cache.guardar(("inventario", (1, 2)), b"nuevo!")
+    assert cache.obtener(("inventario", (1, 1))) is None
+    assert cache.obtener(("inventario", (1, 2))) == b"nuevo!"
+    est = cache.estadisticas()
+    assert (est["entradas"], est["bytes"], est["expulsados"]) == (2, 9, 0)
+
+
+def test_guardar_la_misma_llave_no_duplica_bytes():
+    cache = appp.CacheReportes(max_bytes=100)
+    cache.guardar(("a", (1,)), b"12345")
+    cache.guardar(("a", (1,)), b"123")
+    assert cache.estadisticas()["bytes"] == 3
+
+
+def test_no_guarda_lo_que_no_cabe():
+    cache = appp.CacheReportes(max_bytes=4)
+    cache.guardar(("a", (1,)), b"1234")
+    cache.guardar(("b", (1,)), b"12345")
+    assert cache.obtener(("b", (1,))) is None
+    assert cache.obtener(("a", (1,))) == b"1234"
+
+
+def test_reporte_cacheado_se_reconstruye_al_cambiar_los_datos(datos, monkeypatch):
+    monkeypatch.setattr(appp, "cache_reportes", appp.CacheReportes(max_bytes=1024))
+    construidos = []
+
+    def construir():
+        construidos.append(1)
+        return f"pdf {len(construidos)}".encode()
+
+    assert appp._reporte_cacheado("inventario", ("catalogo", "inventario"), construir) == b"pdf 1"
+    assert appp._reporte_cacheado("inventario", ("catalogo", "inventario"), construir) == b"pdf 1"
+    appp.confirmar_cambios(datos, "inventario")
+    assert appp._reporte_cacheado("inventario", ("catalogo", "inventario"), construir) == b"pdf 2"
+    assert appp.cache_reportes.estadisticas()["entradas"] == 1
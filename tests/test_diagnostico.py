@@ -0,0 +1,21 @@
+"""Rutas de diagnóstico: solo admin."""
+
+
+def test_dbpool_solo_admin(cliente):
+    for rol in (None, "empleado", "consultor"):
+        r = cliente(rol).get("/dbpool")
+        assert r.status_code == 403
+        assert r.get_json() == {"error": "solo admin"}
+    r = cliente("admin").get("/dbpool")
+    assert r.status_code == 200
+    assert {"en_uso", "inactivas", "abiertas", "agotado"} <= set(r.get_json())
+
+
+def test_dbschema_solo_admin(cliente):
+    for rol in (None, "empleado"):
+        assert cliente(rol).get("/dbschema").status_code == 403
+        assert cliente(rol).post("/dbschema").status_code == 403
+    r = cliente("admin").get("/dbschema")
+    assert r.status_code == 200
+    assert r.get_json()
+    assert cliente("admin").post("/dbschema").status_code == 200
@@ -0,0 +1,75 @@
+"""cambiar_estado_en_lote: resultado por id cuando solo una parte se puede cambiar."""
+import appp
+
+
+def _estados(bd, tabla="pedidos_clientes", llave="id_pedidoc"):
+    cur = bd.cursor()
+    cur.execute(f"SELECT {llave}, estado FROM {tabla} ORDER BY {llave}")
+    filas = dict(cur.fetchall())
+    cur.close()
+    bd.rollback()
+    return filas
+
+
+def _crear_pedidos(bd, estados):
+    cur = bd.cursor()
+    cur.executemany("""
+        INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad, estado)
+        VALUES ('Acme', %s, 'Tornillo hexagonal', '1/4', 1, %s)
+    """, [(f"C-{i}", estado) for i, estado in enumerate(estados, start=1)])
+    cur.close()
+    bd.commit()
+    appp._asegurar_tabla_resumen()
+    appp.reconstruir_resumen_pedidos(bd)
+
+
+def test_resultados_parciales(datos):
+    _crear_pedidos(datos, ["pendiente", "enviado", "pendiente"])
+    resumen = appp.cambiar_estado_en_lote("clientes", [3, "1", 2, 99, "x", 0, True, None, 1], "enviado")
+    assert (resumen["estado"], resumen["cambiados"], resumen["sin_cambio"], resumen["errores"]) == ("enviado", 2, 1, 5)
+    assert resumen["resultados"] == [
+        {"id": 3, "ok": True, "estado_anterior": "pendiente", "cambiado": True},
+        {"id": 1, "ok": True, "estado_anterior": "pendiente", "cambiado": True},
+        {"id": 2, "ok": True, "estado_anterior": "enviado", "cambiado": False},
+        {"id": 99, "ok": False, "error": "Pedido no encontrado"},
+        {"id": "x", "ok": False, "error": "Id inválido"},
+        {"id": 0, "ok": False, "error": "Id inválido"},
+        {"id": True, "ok": False, "error": "Id inválido"},
+        {"id": None, "ok": False, "error": "Id inválido"},
+        # Un id repetido se cambia una vez; la segunda aparición ya lo ve como cambiado.
+        {"id": 1, "ok": True, "estado_anterior": "pendiente", "cambiado": True},
+    ]
+    assert _estados(datos) == {1: "enviado", 2: "enviado", 3: "enviado"}
+
+
+def test_lotes_mayores_que_lote_estados(datos, monkeypatch):
+    monkeypatch.setattr(appp, "LOTE_ESTADOS", 2)
+    _crear_pedidos(datos, ["pendiente"] * 5)
+    resumen = appp.cambiar_estado_en_lote("clientes", [5, 4, 3, 2, 1, 6], "confirmado")
+    assert (resumen["cambiados"], resumen["errores"]) == (5, 1)
+    assert set(_estados(datos).values()) == {"confirmado"}
+
+
+def test_proveedores(datos):
+    cur = datos.cursor()
+    cur.execute("""
+        INSERT INTO pedidos_proveedores (proveedor, codigo_pedido, descripcion, medida, cantidad, estado)
+        VALUES ('Aceros del Norte', 'P-1', 'Tuerca hexagonal', '1/4', 100, 'enviado')
+    """)
+    cur.close()
+    datos.commit()
+    resumen = appp.cambiar_estado_en_lote("proveedores", [1, 2], "recibido")
+    assert [r["ok"] for r in resumen["resultados"]] == [True, False]
+    assert _estados(datos, "pedidos_proveedores", "id_pedidop") == {1: "recibido"}
+
+
+def test_ruta_valida_la_peticion(datos, cliente):
+    _crear_pedidos(datos, ["pendiente"])
+    c = cliente("empleado")
+    assert c.post("/pedidos/estado", json={"ids": [1], "estado": "enviado"}).status_code == 200
+    assert c.post("/pedidos/estado", json={"ids": [1, 2], "estado": "entregado"}).status_code == 207
+    assert c.post("/pedidos/estado", json={"ids": [], "estado": "enviado"}).status_code == 400
+    assert c.post("/pedidos/estado", json={"ids": [1], "estado": "recibido"}).status_code == 400
+    assert c.post("/pedidos/estado", data={"ids": ["1"], "estado": "cancelado"}).status_code == 200
+    assert cliente("consultor").post("/pedidos/estado", json={"ids": [1], "estado": "enviado"}).status_code == 403
+    assert _estados(datos) == {1: "cancelado"}
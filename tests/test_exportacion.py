@@ -0,0 +1,130 @@
+"""/exportar/<tabla>: NDJSON/CSV por lotes, filtros y reanudación con since_id."""
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import appp
+
+
+def _ndjson(r):
+    return [json.loads(linea) for linea in r.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def pedidos(datos):
+    cur = datos.cursor()
+    cur.executemany("""
+        INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado)
+        VALUES ('Acme', %s, 'Tornillo hexagonal', '1/4', %s, %s, %s)
+    """, [("C-1", 1, "entregado", datetime(2024, 5, 1, 9, 30)),
+          ("C-2", 2, "pendiente", datetime(2024, 5, 2, 23, 59, 59)),
+          ("C-3", 3, "entregado", datetime(2024, 5, 3, 0, 0)),
+          ("C-4", 4, "cancelado", datetime(2024, 5, 4, 12, 0))])
+    cur.close()
+    datos.commit()
+    return datos
+
+
+@pytest.fixture
+def exportar(cliente):
+    c = cliente("consultor")
+    return lambda consulta: c.get("/exportar/" + consulta)
+
+
+def test_ndjson_completo_en_orden_de_llave(pedidos, exportar, monkeypatch):
+    monkeypatch.setattr(appp, "LOTE_EXPORTACION", 3)  # dos lotes
+    r = exportar("pedidos_clientes")
+    assert r.status_code == 200
+    assert r.mimetype == "application/x-ndjson"
+    assert r.headers["X-Export-Ultimo-Id"] == "4"
+    assert r.headers["Cache-Control"] == "no-store"
+    filas = _ndjson(r)
+    assert [f["id_pedidoc"] for f in filas] == [1, 2, 3, 4]
+    assert filas[0] == {"id_pedidoc": 1, "cliente": "Acme", "codigo_pedido": "C-1", "descripcion": "Tornillo hexagonal",
+                        "medida": "1/4", "cantidad": 1, "estado": "entregado", "fecha_estado": "2024-05-01 09:30:00"}
+
+
+def test_since_id_reanuda_desde_el_ultimo_id(pedidos, exportar):
+    primera = exportar("pedidos_clientes")
+    ultimo = primera.headers["X-Export-Ultimo-Id"]
+    cur = pedidos.cursor()
+    cur.execute("""
+        INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad)
+        VALUES ('Acme', 'C-5', 'Tuerca hexagonal', '1/4', 5)
+    """)
+    cur.close()
+    pedidos.commit()
+    segunda = exportar(f"pedidos_clientes?since_id={ultimo}")
+    assert [f["codigo_pedido"] for f in _ndjson(segunda)] == ["C-5"]
+    assert segunda.headers["X-Export-Ultimo-Id"] == "5"
+
+
+def test_sin_filas_nuevas_conserva_el_since_id(pedidos, exportar):
+    r = exportar("pedidos_clientes?since_id=4")
+    assert r.status_code == 200
+    assert r.get_data() == b""
+    assert r.headers["X-Export-Ultimo-Id"] == "4"
+    # Tabla vacía y sin since_id: no hay posición que devolver.
+    r = exportar("pedidos_proveedores")
+    assert r.get_data() == b""
+    assert r.headers["X-Export-Ultimo-Id"] == ""
+
+
+def test_el_tope_respeta_los_filtros(pedidos, exportar):
+    r = exportar("pedidos_clientes?estado=entregado")
+    assert [f["id_pedidoc"] for f in _ndjson(r)] == [1, 3]
+    assert r.headers["X-Export-Ultimo-Id"] == "3"
+
+
+def test_csv_con_filas(datos, exportar):
+    r = exportar("inventario?formato=csv")
+    assert r.mimetype == "text/csv"
+    assert "inventario_" in r.headers["Content-Disposition"] and r.headers["Content-Disposition"].endswith('.csv"')
+    filas = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    assert filas == [
+        ["ID_Item", "SKU", "Tipo_de_pieza", "Descripcion", "Medida", "Precio", "stock", "stock_min"],
+        ["1", "TOR-14", "Tornillo", "Tornillo hexagonal", "1/4", "1.5", "50", "10"],
+        ["2", "TUE-14", "Tuerca", "Tuerca hexagonal", "1/4", "0.8", "5", "10"],
+    ]
+
+
+def test_csv_vacio_trae_solo_el_encabezado(datos, exportar):
+    r = exportar("pedidos_clientes?formato=csv")
+    assert r.get_data(as_text=True).splitlines() == [
+        "id_pedidoc,cliente,codigo_pedido,descripcion,medida,cantidad,estado,fecha_estado"]
+    r = exportar("clientes?formato=csv&since_id=1")
+    assert r.get_data(as_text=True).splitlines() == ["id_cliente,nombre,correo,telefono"]
+    assert r.headers["X-Export-Ultimo-Id"] == "1"
+
+
+@pytest.mark.parametrize("consulta, ids", [
+    ("desde=2024-05-02", [2, 3, 4]),
+    ("hasta=2024-05-02", [1, 2]),  # hasta incluye todo el día
+    ("desde=2024-05-02&hasta=2024-05-03", [2, 3]),
+    ("estado=ENTREGADO&desde=2024-05-02", [3]),
+    ("since_id=2&estado=cancelado", [4]),
+])
+def test_filtros(pedidos, exportar, consulta, ids):
+    r = exportar("pedidos_clientes?" + consulta)
+    assert [f["id_pedidoc"] for f in _ndjson(r)] == ids
+
+
+@pytest.mark.parametrize("consulta, codigo", [
+    ("clientes?desde=2024-01-01", 400),
+    ("inventario?estado=pendiente", 400),
+    ("pedidos_clientes?desde=01/05/2024", 400),
+    ("pedidos_clientes?since_id=abc", 400),
+    ("pedidos_clientes?formato=xml", 400),
+    ("usuarios", 404),
+])
+def test_peticiones_invalidas(datos, exportar, consulta, codigo):
+    assert exportar(consulta).status_code == codigo
+
+
+def test_solo_admin_o_consultor(datos, cliente):
+    assert cliente("empleado").get("/exportar/clientes").status_code == 403
+    assert cliente().get("/exportar/clientes").status_code == 403
+    assert cliente("admin").get("/exportar/clientes").status_code == 200
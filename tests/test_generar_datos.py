@@ -0,0 +1,50 @@
+"""generar_datos: misma semilla y misma --fecha-base, mismos datos."""
+from datetime import datetime, timedelta
+
+import generar_datos
+
+TABLAS = ("clientes", "proveedores", "catalogo", "inventario", "pedidos_clientes", "pedidos_proveedores",
+          "pedido_detalle")
+
+
+def _generar(bd, semilla, fecha_base):
+    cur = bd.cursor()
+    for tabla in TABLAS + ("usuarios",):
+        cur.execute(f"DELETE FROM {tabla}")
+    cur.execute("DELETE FROM sqlite_sequence")  # los ids también deben repetirse
+    cur.close()
+    bd.commit()
+    cargadas = generar_datos.generar(bd, escala=0.01, semilla=semilla, dias=60, metodo="insert",
+                                     rondas_bcrypt=4, fecha_base=fecha_base)
+    cur = bd.cursor()
+    contenido = {}
+    for tabla in TABLAS:
+        cur.execute(f"SELECT * FROM {tabla} ORDER BY 1")
+        contenido[tabla] = cur.fetchall()
+    cur.close()
+    bd.rollback()
+    return cargadas, contenido
+
+
+def test_misma_semilla_y_fecha_base_dan_los_mismos_datos(bd):
+    cargadas, primera = _generar(bd, 7, generar_datos.FECHA_BASE)
+    assert cargadas["pedidos_clientes"] == len(primera["pedidos_clientes"]) == 100
+    _, segunda = _generar(bd, 7, generar_datos.FECHA_BASE)
+    assert primera == segunda
+
+
+def test_las_fechas_quedan_antes_de_la_fecha_base(bd):
+    fecha_base = datetime(2024, 3, 15, 18, 0)
+    _, contenido = _generar(bd, 7, fecha_base)
+    fechas = [fila[-1] for tabla in ("pedidos_clientes", "pedidos_proveedores") for fila in contenido[tabla]]
+    assert min(fechas) >= fecha_base - timedelta(days=60)
+    assert max(fechas) <= fecha_base
+
+
+def test_otra_fecha_base_mueve_las_fechas_pero_no_el_resto(bd):
+    _, antes = _generar(bd, 7, datetime(2024, 3, 15, 18, 0))
+    _, despues = _generar(bd, 7, datetime(2024, 3, 22, 18, 0))
+    assert antes["catalogo"] == despues["catalogo"]
+    assert antes["clientes"] == despues["clientes"]
+    assert antes["pedidos_clientes"] != despues["pedidos_clientes"]
+
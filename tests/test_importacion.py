@@ -0,0 +1,149 @@
+"""importar_csv: errores por fila sin perder las filas buenas."""
+import io
+
+import pytest
+
+import appp
+
+
+def _leer(bd, sql):
+    cur = bd.cursor()
+    cur.execute(sql)
+    filas = cur.fetchall()
+    cur.close()
+    return filas
+
+
+def test_catalogo_con_errores_por_fila(bd):
+    csv = io.StringIO(
+        "SKU;Tipo;Descripción;Medida;Unidades;Precio\n"
+        "ARA-1;Arandela;Arandela plana;1/4;100;$0.50\n"
+        ";Tornillo;Sin SKU;1/4;10;1\n"
+        "ARA-2;Arandela;Arandela de presión;1/4;muchas;0.7\n"
+        "\n"
+        "ARA-3;Arandela;Arandela de presión;3/8;50;abc\n"
+        "ARA-4;Arandela;Arandela dentada;3/8;-1;0.9\n"
+        "ARA-5;Arandela;Arandela dentada;1/2;25;1.1\n"
+    )
+    resumen = appp.importar_csv(csv, "catalogo", lote_max=2)
+    assert (resumen["tabla"], resumen["procesadas"], resumen["escritas"], resumen["con_error"]) == ("catalogo", 6, 2, 4)
+    assert [(e["linea"], e["error"]) for e in resumen["errores"]] == [
+        (3, "SKU y Tipo_de_pieza son obligatorios"),
+        (4, "Unidades debe ser entero: 'muchas'"),
+        (6, "Precio debe ser numérico: 'abc'"),
+        (7, "Unidades no puede ser menor que 0"),
+    ]
+    assert _leer(bd, "SELECT SKU, Descripcion, Unidades, Precio FROM catalogo ORDER BY SKU") == [
+        ("ARA-1", "Arandela plana", 100, 0.5),
+        ("ARA-5", "Arandela dentada", 25, 1.1),
+    ]
+
+
+def test_catalogo_actualiza_los_sku_existentes(datos):
+    csv = io.StringIO("SKU,Tipo_de_pieza,Descripcion,Medida,Unidades,Precio\nTOR-14,Tornillo,Tornillo nuevo,1/4,200,2\n")
+    resumen = appp.importar_csv(csv, "catalogo")
+    assert (resumen["escritas"], resumen["con_error"]) == (1, 0)
+    assert _leer(datos, "SELECT Descripcion, Precio FROM catalogo WHERE SKU = 'TOR-14'") == [("Tornillo nuevo", 2.0)]
+
+
+def test_inventario_por_id_o_sku(datos):
+    csv = io.StringIO(
+        "ID_Item,SKU,stock,stock_min\n"
+        "1,,80,\n"
+        ",TUE-14,3,4\n"
+        ",NO-EXISTE,1,1\n"
+        ",,5,5\n"
+        "2,,-3,\n"
+    )
+    resumen = appp.importar_csv(csv, "inventario")
+    assert (resumen["procesadas"], resumen["escritas"], resumen["con_error"]) == (5, 2, 3)
+    assert [(e["linea"], e["error"]) for e in resumen["errores"]] == [
+        (4, "SKU no existe en catálogo: NO-EXISTE"),
+        (5, "Se requiere ID_Item o SKU"),
+        (6, "stock no puede ser menor que 0"),
+    ]
+    # Sin stock_min en la fila se conserva el que ya tenía la pieza.
+    assert _leer(datos, "SELECT ID_Item, stock, stock_min FROM inventario ORDER BY ID_Item") == [(1, 80, 10), (2, 3, 4)]
+
+
+def test_archivo_vacio_o_tabla_invalida(bd):
+    with pytest.raises(ValueError):
+        appp.importar_csv(io.StringIO(""), "catalogo")
+    with pytest.raises(ValueError):
+        appp.importar_csv(io.StringIO("SKU\nA\n"), "usuarios")
+
+
+def test_ruta_de_importacion(datos, cliente):
+    archivo = (io.BytesIO("SKU,stock\nTOR-14,7\nXX,1\n".encode("utf-8-sig")), "conteo.csv")
+    r = cliente("empleado").post("/importar/inventario", data={"archivo": archivo})
+    assert r.status_code == 200
+    assert r.get_json()["errores"] == [{"linea": 3, "error": "SKU no existe en catálogo: XX"}]
+    assert cliente("consultor").post("/importar/inventario").status_code == 403
+
+
+def test_error_de_la_base_en_un_lote_se_reporta_por_fila(bd):
+    # Un trigger hace fallar una fila en la base: el lote se reintenta fila
+    # por fila y solo esa queda con error.
+    cur = bd.cursor()
+    cur.execute("""
+        CREATE TRIGGER rechazar_sku BEFORE INSERT ON catalogo WHEN NEW.SKU = 'MALO'
+        BEGIN SELECT RAISE(ABORT, 'SKU rechazado por la base'); END
+    """)
+    bd.commit()
+    try:
+        csv = io.StringIO("SKU,Tipo,Unidades,Precio\nA-1,Perno,1,1\nMALO,Perno,1,1\nA-2,Perno,1,1\n")
+        resumen = appp.importar_csv(csv, "catalogo")
+    finally:
+        cur.execute("DROP TRIGGER rechazar_sku")
+        bd.commit()
+        cur.close()
+    assert (resumen["escritas"], resumen["con_error"]) == (2, 1)
+    assert resumen["errores"][0]["linea"] == 3
+    assert "SKU rechazado por la base" in resumen["errores"][0]["error"]
+    assert _leer(bd, "SELECT SKU FROM catalogo ORDER BY SKU") == [("A-1",), ("A-2",)]
+
+
+def test_ruta_rechaza_una_codificacion_desconocida(datos, cliente):
+    c = cliente("empleado")
+    r = c.post("/importar/inventario", data={"archivo": (io.BytesIO(b"SKU,stock\nTOR-14,7\n"), "conteo.csv"),
+                                             "codificacion": "nope"})
+    assert r.status_code == 400
+    assert r.get_json() == {"error": "Codificación desconocida: nope"}
+    r = c.post("/importar/inventario", data={"archivo": (io.BytesIO("SKU,stock\nTOR-14,8\n".encode("cp1252")),
+                                                         "conteo.csv"), "codificacion": "cp1252"})
+    assert r.status_code == 200
+    assert _leer(datos, "SELECT stock FROM inventario WHERE ID_Item = 1") == [(8,)]
+
+
+def test_inventario_y_stock_bajo_se_confirman_juntos(datos):
+    appp._asegurar_tabla_stock_bajo()
+    # Si falla la sincronización de stock_bajo de una fila, tampoco queda su stock.
+    cur = datos.cursor()
+    cur.execute("""
+        CREATE TRIGGER rechazar_stock_bajo BEFORE INSERT ON stock_bajo WHEN NEW.ID_Item = 2
+        BEGIN SELECT RAISE(ABORT, 'stock_bajo no disponible'); END
+    """)
+    datos.commit()
+    try:
+        resumen = appp.importar_csv(io.StringIO("ID_Item,stock\n1,3\n2,1\n"), "inventario")
+    finally:
+        cur.execute("DROP TRIGGER rechazar_stock_bajo")
+        datos.commit()
+        cur.close()
+    assert (resumen["escritas"], resumen["con_error"]) == (1, 1)
+    assert "stock_bajo no disponible" in resumen["errores"][0]["error"]
+    assert _leer(datos, "SELECT ID_Item, stock FROM inventario ORDER BY ID_Item") == [(1, 3), (2, 5)]
+    assert _leer(datos, "SELECT ID_Item, nivel FROM stock_bajo ORDER BY ID_Item") == [(1, "bajo")]
+
+
+def test_catalogo_reconstruye_stock_bajo_y_sube_su_version(datos):
+    appp._asegurar_tabla_stock_bajo()
+    cur = datos.cursor()
+    cur.execute("DELETE FROM stock_bajo")  # desfase que la importación del catálogo corrige
+    cur.close()
+    datos.commit()
+    version = appp.versiones_datos("stock_bajo")
+    csv = io.StringIO("SKU,Tipo_de_pieza,Unidades,Precio\nTOR-14,Tornillo,100,1.5\n")
+    assert appp.importar_csv(csv, "catalogo")["escritas"] == 1
+    assert _leer(datos, "SELECT ID_Item FROM stock_bajo ORDER BY ID_Item") == [(1,), (2,)]
+    assert appp.versiones_datos("stock_bajo") != version
@@ -0,0 +1,92 @@
+"""Motor SQLite: traducción de SQL de MySQL y comportamiento de conexión."""
+import mysql.connector
+import pytest
+
+import appp
+
+
+@pytest.mark.parametrize("mysql_sql, sqlite_sql, escribe", [
+    ("SELECT * FROM catalogo WHERE SKU = %s", "SELECT * FROM catalogo WHERE SKU = ?", False),
+    ("SELECT stock FROM inventario WHERE ID_Item = %s FOR UPDATE",
+     "SELECT stock FROM inventario WHERE ID_Item = ?", True),
+    ("UPDATE inventario SET stock = %s", "UPDATE inventario SET stock = ?", True),
+    ("  delete from pedido_detalle", "  delete from pedido_detalle", True),
+    ("INSERT IGNORE INTO clientes (nombre) VALUES (%s)", "INSERT OR IGNORE INTO clientes (nombre) VALUES (?)", True),
+    ("SELECT DATABASE(), @@port", "SELECT 'main', NULL", False),
+    ("SELECT NOW(), CURDATE()", "SELECT datetime('now', 'localtime'), date('now', 'localtime')", False),
+    ("EXPLAIN SELECT 1", "EXPLAIN QUERY PLAN SELECT 1", False),
+    ("ANALYZE TABLE pedidos_clientes, pedidos_proveedores", "ANALYZE", False),
+])
+def test_traducir_sql(mysql_sql, sqlite_sql, escribe):
+    assert appp.traducir_sql(mysql_sql) == (sqlite_sql, escribe)
+
+
+def test_traducir_sql_on_duplicate_key():
+    sql, escribe = appp.traducir_sql(
+        "INSERT INTO inventario (ID_Item, stock) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE stock = VALUES(stock), stock_min = stock_min + VALUES(stock_min)")
+    assert escribe
+    assert sql == ("INSERT INTO inventario (ID_Item, stock) VALUES (?, ?) "
+                   "ON CONFLICT DO UPDATE SET stock = excluded.stock, stock_min = stock_min + excluded.stock_min")
+
+
+def test_traducir_sql_ddl_mysql():
+    sql, escribe = appp.traducir_sql("""
+        CREATE TABLE t (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            creado TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )""")
+    assert not escribe
+    assert "INTEGER PRIMARY KEY AUTOINCREMENT" in sql
+    assert "DEFAULT (datetime('now', 'localtime'))" in sql
+    assert "ON UPDATE" not in sql
+
+
+def test_information_schema_columns(bd):
+    cur = bd.cursor()
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position
+    """, ("inventario",))
+    assert [c for (c,) in cur.fetchall()] == ["ID_Item", "stock", "stock_min"]
+    cur.close()
+
+
+def test_errores_con_errno_de_mysql(datos):
+    cur = datos.cursor()
+    with pytest.raises(mysql.connector.IntegrityError) as e:
+        cur.execute("INSERT INTO catalogo (SKU, Tipo_de_pieza) VALUES ('TOR-14', 'Tornillo')")
+    assert e.value.errno == 1062
+    datos.rollback()
+    with pytest.raises(mysql.connector.ProgrammingError) as e:
+        cur.execute("SELECT * FROM no_existe")
+    assert e.value.errno == 1146
+    cur.close()
+
+
+def test_rollback_descarta_la_transaccion(datos):
+    cur = datos.cursor()
+    cur.execute("UPDATE inventario SET stock = 0 WHERE ID_Item = 1")
+    datos.rollback()
+    cur.execute("SELECT stock FROM inventario WHERE ID_Item = 1")
+    assert cur.fetchone() == (50,)
+    cur.close()
+
+
+def test_cursor_diccionario(datos):
+    cur = datos.cursor(dictionary=True)
+    cur.execute("SELECT ID_Item, stock FROM inventario ORDER BY ID_Item")
+    assert cur.fetchall() == [{"ID_Item": 1, "stock": 50}, {"ID_Item": 2, "stock": 5}]
+    cur.close()
+
+
+def test_alta_de_pedido_por_la_ruta(datos, cliente):
+    c = cliente("admin")
+    r = c.post("/pedidos", data={"cliente": "Acme", "codigo_pedido": "C-1",
+                                 "descripcion": "Tornillo hexagonal", "medida": "1/4", "cantidad": "5"})
+    assert r.status_code == 200
+    assert b"C-1" in r.data
+    cur = datos.cursor()
+    cur.execute("SELECT cliente, cantidad, estado FROM pedidos_clientes")
+    assert cur.fetchall() == [("Acme", 5, "pendiente")]
+    cur.close()
@@ -0,0 +1,139 @@
+"""Paginación por keyset: paginar_keyset sobre la base y los cursores ?despues= / ?antes=."""
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import appp
+
+SELECT_CLIENTES = "SELECT id_cliente, nombre FROM clientes"
+CLAVES = [("nombre", "nombre"), ("id_cliente", "id_cliente")]
+
+
+@pytest.fixture
+def clientes(bd):
+    """25 clientes con nombres repetidos de tres en tres, para probar empates."""
+    cur = bd.cursor()
+    cur.executemany("INSERT INTO clientes (nombre) VALUES (%s)", [(f"Cliente {i // 3:02d}",) for i in range(25)])
+    cur.close()
+    appp.confirmar_cambios(bd, "clientes")
+    cur = bd.cursor(dictionary=True)
+    cur.execute(SELECT_CLIENTES + " ORDER BY nombre, id_cliente")
+    filas = cur.fetchall()
+    cur.close()
+    return filas
+
+
+def _pagina(consulta, descendente=False, tamano=10, where="", params=()):
+    with appp.app.test_request_context("/clientes" + consulta):
+        conn = appp.obtener_conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            return appp.paginar_keyset(cur, SELECT_CLIENTES, CLAVES, descendente, where, params, tamano)
+        finally:
+            cur.close(); conn.close()
+
+
+def _consulta(url):
+    """'?despues=...' de una URL de pagina["siguiente"] / pagina["anterior"]."""
+    return "?" + urlparse(url).query
+
+
+def test_recorre_todo_hacia_adelante_sin_repetir(clientes):
+    vistas, consulta = [], ""
+    while True:
+        filas, pagina = _pagina(consulta)
+        vistas.extend(filas)
+        if not pagina["siguiente"]:
+            break
+        consulta = _consulta(pagina["siguiente"])
+    assert vistas == clientes
+    assert len(filas) == 5
+
+
+def test_primera_pagina_sin_anterior(clientes):
+    filas, pagina = _pagina("")
+    assert filas == clientes[:10]
+    assert pagina["anterior"] is None
+    assert pagina["tamano"] == 10
+    assert "despues" in parse_qs(urlparse(pagina["siguiente"]).query)
+
+
+def test_anterior_devuelve_la_misma_pagina(clientes):
+    _, pagina1 = _pagina("")
+    filas2, pagina2 = _pagina(_consulta(pagina1["siguiente"]))
+    assert filas2 == clientes[10:20]
+    filas1, volver = _pagina(_consulta(pagina2["anterior"]))
+    assert filas1 == clientes[:10]
+    assert volver["anterior"] is None
+    assert volver["siguiente"] is not None
+
+
+def test_descendente(clientes):
+    filas, pagina = _pagina("", descendente=True)
+    assert filas == clientes[::-1][:10]
+    filas, _ = _pagina(_consulta(pagina["siguiente"]), descendente=True)
+    assert filas == clientes[::-1][10:20]
+
+
+def test_con_filtro(clientes):
+    filas, pagina = _pagina("", where="nombre = %s", params=("Cliente 02",))
+    assert [f["id_cliente"] for f in filas] == [7, 8, 9]
+    assert pagina["siguiente"] is None
+
+
+def test_cursor_invalido_empieza_desde_el_inicio(clientes):
+    for consulta in ("?despues=no-es-base64!", "?despues=" + appp._cursor_codificar([1, 2, 3])):
+        filas, _ = _pagina(consulta)
+        assert filas == clientes[:10]
+
+
+def test_pagina_vacia_ofrece_volver(clientes):
+    filas, pagina = _pagina("?despues=" + appp._cursor_codificar(["Zeta", 999]))
+    assert filas == []
+    assert pagina["siguiente"] is None
+    assert pagina["anterior"] == "/clientes"
+
+
+def test_conserva_los_demas_argumentos(clientes):
+    _, pagina = _pagina("?estado=pendiente")
+    assert parse_qs(urlparse(pagina["siguiente"]).query)["estado"] == ["pendiente"]
+
+
+def test_sql_keyset_arma_la_condicion_sin_ejecutar():
+    cursor = appp._cursor_codificar(["Cliente 03", 11])
+    with appp.app.test_request_context("/clientes?despues=" + cursor):
+        sql, params, estado = appp.sql_keyset(SELECT_CLIENTES, CLAVES, where="nombre <> %s",
+                                              params=("X",), tamano=10)
+    assert sql == (SELECT_CLIENTES + " WHERE nombre <> %s AND ((nombre > %s) OR (nombre = %s AND id_cliente > %s))"
+                   " ORDER BY nombre ASC, id_cliente ASC LIMIT %s")
+    assert params == ("X", "Cliente 03", "Cliente 03", 11, 11)
+    assert estado == (["nombre", "id_cliente"], ["Cliente 03", 11], False, 10)
+
+
+def test_sql_keyset_hacia_atras_invierte_el_orden():
+    with appp.app.test_request_context("/clientes?antes=" + appp._cursor_codificar([20])):
+        sql, params, estado = appp.sql_keyset(SELECT_CLIENTES, [("id_cliente", "id_cliente")],
+                                              descendente=True, tamano=5)
+    assert sql.endswith(" WHERE ((id_cliente > %s)) ORDER BY id_cliente ASC LIMIT %s")
+    assert params == (20, 6)
+    assert estado[2] is True
+
+
+def test_sql_keyset_como_tabla_derivada_en_paralelo(clientes):
+    # Como en /pedidos: la misma página alimenta dos consultas independientes.
+    with appp.app.test_request_context("/clientes"):
+        sql, params, estado = appp.sql_keyset(SELECT_CLIENTES, CLAVES, tamano=4)
+
+        def leer_pagina(cur):
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        def contar_pagina(cur):
+            cur.execute(f"SELECT COUNT(*) AS n FROM ({sql}) pg", params)
+            return cur.fetchone()["n"]
+
+        resultados = appp.consultar_en_paralelo({"filas": leer_pagina, "n": contar_pagina})
+        filas, pagina = appp._cerrar_pagina(resultados["filas"], estado)
+    assert filas == clientes[:4]
+    assert resultados["n"] == 5  # tamano + 1 para saber si hay más
+    assert pagina["siguiente"] is not None
@@ -0,0 +1,71 @@
+"""PDFEnStreaming: el reporte de pedidos en streaming debe abrir como un PDF válido."""
+import io
+import time
+
+import pytest
+
+import appp
+
+pypdf = pytest.importorskip("pypdf")
+
+
+def _leer_pdf(datos):
+    lector = pypdf.PdfReader(io.BytesIO(datos), strict=True)
+    return lector, [pagina.extract_text() for pagina in lector.pages]
+
+
+@pytest.fixture
+def pedidos(datos):
+    cur = datos.cursor()
+    cur.executemany("""
+        INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad)
+        VALUES (%s, %s, %s, '1/4', %s)
+    """, [("Ñandú (Norte) \\ Sur", f"C-{i:03d}", "Tornillo Ø→Ω hexagonal", i) for i in range(1, 101)])
+    cur.close()
+    datos.commit()
+    return datos
+
+
+def test_pdf_vacio(bd):
+    lector, textos = _leer_pdf(b"".join(appp.generar_pdf_pedidos_clientes("Pruebas")))
+    assert len(lector.pages) == 1
+    assert "REPORTE DE PEDIDOS DE CLIENTES" in textos[0]
+    assert "Generado por: Pruebas" in textos[0]
+    assert lector.metadata.title == "Reporte de Pedidos de Clientes"
+
+
+def test_pdf_con_varias_paginas(pedidos):
+    avances = []
+    trozos = list(appp.generar_pdf_pedidos_clientes("Pruebas", avance=lambda hechas, total: avances.append(hechas)))
+    lector, textos = _leer_pdf(b"".join(trozos))
+    # 34 filas en la primera hoja (bajo los encabezados) y 38 en las siguientes.
+    assert len(lector.pages) == 3
+    assert len(trozos) == 1 + 3 + 1  # inicio, una por página, fin
+    assert avances == [34, 72, 100]
+    assert all(p.mediabox.width == 612 and p.mediabox.height == 792 for p in lector.pages)
+    assert "Código" in textos[0] and "Descripción" in textos[0]
+    assert "C-100" in textos[0] and "C-001" in textos[2]
+    # Acentos de WinAnsi y caracteres escapados se conservan; lo que no está en cp1252 sale como "?".
+    assert "Ñandú (Norte) \\ Sur" in textos[0]
+    assert "Tornillo Ø?? hexagonal" in textos[0]
+    fuentes = {f["/BaseFont"] for f in lector.pages[0]["/Resources"]["/Font"].values()}
+    assert fuentes == {"/Helvetica", "/Helvetica-Bold"}
+
+
+def test_ruta_del_reporte(pedidos, cliente):
+    r = cliente("consultor").get("/reporte_pedidos_clientes")
+    assert r.status_code == 200
+    assert r.mimetype == "application/pdf"
+    lector, _ = _leer_pdf(r.data)
+    assert len(lector.pages) == 3
+    assert cliente("empleado").get("/reporte_pedidos_clientes").status_code == 403
+
+
+def test_el_tiempo_de_render_no_incluye_la_espera_del_cliente(pedidos):
+    serie = appp.metricas._series["pdf_render_segundos"]
+    llave = (("reporte", "pedidos_clientes"),)
+    antes = (serie[llave].total, serie[llave].suma) if llave in serie else (0, 0.0)
+    for _ in appp.generar_pdf_pedidos_clientes("Pruebas"):
+        time.sleep(0.1)  # cliente lento: 5 trozos, medio segundo detenido en los yield
+    assert serie[llave].total == antes[0] + 1
+    assert serie[llave].suma - antes[1] < 0.25
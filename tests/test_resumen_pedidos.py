@@ -0,0 +1,80 @@
+"""resumen_pedidos: lo que mantienen las rutas debe coincidir con reconstruir_resumen_pedidos()."""
+from datetime import datetime
+
+import pytest
+
+import appp
+
+
+def _resumen(bd):
+    """{(origen, dimension, valor, estado): (pedidos, cantidad)} sin las filas en cero."""
+    cur = bd.cursor()
+    cur.execute("SELECT origen, dimension, valor, estado, pedidos, cantidad FROM resumen_pedidos")
+    filas = {tuple(f[:4]): (f[4], f[5]) for f in cur.fetchall() if f[4] or f[5]}
+    cur.close()
+    bd.rollback()
+    return filas
+
+
+@pytest.fixture
+def pedidos_viejos(datos):
+    """Pedidos cargados por fuera de las rutas, en días pasados; luego se reconstruye el resumen."""
+    cur = datos.cursor()
+    cur.executemany("""
+        INSERT INTO pedidos_clientes (cliente, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado)
+        VALUES (%s, %s, 'Tornillo hexagonal', '1/4', %s, %s, %s)
+    """, [("Acme", "V-1", 10, "entregado", datetime(2024, 11, 3, 9)),
+          ("Acme", "V-2", 4, "pendiente", datetime(2024, 11, 3, 17)),
+          ("Bolsa", "V-3", 7, "confirmado", datetime(2024, 12, 1, 12))])
+    cur.execute("""
+        INSERT INTO pedidos_proveedores (proveedor, codigo_pedido, descripcion, medida, cantidad, estado, fecha_estado)
+        VALUES ('Aceros del Norte', 'P-1', 'Tuerca hexagonal', '1/4', 500, 'enviado', %s)
+    """, (datetime(2024, 12, 2, 8),))
+    cur.close()
+    datos.commit()
+    appp._asegurar_tabla_resumen()
+    appp.reconstruir_resumen_pedidos(datos)
+    return datos
+
+
+def test_reconstruir_cuenta_por_dimension(pedidos_viejos):
+    resumen = _resumen(pedidos_viejos)
+    assert resumen[("clientes", "total", "", "pendiente")] == (1, 4)
+    assert resumen[("clientes", "contraparte", "Acme", "entregado")] == (1, 10)
+    assert resumen[("clientes", "dia", "2024-11-03", "pendiente")] == (1, 4)
+    assert resumen[("proveedores", "dia", "2024-12-02", "enviado")] == (1, 500)
+    assert sum(n for (o, d, _, _), (n, _) in resumen.items() if o == "clientes" and d == "total") == 3
+
+
+def test_altas_y_cambios_de_estado_coinciden_con_reconstruir(pedidos_viejos, cliente):
+    c = cliente("admin")
+    for codigo, cantidad in (("N-1", 3), ("N-2", 8)):
+        r = c.post("/pedidos", data={"cliente": "Acme", "codigo_pedido": codigo, "descripcion": "Tornillo hexagonal",
+                                     "medida": "1/4", "cantidad": str(cantidad)})
+        assert r.status_code == 200
+    r = c.post("/pedidos_proveedores", data={"proveedor": "Aceros del Norte", "codigo_pedido": "P-2",
+                                             "descripcion": "Tuerca hexagonal", "medida": "1/4", "cantidad": "20"})
+    assert r.status_code == 302
+
+    assert c.post("/pedidos/2/estado", data={"estado": "confirmado"}).status_code == 302
+    assert c.post("/pedidos/2/estado", data={"estado": "confirmado"}).status_code == 302  # sin cambio
+    assert c.post("/pedidos_proveedores/1/estado", data={"estado": "recibido"}).status_code == 302
+    r = c.post("/pedidos/estado", json={"ids": [1, 3, 4, 99], "estado": "cancelado"})
+    assert r.status_code == 207
+
+    incremental = _resumen(pedidos_viejos)
+    appp.reconstruir_resumen_pedidos(pedidos_viejos)
+    assert incremental == _resumen(pedidos_viejos)
+    assert incremental[("clientes", "total", "", "cancelado")] == (3, 10 + 7 + 3)
+    assert ("clientes", "contraparte", "Bolsa", "confirmado") not in incremental
+
+
+def test_comando_reconstruir_corrige_un_desfase(pedidos_viejos):
+    cur = pedidos_viejos.cursor()
+    cur.execute("UPDATE resumen_pedidos SET pedidos = pedidos + 5 WHERE dimension = 'total'")
+    cur.close()
+    pedidos_viejos.commit()
+    resultado = appp.app.test_cli_runner().invoke(args=["reconstruir-resumen"])
+    assert resultado.exit_code == 0
+    assert resultado.output.strip() == "clientes: 3 pedidos · proveedores: 1 pedidos"
+    assert _resumen(pedidos_viejos)[("clientes", "total", "", "pendiente")] == (1, 4)
@@ -0,0 +1,107 @@
+"""Versiones de datos y respuestas condicionales (ETag / 304)."""
+import mysql.connector
+import pytest
+
+import appp
+
+
+def _version(bd, tabla):
+    cur = bd.cursor()
+    cur.execute("SELECT version FROM versiones_datos WHERE tabla = %s", (tabla,))
+    fila = cur.fetchone()
+    cur.close()
+    bd.rollback()
+    return fila[0] if fila else 0
+
+
+def test_la_version_sube_con_el_commit_y_no_con_el_rollback(bd):
+    avisos = []
+    appp.al_cambiar("clientes", lambda: avisos.append(_version(bd, "clientes")))
+    try:
+        inicial = _version(bd, "clientes")
+        cur = bd.cursor()
+        cur.execute("INSERT INTO clientes (nombre) VALUES ('Acme')")
+        appp.marcar_cambio(bd, "clientes")
+        bd.rollback()
+        assert _version(bd, "clientes") == inicial
+
+        cur.execute("INSERT INTO clientes (nombre) VALUES ('Acme')")
+        cur.close()
+        appp.confirmar_cambios(bd, "clientes", "clientes")
+        # El aviso llega una vez y ya ve la versión confirmada.
+        assert avisos == [inicial + 1]
+        assert appp.versiones_datos("clientes") == (inicial + 1,)
+    finally:
+        appp._al_cambiar["clientes"].pop()
+
+
+def test_si_falla_el_commit_no_se_avisa(bd):
+    avisos = []
+    appp.al_cambiar("clientes", lambda: avisos.append(1))
+
+    class ConexionQueFalla:
+        def __init__(self, conn):
+            self._conn = conn
+
+        def cursor(self, **kwargs):
+            return self._conn.cursor(**kwargs)
+
+        def commit(self):
+            raise mysql.connector.OperationalError(msg="se cayó la conexión", errno=2013)
+
+    try:
+        with pytest.raises(mysql.connector.OperationalError):
+            appp.confirmar_cambios(ConexionQueFalla(bd), "clientes")
+        bd.rollback()
+        assert avisos == []
+    finally:
+        appp._al_cambiar["clientes"].pop()
+
+
+def test_anonimo_no_consulta_versiones(cliente, monkeypatch):
+    def no_llamar(*tablas):
+        raise AssertionError("versiones_datos() antes de revisar el rol")
+    monkeypatch.setattr(appp, "versiones_datos", no_llamar)
+    r = cliente().get("/pedidos", headers={"If-None-Match": '"cualquiera"'})
+    assert r.status_code == 403
+    assert "ETag" not in r.headers
+
+
+def test_etag_fuerte_y_304(datos, cliente):
+    c = cliente("admin")
+    r = c.get("/clientes", headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    etag, debil = r.get_etag()
+    assert etag and not debil
+    assert r.headers["Cache-Control"] == "private, no-cache"
+
+    r = c.get("/clientes", headers={"If-None-Match": f'"{etag}"', "Accept-Encoding": "identity"})
+    assert r.status_code == 304
+    assert r.get_etag() == (etag, False)
+
+    # Un cambio en la tabla invalida el ETag.
+    appp.confirmar_cambios(datos, "clientes")
+    r = c.get("/clientes", headers={"If-None-Match": f'"{etag}"', "Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.get_etag()[0] != etag
+
+
+def test_la_variante_gzip_lleva_su_propio_etag(datos, cliente):
+    c = cliente("admin")
+    r = c.get("/clientes", headers={"Accept-Encoding": "gzip"})
+    assert r.headers.get("Content-Encoding") == "gzip"
+    etag_gz, _ = r.get_etag()
+    assert etag_gz.endswith(appp.SUFIJO_ETAG_GZIP)
+
+    r = c.get("/clientes", headers={"If-None-Match": f'"{etag_gz}"', "Accept-Encoding": "gzip"})
+    assert r.status_code == 304
+    # Sin gzip la versión comprimida no sirve: se manda la respuesta completa.
+    r = c.get("/clientes", headers={"If-None-Match": f'"{etag_gz}"', "Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert "Content-Encoding" not in r.headers
+
+
+def test_el_etag_depende_del_rol(datos, cliente):
+    etag_admin = cliente("admin").get("/clientes").get_etag()[0]
+    r = cliente("empleado").get("/clientes", headers={"If-None-Match": f'"{etag_admin}"'})
+    assert r.status_code == 200